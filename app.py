@@ -0,0 +1,50 @@
+import logging
+from functools import partial
+from aiogram import Bot
+from aiogram import Dispatcher
+
+from handlers import registration, profile, recipe, cooking, favorites, search
+from middlewares.user_middleware import UserMiddleware
+from database.db import close_db
+from database.storage import SQLiteStorage
+from services.ai_service import close_session
+from services.timer_scheduler import timer_scheduler
+from services.ai_dispatcher import dispatcher
+from services.retrieval import retriever
+
+logger = logging.getLogger(__name__)
+
+
+def create_dispatcher() -> Dispatcher:
+    """Dispatcher с хранилищем FSM, middleware и всеми роутерами"""
+    dp = Dispatcher(storage=SQLiteStorage())
+
+    dp.message.middleware(UserMiddleware())
+    dp.callback_query.middleware(UserMiddleware())
+
+    dp.include_router(registration.router)
+    dp.include_router(profile.router)
+    dp.include_router(recipe.router)
+    dp.include_router(cooking.router)
+    dp.include_router(favorites.router)
+    dp.include_router(search.router)
+    return dp
+
+
+async def start_services(bot: Bot, shard: int = 0, shards: int = 1):
+    """Восстановить таймеры своего шарда и запустить фоновые службы"""
+    restored = await cooking.restore_cooking_timers(shard, shards)
+    logger.info(f"Восстановлено таймеров готовки: {restored}")
+    timer_scheduler.start(partial(cooking.on_timer_expired, bot))
+    dispatcher.start()
+    retriever.start()
+
+
+async def stop_services(dp: Dispatcher):
+    """Остановить фоновые службы и закрыть соединения"""
+    await timer_scheduler.stop()
+    await dispatcher.stop()
+    await retriever.stop()
+    await close_session()
+    await dp.storage.close()
+    await close_db()
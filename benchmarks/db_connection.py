@@ -0,0 +1,130 @@
+"""Операции с БД в секунду: пул ConnectionManager против соединения на каждый вызов.
+
+«До» — прежний код database/db.py: каждая функция открывает своё
+соединение aiosqlite.connect (новый поток, открытие файла, разбор схемы)
+и закрывает его. «После» — функции database.db через долгоживущие
+соединения ConnectionManager. Одни и те же запросы (профиль, сессия
+готовки, обновление таймера) выполняются --ops раз по --concurrency
+одновременно на временной БД с --users пользователями.
+
+    python -m benchmarks.db_connection --ops 5000 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import aiosqlite
+
+from database import db
+from database.connection import ConnectionManager
+from models.user import CookingSession
+
+
+async def legacy_get_user(path: str, user_id: int):
+    async with aiosqlite.connect(path) as conn:
+        async with conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
+            return await cursor.fetchone()
+
+
+async def legacy_get_cooking_session(path: str, user_id: int):
+    async with aiosqlite.connect(path) as conn:
+        async with conn.execute("SELECT * FROM cooking_sessions WHERE user_id = ?", (user_id,)) as cursor:
+            return await cursor.fetchone()
+
+
+async def legacy_update_cooking_session(path: str, session: CookingSession):
+    async with aiosqlite.connect(path) as conn:
+        await conn.execute("""
+            UPDATE cooking_sessions
+            SET current_step = ?, timer_end = ?, is_paused = ?, updated_at = ?
+            WHERE session_id = ?
+        """, (
+            session.current_step, db.to_epoch(session.timer_end), session.is_paused,
+            int(time.time()), session.session_id
+        ))
+        await conn.commit()
+
+
+async def seed(users: int):
+    now = datetime.now()
+    async with db.manager.write() as conn:
+        await conn.executemany("""
+            INSERT INTO users (user_id, name, goal, dietary_restrictions, has_oven,
+                               has_microwave, has_stove, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 1, 0, 1, ?, ?)
+        """, [
+            (user_id, f"Пользователь {user_id}", "goal_weight_loss", json.dumps(["vegan"]),
+             db.to_epoch(now), db.to_epoch(now))
+            for user_id in range(users)
+        ])
+        await conn.executemany("""
+            INSERT INTO cooking_sessions (user_id, recipe_id, current_step, timer_end, is_paused,
+                                          created_at, updated_at)
+            VALUES (?, 1, 0, ?, 0, ?, ?)
+        """, [
+            (user_id, db.to_epoch(now + timedelta(minutes=5)), db.to_epoch(now), db.to_epoch(now))
+            for user_id in range(users)
+        ])
+
+
+def make_session(user_id: int) -> CookingSession:
+    now = datetime.now()
+    return CookingSession(
+        session_id=user_id + 1, user_id=user_id, recipe_id=1, current_step=1,
+        timer_end=now + timedelta(minutes=5), is_paused=False, created_at=now, updated_at=now
+    )
+
+
+async def run(operation, ops: int, concurrency: int, users: int) -> float:
+    """Операций в секунду"""
+    rng = random.Random(42)
+    user_ids = [rng.randrange(users) for _ in range(ops)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(user_id: int):
+        async with semaphore:
+            await operation(user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(user_id) for user_id in user_ids))
+    return ops / (time.perf_counter() - started)
+
+
+async def main_async(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.db")
+        db.manager = ConnectionManager(path)
+        await db.init_db()
+        await seed(args.users)
+
+        cases = [
+            ("get_user", lambda u: legacy_get_user(path, u), db.get_user),
+            ("get_cooking_session", lambda u: legacy_get_cooking_session(path, u), db.get_cooking_session),
+            ("update_cooking_session",
+             lambda u: legacy_update_cooking_session(path, make_session(u)),
+             lambda u: db.update_cooking_session(make_session(u))),
+        ]
+        print(f"{args.ops} операций, {args.concurrency} одновременно, {args.users} пользователей")
+        print(f"{'операция':24} {'connect, оп/с':>14} {'пул, оп/с':>10} {'ускорение':>10}")
+        for name, legacy, pooled in cases:
+            legacy_rate = await run(legacy, args.ops, args.concurrency, args.users)
+            pooled_rate = await run(pooled, args.ops, args.concurrency, args.users)
+            print(f"{name:24} {legacy_rate:14.0f} {pooled_rate:10.0f} {pooled_rate / legacy_rate:9.1f}x")
+        await db.close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=10000)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Оценка соответствия КБЖУ цели: NumPy против цикла по рецептам.
+
+Для --recipes случайных рецептов считается services.goal_fit.score по всем
+целям и выбираются --top лучших (goal_fit.rank). Для сравнения та же
+формула считается циклом Python по каждому рецепту.
+
+    python -m benchmarks.goal_fit_scoring --recipes 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from services import goal_fit
+
+
+def score_loop(goal: str, rows):
+    ranges = goal_fit.GOAL_RANGES[goal_fit.goal_key(goal)]
+    total = sum(goal_fit.FEATURE_WEIGHTS)
+    scores = []
+    for row in rows:
+        penalty = 0.0
+        for value, (low, high), scale, weight in zip(
+            row, ranges, goal_fit.TOLERANCES, goal_fit.FEATURE_WEIGHTS
+        ):
+            excess = max(low - value, 0) + max(value - high, 0)
+            penalty += weight / total * (excess / scale) ** 2
+        scores.append(1 / (1 + penalty))
+    return scores
+
+
+def timed(fn, repeat: int) -> float:
+    """Медианное время вызова fn, миллисекунды"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=100000)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    rows = [
+        (rng.randint(150, 1200), rng.randint(5, 80), rng.randint(2, 60),
+         rng.randint(5, 150), rng.randint(10, 120))
+        for _ in range(args.recipes)
+    ]
+    macros = np.array(rows, np.float32).T.copy()
+
+    print(f"{args.recipes} рецептов, медиана из {args.repeat} запусков")
+    print(f"{'цель':14} {'цикл, мс':>10} {'score, мс':>10} {'rank top, мс':>13} {'расхождение':>12}")
+    for goal in goal_fit.GOAL_RANGES:
+        loop_ms = timed(lambda: score_loop(goal, rows), max(1, args.repeat // 10))
+        score_ms = timed(lambda: goal_fit.score(goal, macros), args.repeat)
+        rank_ms = timed(lambda: goal_fit.rank(goal, macros, args.top), args.repeat)
+        error = np.abs(goal_fit.score(goal, macros) - np.array(score_loop(goal, rows))).max()
+        print(f"{goal:14} {loop_ms:10.1f} {score_ms:10.2f} {rank_ms:13.2f} {error:12.1e}")
+
+
+if __name__ == "__main__":
+    main()
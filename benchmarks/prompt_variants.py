@@ -0,0 +1,94 @@
+"""Подробный и компактный промпт генерации: размер, токены, задержка, разбор.
+
+Без --live считается только размер сообщений запроса: сколько символов
+в статическом префиксе (одинаковом для всех запросов, его может кэшировать
+провайдер) и в изменяемой части, и пример ответа каждого формата. С --live
+каждый вариант --requests раз по очереди генерирует рецепт через настоящий
+API (нужен AI_API_TOKEN), затем печатается сводка services.ai_usage: токены
+из поля usage, длительность запроса и доля ответов, разобранных с первой
+попытки и вообще.
+
+    python -m benchmarks.prompt_variants
+    python -m benchmarks.prompt_variants --live --requests 20
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from models.user import UserProfile
+from services import ai_service, ai_usage
+
+REQUESTS = [
+    "курица с рисом", "паста с грибами", "что-нибудь из гречки", "лёгкий суп",
+    "омлет на завтрак", "рыба с овощами", "салат с нутом", "тушёная говядина",
+]
+EXCLUDE = ["Курица терияки", "Плов с курицей", "Паста карбонара", "Гречка с грибами"]
+
+
+def make_profile(user_id: int) -> UserProfile:
+    now = datetime.now()
+    return UserProfile(
+        user_id=user_id, name="Анна", goal="goal_weight_loss",
+        dietary_restrictions=["lactose_free"], has_oven=True, has_microwave=False,
+        has_stove=True, created_at=now, updated_at=now,
+    )
+
+
+def report_sizes():
+    profile = make_profile(1)
+    print(f"{'вариант':10} {'префикс, симв.':>15} {'запрос, симв.':>14} {'всего':>7}")
+    for variant in (ai_service.PROMPT_FULL, ai_service.PROMPT_COMPACT):
+        messages = ai_service.build_recipe_messages(variant, profile, REQUESTS[0], None, EXCLUDE)
+        static = sum(len(m["content"]) for m in messages if m["role"] == "system")
+        dynamic = sum(len(m["content"]) for m in messages if m["role"] != "system")
+        print(f"{variant:10} {static:15} {dynamic:14} {static + dynamic:7}")
+
+    steps = [("Нарезать курицу кубиками", 5), ("Обжарить на сковороде", 10), ("Отварить рис", 15)]
+    full = [{"step": i, "description": text, "duration": minutes} for i, (text, minutes) in enumerate(steps, 1)]
+    compact = [[text, minutes] for text, minutes in steps]
+    print(f"шаги в ответе, симв.: подробный {len(json.dumps(full, ensure_ascii=False))}, "
+          f"компактный {len(json.dumps(compact, ensure_ascii=False))}")
+
+
+async def run_live(requests: int):
+    for variant in (ai_service.PROMPT_FULL, ai_service.PROMPT_COMPACT):
+        for i in range(requests):
+            profile = make_profile(i)
+            payload = {
+                "model": ai_service.MODEL,
+                "messages": ai_service.build_recipe_messages(
+                    variant, profile, REQUESTS[i % len(REQUESTS)], None, EXCLUDE
+                ),
+            }
+            started = time.perf_counter()
+            response = await ai_service.query(payload)
+            ai_usage.record_call(variant, ai_usage.GENERATION, response, started)
+            if response:
+                await ai_service.parse_recipe_response(response, profile.user_id, variant)
+    await ai_service.close_session()
+
+    print(f"{'вариант':10} {'вызовов':>8} {'токены промпта':>15} {'из кэша':>8} "
+          f"{'токены ответа':>14} {'задержка, с':>12} {'с 1-й попытки':>14} {'разобрано':>10}")
+    for variant, kinds in ai_usage.stats().items():
+        stats = kinds[ai_usage.GENERATION]
+        cached = stats["cached_tokens"] / max(1, stats["prompt_tokens"])
+        print(f"{variant:10} {stats['calls']:8} {stats['avg_prompt_tokens']:15.0f} {cached:8.0%} "
+              f"{stats['avg_completion_tokens']:14.0f} {stats['latency']['avg']:12.2f} "
+              f"{stats['first_try_parse_rate']:14.0%} {stats['parse_rate']:10.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--live", action="store_true", help="Генерировать через настоящий API")
+    parser.add_argument("--requests", type=int, default=10, help="Генераций на вариант")
+    args = parser.parse_args()
+
+    report_sizes()
+    if args.live:
+        asyncio.run(run_live(args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Запросы избранного, истории и сессий готовки на большой БД: без индексов и с ними.
+
+Временная БД заполняется --recipes рецептами --users пользователей (каждый
+пятый в избранном); у каждого пользователя RECIPE_HISTORY_SIZE записей
+истории и сессия готовки, есть и записи кэша AI. Каждая функция database.db
+вызывается --queries раз для случайных пользователей сначала без индексов
+миграции _query_indexes, затем с ними. Поиск кэша AI идёт по первичному
+ключу и от этих индексов не зависит — он для сравнения.
+
+    python -m benchmarks.query_indexes --recipes 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import RECIPE_HISTORY_SIZE
+from database import db
+from database.connection import ConnectionManager
+from database.migrations import _query_indexes
+from models.user import Recipe
+
+BODIES = 1000
+CHUNK = 100000
+QUERY_INDEXES = ("idx_recipes_user_favorite", "idx_recipe_history_user", "idx_cooking_sessions_user")
+
+
+def make_body(i: int) -> Recipe:
+    return Recipe(
+        recipe_id=None, user_id=0, name=f"Рецепт {i}", description="Описание блюда",
+        calories=300 + i % 500, protein=20 + i % 40, fats=5 + i % 30, carbs=10 + i % 80,
+        cooking_time=10 + i % 60,
+        ingredients=[{"name": "Курица", "amount": "200г"}, {"name": "Рис", "amount": "100г"}],
+        steps=[{"step": 1, "description": "Приготовить", "duration": 10}],
+        image_url=None, created_at=datetime.now()
+    )
+
+
+def chunks(rows, size: int = CHUNK):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def seed(recipes: int, users: int):
+    rng = random.Random(42)
+    now = int(time.time())
+    body_hashes = []
+    async with db.manager.write() as conn:
+        # Поиск здесь не измеряется: без триггера FTS заполнение в разы быстрее
+        await conn.execute("DROP TRIGGER IF EXISTS recipes_search_insert")
+        for i in range(BODIES):
+            body_hashes.append(await db._save_body(conn, make_body(i)))
+
+    recipe_rows = (
+        (rng.randrange(users), rng.choice(body_hashes), rng.random() < 0.2, now - rng.randrange(365 * 86400))
+        for _ in range(recipes)
+    )
+    for batch in chunks(recipe_rows):
+        async with db.manager.write() as conn:
+            await conn.executemany(
+                "INSERT INTO recipes (user_id, body_hash, is_favorite, created_at) VALUES (?, ?, ?, ?)",
+                batch
+            )
+
+    history_rows = (
+        (user_id, f"Рецепт {rng.randrange(BODIES)}", now - rng.randrange(30 * 86400))
+        for user_id in range(users) for _ in range(RECIPE_HISTORY_SIZE)
+    )
+    for batch in chunks(history_rows):
+        async with db.manager.write() as conn:
+            await conn.executemany(
+                "INSERT INTO recipe_history (user_id, recipe_name, created_at) VALUES (?, ?, ?)", batch
+            )
+
+    async with db.manager.write() as conn:
+        await conn.executemany("""
+            INSERT INTO cooking_sessions (user_id, recipe_id, current_step, timer_end, is_paused,
+                                          created_at, updated_at)
+            VALUES (?, 1, 0, ?, 0, ?, ?)
+        """, [(user_id, now + 600, now, now) for user_id in range(users)])
+        await conn.executemany("""
+            INSERT OR IGNORE INTO recipe_cache (cache_key, name, body_hash, created_at, last_used_at, hits)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (f"key{i % users}", f"Рецепт {i}", rng.choice(body_hashes), now, now, rng.randrange(100))
+            for i in range(users)
+        ])
+        await conn.execute("ANALYZE")
+
+
+async def timed(call, user_ids) -> float:
+    """Медианное время вызова, миллисекунды"""
+    await call(user_ids[0])  # Прогрев: разбор запроса и страничный кэш
+    times = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        await call(user_id)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+async def measure(user_ids):
+    min_created_at = datetime.now() - timedelta(days=30)
+    cases = [
+        ("get_favorites_page", lambda u: db.get_favorites_page(u, 10)),
+        ("count_favorites", db.count_favorites),
+        ("get_recent_recipe_names", lambda u: db.get_recent_recipe_names(u, RECIPE_HISTORY_SIZE)),
+        ("get_cooking_session", db.get_cooking_session),
+        ("get_cached_recipes", lambda u: db.get_cached_recipes(f"key{u}", min_created_at, u)),
+    ]
+    return {name: await timed(call, user_ids) for name, call in cases}
+
+
+async def main_async(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.manager = ConnectionManager(str(Path(tmp) / "bench.db"))
+        await db.init_db()
+        started = time.perf_counter()
+        await seed(args.recipes, args.users)
+        print(f"{args.recipes} рецептов, {args.users} пользователей, "
+              f"заполнение {time.perf_counter() - started:.0f} с, медиана из {args.queries} запросов")
+
+        rng = random.Random(7)
+        user_ids = [rng.randrange(args.users) for _ in range(args.queries)]
+
+        async with db.manager.write() as conn:
+            for index in QUERY_INDEXES:
+                await conn.execute(f"DROP INDEX {index}")
+        before = await measure(user_ids)
+
+        async with db.manager.write() as conn:
+            await _query_indexes(conn)
+            await conn.execute("ANALYZE")
+        after = await measure(user_ids)
+
+        print(f"{'запрос':26} {'без индексов, мс':>17} {'с индексами, мс':>16} {'ускорение':>10}")
+        for name in before:
+            print(f"{name:26} {before[name]:17.3f} {after[name]:16.3f} {before[name] / after[name]:9.0f}x")
+        await db.close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=100)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Локальный подбор рецептов против генерации каждым запросом (только AI).
+
+Индекс строится из синтетических тел рецептов: блюда из сочетаний
+основы, гарнира и способа готовки. Поток запросов — повторы уже
+сгенерированных блюд в других формах слов («курицу с рисом», «рис
+с курицей») и новые блюда, которых в индексе нет. Для повторов считается
+доля попаданий, для новых — доля ложных попаданий. Задержка AI не
+измеряется, а задаётся --llm-latency (типичная генерация рецепта
+моделью занимает несколько секунд).
+
+    python -m benchmarks.retrieval_hit_rate --recipes 100000 --requests 20000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from services.retrieval import RecipeIndex, index_body
+from services.text import normalize_request, search_terms
+
+# (именительный, творительный, винительный падеж)
+PROTEINS = [
+    ("курица", "курицей", "курицу"), ("говядина", "говядиной", "говядину"),
+    ("индейка", "индейкой", "индейку"), ("треска", "треской", "треску"),
+    ("лосось", "лососем", "лосося"), ("тофу", "тофу", "тофу"),
+    ("нут", "нутом", "нут"), ("фасоль", "фасолью", "фасоль"),
+    ("креветки", "креветками", "креветки"), ("свинина", "свининой", "свинину"),
+]
+SIDES = [
+    ("рис", "рисом"), ("гречка", "гречкой"), ("булгур", "булгуром"), ("киноа", "киноа"),
+    ("картофель", "картофелем"), ("брокколи", "брокколи"), ("кабачки", "кабачками"),
+    ("макароны", "макаронами"), ("кускус", "кускусом"), ("перец", "перцем"),
+]
+STYLES = [
+    ("запечённая", "Запечь в духовке 30 минут"), ("тушёная", "Тушить на плите 25 минут"),
+    ("жареная", "Обжарить на сковороде 15 минут"), ("пряная", "Варить 20 минут"),
+    ("", "Обжарить на сковороде 10 минут"),
+]
+# Блюда, которых нет в индексе
+NOVEL = [
+    "паэлья с морепродуктами", "борщ", "пицца маргарита", "рататуй", "шакшука",
+    "том ям", "лазанья", "хумус", "окрошка", "сырники", "плов", "фалафель",
+]
+GOALS = ["weight_loss", "muscle_gain", "none"]
+REFRESH = 2000  # Новых тел за одно обновление индекса
+
+
+def make_row(rowid: int, rng: random.Random):
+    protein, side, (style, step) = rng.choice(PROTEINS), rng.choice(SIDES), rng.choice(STYLES)
+    name = f"{style} {protein[0]} с {side[1]}".strip().capitalize()
+    ingredients = [protein[0], side[0], "лук", "чеснок", "масло оливковое", "соль"]
+    steps = json.dumps([{"step": 1, "description": step, "duration": 20}], ensure_ascii=False)
+    row = (
+        rowid, rowid.to_bytes(20, "big"), name,
+        rng.randint(250, 900), rng.randint(10, 60), rng.randint(5, 40), rng.randint(10, 90),
+        rng.randint(15, 60),
+        search_terms(name), search_terms("Домашнее блюдо на каждый день"),
+        search_terms(" ".join(ingredients)), steps,
+    )
+    return row
+
+
+def make_request(rng: random.Random, novel_share: float):
+    """(текст запроса, повтор ли это уже сгенерированного блюда)"""
+    if rng.random() < novel_share:
+        return f"хочу {rng.choice(NOVEL)}", False
+    protein, side = rng.choice(PROTEINS), rng.choice(SIDES)
+    template = rng.choice([
+        "хочу {p[2]} с {s[1]}", "{p[0]} с {s[1]}", "приготовь {s[0]} с {p[1]}",
+        "что-нибудь из {p[0]} и {s[0]}",
+    ])
+    return template.format(p=protein, s=side), True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--novel-share", type=float, default=0.3, help="Доля запросов новых блюд")
+    parser.add_argument("--llm-latency", type=float, default=8.0, help="Время генерации AI, секунды")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    rows = [make_row(rowid, rng) for rowid in range(1, args.recipes + 1)]
+    started = time.perf_counter()
+    bodies = [index_body(row) for row in rows]
+    index = RecipeIndex(bodies)
+    print(f"индекс: {len(index)} тел, {len(index.vocab)} основ, "
+          f"сборка {time.perf_counter() - started:.1f} с")
+    # Обновление Retriever: разбираются только новые тела
+    fresh = [index_body(make_row(rowid, rng)) for rowid in range(len(rows) + 1, len(rows) + 1 + REFRESH)]
+    started = time.perf_counter()
+    index = index.extended(fresh)
+    print(f"дополнение {REFRESH} телами: {time.perf_counter() - started:.2f} с")
+
+    requests = [make_request(rng, args.novel_share) for _ in range(args.requests)]
+    latencies = []
+    hits = {True: 0, False: 0}
+    totals = {True: 0, False: 0}
+    for text, repeat in requests:
+        goal = rng.choice(GOALS)
+        # Часть пользователей без духовки: такие рецепты им не подходят
+        equipment = 0b110 if rng.random() < 0.3 else 0b111
+        t = time.perf_counter()
+        found = index.best(normalize_request(text).split(), goal, 0, equipment)
+        latencies.append(time.perf_counter() - t)
+        totals[repeat] += 1
+        hits[repeat] += bool(found)
+
+    hit_rate = (hits[True] + hits[False]) / len(requests)
+    retrieval_ms = statistics.mean(latencies) * 1000
+    latencies.sort()
+    p99_ms = latencies[int(0.99 * len(latencies))] * 1000
+    print(f"повторы: попаданий {hits[True] / max(1, totals[True]):.1%}, "
+          f"новые блюда: ложных попаданий {hits[False] / max(1, totals[False]):.1%}")
+    print(f"подбор: avg {retrieval_ms:.3f} мс, p99 {p99_ms:.3f} мс")
+    print(f"{'':22} {'вызовов AI':>11} {'средняя задержка, с':>20}")
+    print(f"{'только AI':22} {len(requests):11} {args.llm_latency:20.2f}")
+    with_retrieval = retrieval_ms / 1000 + (1 - hit_rate) * args.llm_latency
+    misses = len(requests) - hits[True] - hits[False]
+    print(f"{'подбор, затем AI':22} {misses:11} {with_retrieval:20.2f}  (попаданий {hit_rate:.1%})")
+
+
+if __name__ == "__main__":
+    main()
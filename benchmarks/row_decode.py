@@ -0,0 +1,165 @@
+"""Память на закэшированный объект и стоимость разбора строки БД: до и после.
+
+«До» — прежний формат: обычный dataclass, время строками ISO 8601,
+ingredients и steps разбираются json.loads сразу. «После» — slots-модели,
+время в секундах Unix, ingredients и steps разбираются при первом обращении.
+
+    python -m benchmarks.row_decode
+"""
+import json
+import pickle
+import time
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from database.db import _recipe_from_row, from_epoch
+from models.user import CookingSession
+
+ROWS = 10000
+
+
+@dataclass
+class LegacyRecipe:
+    recipe_id: Optional[int]
+    user_id: int
+    name: str
+    description: str
+    calories: int
+    protein: int
+    fats: int
+    carbs: int
+    cooking_time: int
+    ingredients: List[dict]
+    steps: List[dict]
+    image_url: Optional[str]
+    created_at: datetime
+    is_favorite: bool = False
+
+
+@dataclass
+class LegacyCookingSession:
+    session_id: Optional[int]
+    user_id: int
+    recipe_id: int
+    current_step: int
+    timer_end: Optional[datetime]
+    is_paused: bool
+    created_at: datetime
+    updated_at: datetime
+
+
+def legacy_recipe_from_row(row) -> LegacyRecipe:
+    return LegacyRecipe(
+        recipe_id=row[0],
+        user_id=row[1],
+        name=row[2],
+        description=row[3],
+        calories=row[4],
+        protein=row[5],
+        fats=row[6],
+        carbs=row[7],
+        cooking_time=row[8],
+        ingredients=json.loads(row[9]),
+        steps=json.loads(row[10]),
+        image_url=row[11],
+        is_favorite=bool(row[12]),
+        created_at=datetime.fromisoformat(row[13])
+    )
+
+
+def legacy_session_from_row(row) -> LegacyCookingSession:
+    return LegacyCookingSession(
+        session_id=row[0],
+        user_id=row[1],
+        recipe_id=row[2],
+        current_step=row[3],
+        timer_end=datetime.fromisoformat(row[4]) if row[4] else None,
+        is_paused=bool(row[5]),
+        created_at=datetime.fromisoformat(row[6]),
+        updated_at=datetime.fromisoformat(row[7])
+    )
+
+
+def session_from_row(row) -> CookingSession:
+    return CookingSession(
+        session_id=row[0],
+        user_id=row[1],
+        recipe_id=row[2],
+        current_step=row[3],
+        timer_end=from_epoch(row[4]) if row[4] is not None else None,
+        is_paused=bool(row[5]),
+        created_at=from_epoch(row[6]),
+        updated_at=from_epoch(row[7])
+    )
+
+
+def make_rows(recipe_id: int):
+    now = datetime.now()
+    epoch = int(time.time())
+    ingredients = [{"name": f"Ингредиент {i}", "amount": f"{i * 50}г"} for i in range(1, 9)]
+    steps = [
+        {"step": i, "description": "Обжарить на сковороде до золотистой корочки", "duration": 5}
+        for i in range(1, 7)
+    ]
+    head = (recipe_id, 42, "Курица с овощами", "Сочная куриная грудка с овощами", 450, 42, 12, 35, 35)
+    legacy_recipe = head + (json.dumps(ingredients), json.dumps(steps), None, 1, now.isoformat())
+    recipe = head + (
+        json.dumps(ingredients, ensure_ascii=False, separators=(",", ":")),
+        json.dumps(steps, ensure_ascii=False, separators=(",", ":")),
+        None, 1, epoch
+    )
+    legacy_session = (recipe_id, 42, recipe_id, 2, now.isoformat(), 0, now.isoformat(), now.isoformat())
+    session = (recipe_id, 42, recipe_id, 2, epoch, 0, epoch, epoch)
+    return legacy_recipe, recipe, legacy_session, session
+
+
+def per_row_us(decode, rows) -> float:
+    seconds = min(timeit.repeat(lambda: [decode(row) for row in rows], number=1, repeat=5))
+    return seconds / len(rows) * 1e6
+
+
+def per_object_bytes(decode, rows, touch=None) -> float:
+    """Сколько памяти удерживает объект, включая строки, которые он хранит из строки БД"""
+    payload = pickle.dumps(rows)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fetched = pickle.loads(payload)
+    objects = [decode(row) for row in fetched]
+    del fetched
+    if touch:
+        for obj in objects:
+            touch(obj)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return size / len(rows)
+
+
+def touch_steps(recipe):
+    recipe.steps, recipe.ingredients
+
+
+def main():
+    rows = [make_rows(i) for i in range(ROWS)]
+    legacy_recipes = [r[0] for r in rows]
+    recipes = [r[1] for r in rows]
+    legacy_sessions = [r[2] for r in rows]
+    sessions = [r[3] for r in rows]
+    cases = [
+        ("Recipe до", legacy_recipe_from_row, legacy_recipes, None),
+        ("Recipe после (поля не читали)", _recipe_from_row, recipes, None),
+        ("Recipe после (steps прочитаны)", _recipe_from_row, recipes, touch_steps),
+        ("CookingSession до", legacy_session_from_row, legacy_sessions, None),
+        ("CookingSession после", session_from_row, sessions, None),
+    ]
+    print(f"{'':32} {'разбор, мкс/строка':>20} {'память, байт/объект':>21}")
+    for name, decode, data, touch in cases:
+        decode_cost = per_row_us((lambda row: touch(decode(row))) if touch else decode, data)
+        print(f"{name:32} {decode_cost:20.2f} {per_object_bytes(decode, data, touch):21.0f}")
+
+
+if __name__ == "__main__":
+    main()
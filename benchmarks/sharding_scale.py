@@ -0,0 +1,121 @@
+"""Масштабирование многопроцессной обработки апдейтов от 1 до N процессов.
+
+Супервизор разбирает синтетические апдейты (как при webhook) и раздаёт их
+через ShardRouter процессам по user_id. Обработчик в процессе делает только
+CPU-работу: разбор апдейта aiogram, рендер карточки рецепта и клавиатуры.
+Сеть и БД не используются.
+
+    python -m benchmarks.sharding_scale --updates 20000 --max-processes 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from functools import partial
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+
+from handlers.recipe import format_recipe_text
+from keyboards.recipe_kb import get_recipe_action_keyboard
+from models.user import Recipe
+from services.workers import ShardRouter, UpdateLanes, consume
+
+TOKEN = "42:benchmark"
+
+SAMPLE_RECIPE = Recipe(
+    recipe_id=None,
+    user_id=0,
+    name="Курица с овощами",
+    description="Сочная куриная грудка с запечёнными овощами",
+    calories=450,
+    protein=42,
+    fats=12,
+    carbs=35,
+    cooking_time=35,
+    ingredients=[{"name": f"Ингредиент {i}", "amount": f"{i * 50}г"} for i in range(1, 9)],
+    steps=[{"step": i, "description": "Шаг приготовления", "duration": 5} for i in range(1, 6)],
+    image_url=None,
+    created_at=datetime.now(),
+)
+
+
+def make_update(update_id: int) -> dict:
+    user_id = 1000 + update_id % 997
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": "Хочу курицу с овощами",
+        },
+    }
+
+
+async def _bench_worker_main(work: int, ready, inbox):
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        for _ in range(work):
+            format_recipe_text(SAMPLE_RECIPE)
+            get_recipe_action_keyboard().model_dump_json()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(TOKEN)
+    lanes = UpdateLanes(dp, bot)
+    lanes.start()
+    ready.put(True)
+    await consume(inbox, bot, lanes)
+    await lanes.stop()
+    await bot.session.close()
+
+
+def bench_worker(work: int, ready, shard: int, shards: int, inbox):
+    asyncio.run(_bench_worker_main(work, ready, inbox))
+
+
+async def bench(processes: int, payloads: list, work: int) -> float:
+    ready = multiprocessing.get_context("spawn").Queue()
+    router = ShardRouter(processes, target=partial(bench_worker, work, ready))
+    router.start()
+    for _ in range(processes):
+        await asyncio.to_thread(ready.get)
+
+    started = time.perf_counter()
+    for raw in payloads:
+        update = json.loads(raw)
+        while not router.route(update, raw):
+            await asyncio.sleep(0.001)
+    await router.stop()
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--work", type=int, default=10, help="Рендеров карточки на апдейт")
+    args = parser.parse_args()
+
+    payloads = [
+        json.dumps(make_update(i), ensure_ascii=False).encode()
+        for i in range(1, args.updates + 1)
+    ]
+    print(f"CPU: {os.cpu_count()}, апдейтов: {args.updates}")
+    baseline = None
+    for processes in range(1, args.max_processes + 1):
+        elapsed = await bench(processes, payloads, args.work)
+        rate = args.updates / elapsed
+        baseline = baseline or rate
+        print(f"процессов {processes:2}: {rate:9.0f} upd/s  x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
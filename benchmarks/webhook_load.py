@@ -0,0 +1,196 @@
+"""Нагрузочный тест приёма апдейтов: webhook против polling.
+
+Всё работает локально. Апдейты «приходят в Telegram» с постоянной
+скоростью --rate. Для webhook каждый апдейт сразу отправляется POST-запросом
+в WebhookServer; для polling поднимается фейковый Bot API, который отдаёт
+накопленные апдейты через getUpdates. Обработчик имитирует работу с БД
+коротким sleep, --rtt задаёт время пути до Telegram и обратно. Задержка
+считается от появления апдейта до конца обработки.
+
+    python -m benchmarks.webhook_load --updates 5000 --rate 2000 --rtt 0.05
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import AsyncIterator, Dict, List
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from aiohttp import ClientSession, web
+
+from services.webhook import SECRET_HEADER, WebhookServer
+
+TOKEN = "42:benchmark"
+HOST = "127.0.0.1"
+API_PORT = 18081
+WEBHOOK_PORT = 18080
+SECRET = "benchmark-secret"
+
+
+def make_update(update_id: int) -> dict:
+    user_id = 1000 + update_id % 500
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": "Хочу курицу с овощами",
+        },
+    }
+
+
+class Probe:
+    """Отметки времени отправки и обработки апдейтов"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.sent: Dict[int, float] = {}
+        self.latencies: List[float] = []
+        self.done = asyncio.Event()
+
+    def make_dispatcher(self, handler_delay: float) -> Dispatcher:
+        router = Router()
+
+        @router.message()
+        async def handler(message: Message):
+            await asyncio.sleep(handler_delay)
+            self.latencies.append(time.perf_counter() - self.sent[message.message_id])
+            if len(self.latencies) >= self.total:
+                self.done.set()
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        return dp
+
+    def report(self, name: str, elapsed: float):
+        latencies = sorted(self.latencies)
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        print(
+            f"{name:8} {len(latencies) / elapsed:9.0f} upd/s   "
+            f"latency ms: avg {statistics.mean(latencies) * 1000:7.1f}  "
+            f"p50 {p(0.5):7.1f}  p95 {p(0.95):7.1f}  p99 {p(0.99):7.1f}"
+        )
+
+
+async def arrivals(probe: Probe, total: int, rate: float) -> AsyncIterator[int]:
+    """Номера апдейтов в моменты их появления, rate апдейтов в секунду"""
+    started = time.perf_counter()
+    for update_id in range(1, total + 1):
+        delay = started + update_id / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        probe.sent[update_id] = time.perf_counter()
+        yield update_id
+
+
+async def bench_webhook(total: int, rate: float, rtt: float, workers: int, handler_delay: float):
+    probe = Probe(total)
+    bot = Bot(TOKEN)
+    server = WebhookServer(
+        probe.make_dispatcher(handler_delay), bot, SECRET, workers, queue_size=total
+    )
+    runner = web.AppRunner(server.make_app("/webhook"))
+    await runner.setup()
+    await web.TCPSite(runner, HOST, WEBHOOK_PORT).start()
+    server.start()
+
+    url = f"http://{HOST}:{WEBHOOK_PORT}/webhook"
+
+    async with ClientSession() as session:
+        async def deliver(update_id: int):
+            await asyncio.sleep(rtt / 2)
+            async with session.post(
+                url, json=make_update(update_id), headers={SECRET_HEADER: SECRET}
+            ) as response:
+                assert response.status == 200, response.status
+
+        started = time.perf_counter()
+        deliveries = [
+            asyncio.create_task(deliver(update_id))
+            async for update_id in arrivals(probe, total, rate)
+        ]
+        await asyncio.gather(*deliveries)
+        await probe.done.wait()
+        elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    await server.stop()
+    await bot.session.close()
+    probe.report("webhook", elapsed)
+    stats = server.stats()
+    print(f"         queue wait avg {stats['wait_time']['avg'] * 1000:.1f} ms, rejected {stats['rejected']}")
+
+
+async def bench_polling(total: int, rate: float, rtt: float, handler_delay: float):
+    """Polling против фейкового Bot API"""
+    probe = Probe(total)
+    updates: List[dict] = []
+    arrived = asyncio.Event()
+
+    async def get_me(request: web.Request) -> web.Response:
+        return web.json_response({"ok": True, "result": {
+            "id": 42, "is_bot": True, "first_name": "Bench", "username": "bench_bot"
+        }})
+
+    async def get_updates(request: web.Request) -> web.Response:
+        form = await request.post()
+        # Запрос идёт до Telegram, ответ — обратно
+        await asyncio.sleep(rtt / 2)
+        offset = int(form.get("offset") or 1)
+        timeout = float(form.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        while len(updates) < offset and time.monotonic() < deadline:
+            arrived.clear()
+            try:
+                await asyncio.wait_for(arrived.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+        result = updates[offset - 1:offset - 1 + 100]
+        await asyncio.sleep(rtt / 2)
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application()
+    app.router.add_post(f"/bot{TOKEN}/getMe", get_me)
+    app.router.add_post(f"/bot{TOKEN}/getUpdates", get_updates)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, API_PORT).start()
+
+    api = TelegramAPIServer.from_base(f"http://{HOST}:{API_PORT}", is_local=True)
+    bot = Bot(TOKEN, session=AiohttpSession(api=api))
+    dp = probe.make_dispatcher(handler_delay)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+
+    started = time.perf_counter()
+    async for update_id in arrivals(probe, total, rate):
+        updates.append(make_update(update_id))
+        arrived.set()
+    await probe.done.wait()
+    elapsed = time.perf_counter() - started
+
+    await dp.stop_polling()
+    await polling
+    await runner.cleanup()
+    probe.report("polling", elapsed)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=2000, help="Скорость поступления, апдейтов в секунду")
+    parser.add_argument("--rtt", type=float, default=0.05, help="Время пути до Telegram и обратно, секунды")
+    parser.add_argument("--workers", type=int, default=16, help="Воркеров webhook")
+    parser.add_argument("--handler-delay", type=float, default=0.002, help="Работа обработчика, секунды")
+    args = parser.parse_args()
+
+    await bench_webhook(args.updates, args.rate, args.rtt, args.workers, args.handler_delay)
+    await bench_polling(args.updates, args.rate, args.rtt, args.handler_delay)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
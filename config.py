@@ -1,4 +1,5 @@
 import os
+import secrets
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,20 +7,83 @@ load_dotenv()
 # Telegram Bot
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Webhook: если WEBHOOK_URL не задан, бот работает через polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный HTTPS-адрес, например https://example.com/webhook
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token; без переменной окружения — случайный
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_WORKERS = 16  # Сколько апдейтов обрабатывать одновременно
+WEBHOOK_QUEUE_SIZE = 1000  # Максимальная длина очереди апдейтов; сверх неё отвечаем 503
+WEBHOOK_DRAIN_TIMEOUT = 30  # Сколько секунд дообрабатывать очередь при остановке
+
+# Многопроцессный режим: при WORKER_PROCESSES > 1 апдейты распределяются по процессам по user_id
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+WORKER_LANES = 16  # Сколько пользователей процесс обслуживает одновременно
+
 MODEL = "HuggingFaceTB/SmolLM3-3B"
 
 
 # AI API Configuration
 AI_API_URL = "https://router.huggingface.co/hf-inference/models/HuggingFaceTB/SmolLM3-3B"
 AI_API_TOKEN = os.getenv("AI_API_TOKEN")
+AI_CONNECT_TIMEOUT = 10  # Таймаут установки соединения, секунды
+AI_READ_TIMEOUT = 60  # Таймаут чтения ответа, секунды
+AI_MAX_CONNECTIONS_PER_HOST = 20  # Максимум одновременных запросов к API
+AI_KEEPALIVE_TIMEOUT = 60  # Сколько держать простаивающее соединение открытым
+AI_WORKERS = 8  # Сколько генераций выполнять одновременно
+AI_QUEUE_SIZE = 100  # Максимальная длина очереди генераций
+AI_USER_RATE = 1 / 20  # Скорость пополнения лимита пользователя, генераций в секунду
+AI_USER_BURST = 3  # Сколько генераций подряд можно сделать без ожидания
 
 # Database
 DB_PATH = "data/cooking_bot.db"
+DB_READER_POOL_SIZE = 4  # Количество соединений для чтения
+DB_CACHE_SIZE_KB = 16384  # Размер страничного кэша SQLite на соединение
+DB_MMAP_SIZE = 256 * 1024 * 1024  # Размер memory-mapped области
+DB_STATEMENT_CACHE_SIZE = 256  # Кэш подготовленных запросов на соединение
+DB_BUSY_TIMEOUT_MS = 5000  # Ожидание блокировки БД
+
+# FSM storage
+FSM_TTL = 7 * 24 * 3600  # Через сколько секунд без изменений состояние диалога удаляется
+FSM_FLUSH_INTERVAL = 0.05  # Как часто записывать накопленные изменения состояний, секунды
+FSM_PURGE_INTERVAL = 3600  # Как часто удалять просроченные состояния, секунды
+
+# Caches
+USER_CACHE_SIZE = 10000  # Сколько профилей держать в памяти
+USER_CACHE_TTL = 300  # Время жизни профиля в кэше, секунды
+RECIPE_CACHE_SIZE = 5000  # Сколько декодированных рецептов держать в памяти
+AI_CACHE_SIZE = 50000  # Сколько ответов AI хранить в БД
+AI_CACHE_TTL_DAYS = 30  # Через сколько дней ответ AI считается устаревшим
+
+# Favorites
+FAVORITES_PAGE_SIZE = 10  # Сколько рецептов показывать на странице избранного
+
+# Search
+SEARCH_PAGE_SIZE = 10  # Сколько результатов /search показывать на странице
+
+# Local retrieval: подбор уже сгенерированного рецепта до запроса к AI
+RETRIEVAL_REFRESH_INTERVAL = 300  # Как часто (секунды) добавлять в индекс новые тела рецептов
+RETRIEVAL_BATCH_SIZE = 2000  # Сколько тел загружать за один запрос к БД
+RETRIEVAL_CANDIDATES = 5  # Сколько лучших кандидатов пробовать загрузить (тело могли удалить)
+RETRIEVAL_FIT_WEIGHT = 0.5  # Вес соответствия КБЖУ цели против текстовой релевантности
+
+# Nutrition: проверка КБЖУ ответа AI по таблице ингредиентов (services/nutrition.py)
+NUTRITION_TOLERANCE = 0.25  # Относительное расхождение с расчётом, после которого берутся расчётные КБЖУ
+NUTRITION_MIN_COVERAGE = 0.9  # Какая доля массы ингредиентов должна найтись в таблице, чтобы проверять
 
 # Cooking timer settings
-TIMER_CHECK_INTERVAL = 10  # Проверка таймеров каждые 10 секунд
+TIMER_RESTORE_BATCH_SIZE = 500  # Сколько сессий загружать за раз при восстановлении таймеров
+TIMER_MAX_CONCURRENT_FIRES = 20  # Сколько сработавших таймеров обрабатывать одновременно (после простоя их много)
 
 # Recipe generation settings
-MAX_RECIPE_ATTEMPTS = 5  # Максимум попыток генерации рецепта
+MAX_RECIPE_ATTEMPTS = 5  # Максимум попыток получить разбираемый рецепт: ответ и запросы на исправление
+RECIPE_REPAIR_BACKOFF = 0.5  # Пауза перед первым запросом на исправление, секунды; дальше удваивается
 RECIPE_HISTORY_SIZE = 10  # Сколько последних рецептов хранить для избежания повторов
+SPECULATIVE_ALTERNATIVES = 1  # Сколько альтернатив генерировать заранее (0 — выключено)
+SPECULATIVE_TTL = 300  # Сколько секунд хранить и догенерировать альтернативы
+STREAM_EDIT_INTERVAL = 1.5  # Минимальный интервал между правками сообщения при потоковой генерации
+# Доля пользователей с компактным промптом генерации (A/B: 0 — только подробный, 1 — только компактный)
+PROMPT_COMPACT_SHARE = float(os.getenv("PROMPT_COMPACT_SHARE", "0.5"))
 
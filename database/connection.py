@@ -0,0 +1,94 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
+
+from config import (
+    DB_PATH,
+    DB_READER_POOL_SIZE,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_BUSY_TIMEOUT_MS,
+)
+
+
+class ConnectionManager:
+    """Долгоживущие соединения с SQLite: один писатель и пул читателей"""
+
+    def __init__(self, path: str, readers: int = DB_READER_POOL_SIZE):
+        self.path = path
+        self.readers_count = readers
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+
+    async def _connect(self, readonly: bool) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, cached_statements=DB_STATEMENT_CACHE_SIZE)
+        await conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        await conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        await conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        await conn.execute("PRAGMA synchronous = NORMAL")
+        if readonly:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    async def open(self):
+        """Открыть соединения (повторный вызов ничего не делает)"""
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            writer = await self._connect(readonly=False)
+            # WAL сохраняется в файле БД, достаточно включить его один раз
+            await writer.execute("PRAGMA journal_mode = WAL")
+            await writer.commit()
+
+            self._idle_readers = asyncio.Queue()
+            for _ in range(self.readers_count):
+                reader = await self._connect(readonly=True)
+                self._readers.append(reader)
+                self._idle_readers.put_nowait(reader)
+            self._writer = writer
+
+    async def close(self):
+        """Закрыть все соединения"""
+        async with self._open_lock:
+            for reader in self._readers:
+                await reader.close()
+            self._readers.clear()
+            self._idle_readers = None
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение только для чтения из пула"""
+        if self._writer is None:
+            await self.open()
+        queue = self._idle_readers
+        conn = await queue.get()
+        try:
+            yield conn
+        finally:
+            queue.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Единственное соединение для записи; коммит при выходе из блока"""
+        if self._writer is None:
+            await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
+
+
+manager = ConnectionManager(DB_PATH)
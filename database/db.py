@@ -1,86 +1,87 @@
-import aiosqlite
 import json
+import time
+from dataclasses import replace
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from pathlib import Path
 
-from config import DB_PATH
-from models.user import UserProfile, Recipe, CookingSession, RecipeHistory
+from config import USER_CACHE_SIZE, USER_CACHE_TTL, RECIPE_CACHE_SIZE, RECIPE_HISTORY_SIZE
+from database.connection import manager
+from database.migrations import RECIPE_BODY_COLUMNS, recipe_body_hash, run_migrations
+from models.user import UserProfile, Recipe, RecipeSummary, CookingSession, RecipeHistory
+from services.cache import LRUCache
+from services.text import search_terms
+
+# Кэш профилей для UserMiddleware, обновляется при save_user
+user_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+# Декодированные рецепты по recipe_id; после сохранения рецепты не меняются
+recipe_cache = LRUCache(RECIPE_CACHE_SIZE)
+
+
+def to_epoch(value: datetime) -> int:
+    """datetime в секунды Unix для хранения в БД"""
+    return int(value.timestamp())
+
+
+def from_epoch(value: int) -> datetime:
+    """Обратное преобразование to_epoch"""
+    return datetime.fromtimestamp(value)
+
+
+# Столбцы для _recipe_from_row: строка recipes вместе с телом из recipe_bodies
+_RECIPE_SELECT = """
+    SELECT r.recipe_id, r.user_id, b.name, b.description, b.calories, b.protein, b.fats,
+           b.carbs, b.cooking_time, b.ingredients, b.steps, b.image_url,
+           r.is_favorite, r.created_at
+    FROM recipes r JOIN recipe_bodies b ON b.body_hash = r.body_hash
+"""
+
+
+def _recipe_from_row(row) -> Recipe:
+    """Recipe из строки _RECIPE_SELECT; ingredients и steps разбираются лениво"""
+    return Recipe.from_encoded(
+        recipe_id=row[0],
+        user_id=row[1],
+        name=row[2],
+        description=row[3],
+        calories=row[4],
+        protein=row[5],
+        fats=row[6],
+        carbs=row[7],
+        cooking_time=row[8],
+        ingredients=row[9],
+        steps=row[10],
+        image_url=row[11],
+        is_favorite=bool(row[12]),
+        created_at=from_epoch(row[13])
+    )
+
+
+def get_cache_stats() -> dict:
+    """Статистика кэшей для подбора их размеров"""
+    return {
+        "users": user_cache.stats(),
+        "recipes": recipe_cache.stats(),
+    }
 
 
 async def init_db():
     """Инициализация базы данных"""
     Path("data").mkdir(exist_ok=True)
+    await manager.open()
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Таблица пользователей
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                goal TEXT NOT NULL,
-                dietary_restrictions TEXT,
-                has_oven BOOLEAN,
-                has_microwave BOOLEAN,
-                has_stove BOOLEAN,
-                created_at TIMESTAMP,
-                updated_at TIMESTAMP
-            )
-        """)
-        
-        # Таблица рецептов
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS recipes (
-                recipe_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                name TEXT NOT NULL,
-                description TEXT,
-                calories INTEGER,
-                protein INTEGER,
-                fats INTEGER,
-                carbs INTEGER,
-                cooking_time INTEGER,
-                ingredients TEXT,
-                steps TEXT,
-                image_url TEXT,
-                is_favorite BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        # Таблица активных сессий готовки
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS cooking_sessions (
-                session_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                recipe_id INTEGER,
-                current_step INTEGER,
-                timer_end TIMESTAMP,
-                is_paused BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP,
-                updated_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id)
-            )
-        """)
-        
-        # История рецептов для избежания повторов
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS recipe_history (
-                user_id INTEGER,
-                recipe_name TEXT,
-                created_at TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        await db.commit()
+    async with manager.write() as db:
+        await run_migrations(db)
+
+
+async def close_db():
+    """Закрыть соединения с базой данных"""
+    await manager.close()
 
 
 async def get_user(user_id: int) -> Optional[UserProfile]:
     """Получить профиль пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with manager.read() as db:
         async with db.execute(
             "SELECT * FROM users WHERE user_id = ?", (user_id,)
         ) as cursor:
@@ -94,15 +95,15 @@ async def get_user(user_id: int) -> Optional[UserProfile]:
                     has_oven=bool(row[4]),
                     has_microwave=bool(row[5]),
                     has_stove=bool(row[6]),
-                    created_at=datetime.fromisoformat(row[7]),
-                    updated_at=datetime.fromisoformat(row[8])
+                    created_at=from_epoch(row[7]),
+                    updated_at=from_epoch(row[8])
                 )
     return None
 
 
 async def save_user(profile: UserProfile):
     """Сохранить профиль пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with manager.write() as db:
         await db.execute("""
             INSERT OR REPLACE INTO users 
             (user_id, name, goal, dietary_restrictions, has_oven, has_microwave, 
@@ -116,117 +117,196 @@ async def save_user(profile: UserProfile):
             profile.has_oven,
             profile.has_microwave,
             profile.has_stove,
-            profile.created_at.isoformat(),
-            profile.updated_at.isoformat()
+            to_epoch(profile.created_at),
+            to_epoch(profile.updated_at)
         ))
-        await db.commit()
+    user_cache.set(profile.user_id, replace(
+        profile, dietary_restrictions=list(profile.dietary_restrictions)
+    ))
+
+
+async def _save_body(db, recipe: Recipe) -> bytes:
+    """Записать тело рецепта, если такого ещё нет; вернуть его хэш"""
+    body = (
+        recipe.name,
+        recipe.description,
+        recipe.calories,
+        recipe.protein,
+        recipe.fats,
+        recipe.carbs,
+        recipe.cooking_time,
+        recipe.encoded("ingredients"),
+        recipe.encoded("steps"),
+        recipe.image_url,
+    )
+    body_hash = recipe_body_hash(*body)
+    # Основы слов для индекса recipe_search (см. миграцию _recipe_search)
+    terms = (
+        search_terms(recipe.name),
+        search_terms(recipe.description or ""),
+        search_terms(" ".join(str(item.get("name", "")) for item in recipe.ingredients)),
+    )
+    await db.execute(f"""
+        INSERT OR IGNORE INTO recipe_bodies (
+            body_hash, {", ".join(RECIPE_BODY_COLUMNS)},
+            search_name, search_description, search_ingredients
+        )
+        VALUES ({", ".join("?" * (len(body) + len(terms) + 1))})
+    """, (body_hash,) + body + terms)
+    return body_hash
+
+
+async def _delete_orphan_bodies(db, body_hashes: Optional[List[bytes]] = None):
+    """Удалить тела, на которые не ссылаются ни рецепты, ни кэш AI.
+
+    Без body_hashes проверяются все тела.
+    """
+    condition = ""
+    if body_hashes is not None:
+        if not body_hashes:
+            return
+        condition = f"body_hash IN ({', '.join('?' * len(body_hashes))}) AND"
+    await db.execute(f"""
+        DELETE FROM recipe_bodies WHERE {condition}
+            NOT EXISTS (SELECT 1 FROM recipes r WHERE r.body_hash = recipe_bodies.body_hash)
+            AND NOT EXISTS (SELECT 1 FROM recipe_cache c WHERE c.body_hash = recipe_bodies.body_hash)
+    """, body_hashes or ())
 
 
 async def save_recipe(recipe: Recipe) -> int:
-    """Сохранить рецепт и вернуть его ID"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Сохранить рецепт и вернуть его ID; одинаковые тела хранятся один раз"""
+    async with manager.write() as db:
+        body_hash = await _save_body(db, recipe)
         cursor = await db.execute("""
-            INSERT INTO recipes 
-            (user_id, name, description, calories, protein, fats, carbs, 
-             cooking_time, ingredients, steps, image_url, is_favorite, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO recipes (user_id, body_hash, is_favorite, created_at)
+            VALUES (?, ?, ?, ?)
         """, (
             recipe.user_id,
-            recipe.name,
-            recipe.description,
-            recipe.calories,
-            recipe.protein,
-            recipe.fats,
-            recipe.carbs,
-            recipe.cooking_time,
-            json.dumps(recipe.ingredients),
-            json.dumps(recipe.steps),
-            recipe.image_url,
+            body_hash,
             recipe.is_favorite,
-            recipe.created_at.isoformat()
+            to_epoch(recipe.created_at)
         ))
-        await db.commit()
         return cursor.lastrowid
 
 
 async def get_recipe(recipe_id: int) -> Optional[Recipe]:
     """Получить рецепт по ID"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    recipe = recipe_cache.get(recipe_id)
+    if recipe is not None:
+        return recipe
+
+    async with manager.read() as db:
         async with db.execute(
-            "SELECT * FROM recipes WHERE recipe_id = ?", (recipe_id,)
+            f"{_RECIPE_SELECT} WHERE r.recipe_id = ?", (recipe_id,)
         ) as cursor:
             row = await cursor.fetchone()
             if row:
-                return Recipe(
-                    recipe_id=row[0],
-                    user_id=row[1],
-                    name=row[2],
-                    description=row[3],
-                    calories=row[4],
-                    protein=row[5],
-                    fats=row[6],
-                    carbs=row[7],
-                    cooking_time=row[8],
-                    ingredients=json.loads(row[9]),
-                    steps=json.loads(row[10]),
-                    image_url=row[11],
-                    is_favorite=bool(row[12]),
-                    created_at=datetime.fromisoformat(row[13])
-                )
+                recipe = _recipe_from_row(row)
+                recipe_cache.set(recipe_id, recipe)
+                return recipe
     return None
 
 
-async def get_favorites(user_id: int) -> List[Recipe]:
-    """Получить избранные рецепты пользователя"""
-    recipes = []
-    async with aiosqlite.connect(DB_PATH) as db:
+async def get_favorites_page(
+    user_id: int,
+    limit: int,
+    anchor: Optional[Tuple[int, int]] = None,
+    backward: bool = False
+) -> Tuple[List[RecipeSummary], bool]:
+    """Страница избранного, новые сначала, и признак того, что дальше есть ещё.
+
+    anchor — (created_at, recipe_id) крайней показанной записи: страница
+    берётся после неё, а при backward=True — перед ней. Читаются только
+    поля для кнопок, ingredients и steps не разбираются.
+    """
+    condition = ""
+    params: list = [user_id]
+    if anchor is not None:
+        condition = f"AND (r.created_at, r.recipe_id) {'>' if backward else '<'} (?, ?)"
+        params.extend(anchor)
+    order = "ASC" if backward else "DESC"
+    params.append(limit + 1)
+
+    async with manager.read() as db:
+        async with db.execute(f"""
+            SELECT r.recipe_id, b.name, b.cooking_time, r.created_at
+            FROM recipes r JOIN recipe_bodies b ON b.body_hash = r.body_hash
+            WHERE r.user_id = ? AND r.is_favorite = 1 {condition}
+            ORDER BY r.created_at {order}, r.recipe_id {order}
+            LIMIT ?
+        """, params) as cursor:
+            rows = await cursor.fetchall()
+
+    items = [RecipeSummary(row[0], row[1], row[2], row[3]) for row in rows[:limit]]
+    if backward:
+        items.reverse()
+    return items, len(rows) > limit
+
+
+async def count_favorites(user_id: int) -> int:
+    """Количество избранных рецептов (считается по индексу idx_recipes_user_favorite)"""
+    async with manager.read() as db:
         async with db.execute(
-            "SELECT * FROM recipes WHERE user_id = ? AND is_favorite = 1 ORDER BY created_at DESC",
-            (user_id,)
+            "SELECT COUNT(*) FROM recipes WHERE user_id = ? AND is_favorite = 1", (user_id,)
         ) as cursor:
-            async for row in cursor:
-                recipes.append(Recipe(
-                    recipe_id=row[0],
-                    user_id=row[1],
-                    name=row[2],
-                    description=row[3],
-                    calories=row[4],
-                    protein=row[5],
-                    fats=row[6],
-                    carbs=row[7],
-                    cooking_time=row[8],
-                    ingredients=json.loads(row[9]),
-                    steps=json.loads(row[10]),
-                    image_url=row[11],
-                    is_favorite=bool(row[12]),
-                    created_at=datetime.fromisoformat(row[13])
-                ))
-    return recipes
+            return (await cursor.fetchone())[0]
+
+
+async def search_recipes(
+    user_id: int,
+    terms: List[str],
+    limit: int,
+    offset: int = 0
+) -> Tuple[List[RecipeSummary], bool]:
+    """Рецепты пользователя, содержащие все основы слов terms (services.text),
+    лучшие совпадения сначала, и признак того, что дальше есть ещё.
+    Повторы одного тела схлопываются в самый свежий рецепт.
+    """
+    # Термы в индексе принадлежат пользователю: см. миграцию _recipe_search
+    match = " AND ".join(f'"u{user_id}u{term}"' for term in terms)
+    async with manager.read() as db:
+        async with db.execute("""
+            SELECT MAX(r.recipe_id), b.name, b.cooking_time, r.created_at, MIN(s.rank) AS score
+            FROM recipe_search s
+            JOIN recipes r ON r.recipe_id = s.rowid
+            JOIN recipe_bodies b ON b.body_hash = r.body_hash
+            WHERE recipe_search MATCH ?
+            GROUP BY r.body_hash
+            ORDER BY score, MAX(r.recipe_id) DESC
+            LIMIT ? OFFSET ?
+        """, (match, limit + 1, offset)) as cursor:
+            rows = await cursor.fetchall()
+    items = [RecipeSummary(row[0], row[1], row[2], row[3]) for row in rows[:limit]]
+    return items, len(rows) > limit
 
 
 async def toggle_favorite(recipe_id: int):
     """Переключить статус избранного"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with manager.write() as db:
         await db.execute(
             "UPDATE recipes SET is_favorite = NOT is_favorite WHERE recipe_id = ?",
             (recipe_id,)
         )
-        await db.commit()
+    recipe = recipe_cache.peek(recipe_id)
+    if recipe is not None:
+        recipe.is_favorite = not recipe.is_favorite
 
 
 async def delete_favorite(recipe_id: int):
-    """Удалить рецепт из избранного"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "DELETE FROM recipes WHERE recipe_id = ?",
+    """Удалить рецепт из избранного и его тело, если оно больше нигде не используется"""
+    async with manager.write() as db:
+        async with db.execute(
+            "DELETE FROM recipes WHERE recipe_id = ? RETURNING body_hash",
             (recipe_id,)
-        )
-        await db.commit()
+        ) as cursor:
+            body_hashes = [row[0] for row in await cursor.fetchall()]
+        await _delete_orphan_bodies(db, body_hashes)
+    recipe_cache.pop(recipe_id)
 
 
 async def save_cooking_session(session: CookingSession) -> int:
     """Сохранить сессию готовки"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with manager.write() as db:
         # Удаляем старую сессию пользователя
         await db.execute("DELETE FROM cooking_sessions WHERE user_id = ?", (session.user_id,))
         
@@ -238,18 +318,17 @@ async def save_cooking_session(session: CookingSession) -> int:
             session.user_id,
             session.recipe_id,
             session.current_step,
-            session.timer_end.isoformat() if session.timer_end else None,
+            to_epoch(session.timer_end) if session.timer_end else None,
             session.is_paused,
-            session.created_at.isoformat(),
-            session.updated_at.isoformat()
+            to_epoch(session.created_at),
+            to_epoch(session.updated_at)
         ))
-        await db.commit()
         return cursor.lastrowid
 
 
 async def get_cooking_session(user_id: int) -> Optional[CookingSession]:
     """Получить активную сессию готовки"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with manager.read() as db:
         async with db.execute(
             "SELECT * FROM cooking_sessions WHERE user_id = ?", (user_id,)
         ) as cursor:
@@ -260,56 +339,182 @@ async def get_cooking_session(user_id: int) -> Optional[CookingSession]:
                     user_id=row[1],
                     recipe_id=row[2],
                     current_step=row[3],
-                    timer_end=datetime.fromisoformat(row[4]) if row[4] else None,
+                    timer_end=from_epoch(row[4]) if row[4] is not None else None,
                     is_paused=bool(row[5]),
-                    created_at=datetime.fromisoformat(row[6]),
-                    updated_at=datetime.fromisoformat(row[7])
+                    created_at=from_epoch(row[6]),
+                    updated_at=from_epoch(row[7])
                 )
     return None
 
 
 async def update_cooking_session(session: CookingSession):
     """Обновить сессию готовки"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with manager.write() as db:
         await db.execute("""
             UPDATE cooking_sessions 
             SET current_step = ?, timer_end = ?, is_paused = ?, updated_at = ?
             WHERE session_id = ?
         """, (
             session.current_step,
-            session.timer_end.isoformat() if session.timer_end else None,
+            to_epoch(session.timer_end) if session.timer_end else None,
             session.is_paused,
-            datetime.now().isoformat(),
+            int(time.time()),
             session.session_id
         ))
-        await db.commit()
+
+
+async def get_running_cooking_sessions(
+    after_session_id: int = 0,
+    limit: int = 500,
+    shard: int = 0,
+    shards: int = 1
+) -> List[Tuple[int, int, datetime]]:
+    """Страница запущенных таймеров (session_id, user_id, timer_end) после after_session_id.
+
+    Возвращаются только сессии пользователей шарда: user_id % shards == shard.
+    """
+    sessions = []
+    async with manager.read() as db:
+        async with db.execute("""
+            SELECT session_id, user_id, timer_end FROM cooking_sessions
+            WHERE session_id > ? AND is_paused = 0 AND timer_end IS NOT NULL
+              AND user_id % ? = ?
+            ORDER BY session_id
+            LIMIT ?
+        """, (after_session_id, shards, shard, limit)) as cursor:
+            async for row in cursor:
+                sessions.append((row[0], row[1], from_epoch(row[2])))
+    return sessions
 
 
 async def delete_cooking_session(user_id: int):
     """Удалить сессию готовки"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with manager.write() as db:
         await db.execute("DELETE FROM cooking_sessions WHERE user_id = ?", (user_id,))
-        await db.commit()
 
 
 async def add_recipe_to_history(user_id: int, recipe_name: str):
-    """Добавить рецепт в историю"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    """Добавить рецепт в историю, храня только последние RECIPE_HISTORY_SIZE уникальных названий"""
+    async with manager.write() as db:
+        await db.execute(
+            "DELETE FROM recipe_history WHERE user_id = ? AND recipe_name = ?",
+            (user_id, recipe_name)
+        )
         await db.execute("""
             INSERT INTO recipe_history (user_id, recipe_name, created_at)
             VALUES (?, ?, ?)
-        """, (user_id, recipe_name, datetime.now().isoformat()))
-        await db.commit()
+        """, (user_id, recipe_name, int(time.time())))
+        await db.execute("""
+            DELETE FROM recipe_history WHERE user_id = ? AND rowid NOT IN (
+                SELECT rowid FROM recipe_history WHERE user_id = ?
+                ORDER BY created_at DESC, rowid DESC LIMIT ?
+            )
+        """, (user_id, user_id, RECIPE_HISTORY_SIZE))
 
 
 async def get_recent_recipe_names(user_id: int, limit: int = 10) -> List[str]:
     """Получить названия недавних рецептов"""
     names = []
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with manager.read() as db:
         async with db.execute(
-            "SELECT recipe_name FROM recipe_history WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+            "SELECT recipe_name FROM recipe_history WHERE user_id = ? "
+            "ORDER BY created_at DESC, rowid DESC LIMIT ?",
             (user_id, limit)
         ) as cursor:
             async for row in cursor:
                 names.append(row[0])
-    return names
\ No newline at end of file
+    return names
+
+def _recipe_from_body(row, user_id: int) -> Recipe:
+    """Новый, ещё не сохранённый рецепт user_id из строки recipe_bodies (столбцы RECIPE_BODY_COLUMNS)"""
+    return Recipe.from_encoded(
+        recipe_id=None,
+        user_id=user_id,
+        name=row[0],
+        description=row[1],
+        calories=row[2],
+        protein=row[3],
+        fats=row[4],
+        carbs=row[5],
+        cooking_time=row[6],
+        ingredients=row[7],
+        steps=row[8],
+        image_url=row[9],
+        created_at=datetime.now()
+    )
+
+
+async def get_cached_recipes(cache_key: str, min_created_at: datetime, user_id: int) -> List[Recipe]:
+    """Закэшированные рецепты по ключу для user_id, начиная с самых популярных"""
+    columns = ", ".join(f"b.{column}" for column in RECIPE_BODY_COLUMNS)
+    async with manager.read() as db:
+        async with db.execute(f"""
+            SELECT {columns}
+            FROM recipe_cache c JOIN recipe_bodies b ON b.body_hash = c.body_hash
+            WHERE c.cache_key = ? AND c.created_at >= ?
+            ORDER BY c.hits DESC
+        """, (cache_key, to_epoch(min_created_at))) as cursor:
+            return [_recipe_from_body(row, user_id) for row in await cursor.fetchall()]
+
+
+async def get_recipe_body(body_hash: bytes, user_id: int) -> Optional[Recipe]:
+    """Рецепт для user_id из тела с хэшем body_hash; None, если тело уже удалено"""
+    async with manager.read() as db:
+        async with db.execute(
+            f"SELECT {', '.join(RECIPE_BODY_COLUMNS)} FROM recipe_bodies WHERE body_hash = ?",
+            (body_hash,)
+        ) as cursor:
+            row = await cursor.fetchone()
+    return _recipe_from_body(row, user_id) if row else None
+
+
+async def get_recipe_bodies_for_index(after_rowid: int, limit: int) -> List[tuple]:
+    """Страница тел рецептов для локального поиска (services.retrieval) после after_rowid:
+    (rowid, body_hash, name, calories, protein, fats, carbs, cooking_time,
+     search_name, search_description, search_ingredients, steps)
+    """
+    async with manager.read() as db:
+        async with db.execute("""
+            SELECT rowid, body_hash, name, calories, protein, fats, carbs, cooking_time,
+                   search_name, search_description, search_ingredients, steps
+            FROM recipe_bodies WHERE rowid > ?
+            ORDER BY rowid
+            LIMIT ?
+        """, (after_rowid, limit)) as cursor:
+            return await cursor.fetchall()
+
+
+async def touch_cached_recipe(cache_key: str, name: str):
+    """Отметить использование записи кэша"""
+    async with manager.write() as db:
+        await db.execute("""
+            UPDATE recipe_cache SET hits = hits + 1, last_used_at = ?
+            WHERE cache_key = ? AND name = ?
+        """, (int(time.time()), cache_key, name))
+
+
+async def put_cached_recipe(cache_key: str, recipe: Recipe):
+    """Положить рецепт в кэш; тело, которое запись заменила, удалит evict_cached_recipes"""
+    now = int(time.time())
+    async with manager.write() as db:
+        body_hash = await _save_body(db, recipe)
+        await db.execute("""
+            INSERT OR REPLACE INTO recipe_cache
+            (cache_key, name, body_hash, created_at, last_used_at, hits)
+            VALUES (?, ?, ?, ?, ?, 0)
+        """, (cache_key, recipe.name, body_hash, now, now))
+
+
+async def evict_cached_recipes(max_size: int, min_created_at: datetime):
+    """Удалить устаревшие записи кэша, давно не использованные сверх max_size
+    и тела рецептов, на которые больше никто не ссылается"""
+    async with manager.write() as db:
+        await db.execute(
+            "DELETE FROM recipe_cache WHERE created_at < ?", (to_epoch(min_created_at),)
+        )
+        await db.execute("""
+            DELETE FROM recipe_cache WHERE rowid IN (
+                SELECT rowid FROM recipe_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (max_size,))
+        await _delete_orphan_bodies(db)
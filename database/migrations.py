@@ -0,0 +1,410 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional
+
+import aiosqlite
+
+from config import RECIPE_HISTORY_SIZE
+from services.text import search_terms
+
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+async def _initial_schema(db: aiosqlite.Connection):
+    """Исходные таблицы"""
+    # Таблица пользователей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            goal TEXT NOT NULL,
+            dietary_restrictions TEXT,
+            has_oven BOOLEAN,
+            has_microwave BOOLEAN,
+            has_stove BOOLEAN,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    """)
+
+    # Таблица рецептов
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS recipes (
+            recipe_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT NOT NULL,
+            description TEXT,
+            calories INTEGER,
+            protein INTEGER,
+            fats INTEGER,
+            carbs INTEGER,
+            cooking_time INTEGER,
+            ingredients TEXT,
+            steps TEXT,
+            image_url TEXT,
+            is_favorite BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    """)
+
+    # Таблица активных сессий готовки
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS cooking_sessions (
+            session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            recipe_id INTEGER,
+            current_step INTEGER,
+            timer_end TIMESTAMP,
+            is_paused BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id)
+        )
+    """)
+
+    # История рецептов для избежания повторов
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS recipe_history (
+            user_id INTEGER,
+            recipe_name TEXT,
+            created_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    """)
+
+    # Кэш ответов AI по нормализованному запросу и профилю
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS recipe_cache (
+            cache_key TEXT NOT NULL,
+            name TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP,
+            last_used_at TIMESTAMP,
+            hits INTEGER DEFAULT 0,
+            PRIMARY KEY (cache_key, name)
+        )
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recipe_cache_last_used ON recipe_cache (last_used_at)"
+    )
+
+
+async def _query_indexes(db: aiosqlite.Connection):
+    """Индексы под запросы избранного, истории и сессий готовки"""
+    # get_favorites: WHERE user_id = ? AND is_favorite = 1 ORDER BY created_at DESC
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_recipes_user_favorite
+        ON recipes (user_id, is_favorite, created_at)
+    """)
+
+    # get_recent_recipe_names: покрывающий индекс, таблица не читается;
+    # rowid в индексе есть всегда, так что и порядок по rowid берётся из него
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_recipe_history_user
+        ON recipe_history (user_id, created_at, recipe_name)
+    """)
+
+    # Одна сессия готовки на пользователя: оставляем самую свежую
+    await db.execute("""
+        DELETE FROM cooking_sessions WHERE session_id NOT IN (
+            SELECT MAX(session_id) FROM cooking_sessions GROUP BY user_id
+        )
+    """)
+    await db.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_cooking_sessions_user
+        ON cooking_sessions (user_id)
+    """)
+
+
+async def _compact_recipe_history(db: aiosqlite.Connection):
+    """Удаление повторов и старых записей из recipe_history"""
+    await db.execute("""
+        DELETE FROM recipe_history WHERE rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, recipe_name ORDER BY created_at DESC, rowid DESC
+                ) AS position
+                FROM recipe_history
+            ) WHERE position > 1
+        )
+    """)
+    await db.execute("""
+        DELETE FROM recipe_history WHERE rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY user_id ORDER BY created_at DESC, rowid DESC
+                ) AS position
+                FROM recipe_history
+            ) WHERE position > ?
+        )
+    """, (RECIPE_HISTORY_SIZE,))
+
+
+async def _fsm_storage(db: aiosqlite.Connection):
+    """Таблица состояний FSM"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_fsm_storage_expires ON fsm_storage (expires_at)"
+    )
+
+
+# Столбцы с временем, которые раньше хранились строками ISO 8601
+_TIMESTAMP_COLUMNS = {
+    "users": ("created_at", "updated_at"),
+    "recipes": ("created_at",),
+    "cooking_sessions": ("timer_end", "created_at", "updated_at"),
+    "recipe_history": ("created_at",),
+    "recipe_cache": ("created_at", "last_used_at"),
+}
+
+
+def _iso_to_epoch(value: Any) -> Optional[int]:
+    if not isinstance(value, str):
+        return value
+    # Строки записаны через datetime.now(), то есть в локальном времени
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def _compact_json(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    return json.dumps(json.loads(value), ensure_ascii=False, separators=(",", ":"))
+
+
+async def _epoch_timestamps(db: aiosqlite.Connection):
+    """Время в секундах Unix, компактный JSON ingredients и steps"""
+    await db.create_function("iso_to_epoch", 1, _iso_to_epoch, deterministic=True)
+    await db.create_function("compact_json", 1, _compact_json, deterministic=True)
+    for table, columns in _TIMESTAMP_COLUMNS.items():
+        assignments = ", ".join(f"{column} = iso_to_epoch({column})" for column in columns)
+        await db.execute(f"UPDATE {table} SET {assignments}")
+    await db.execute(
+        "UPDATE recipes SET ingredients = compact_json(ingredients), steps = compact_json(steps)"
+    )
+
+
+# Столбцы тела рецепта: всё, что не зависит от пользователя
+RECIPE_BODY_COLUMNS = (
+    "name", "description", "calories", "protein", "fats", "carbs",
+    "cooking_time", "ingredients", "steps", "image_url",
+)
+
+
+def recipe_body_hash(*values: Any) -> bytes:
+    """Ключ тела рецепта: SHA-1 от значений RECIPE_BODY_COLUMNS по порядку"""
+    encoded = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode()).digest()
+
+
+async def _content_addressed_recipes(db: aiosqlite.Connection):
+    """Тела рецептов хранятся один раз по хэшу содержимого"""
+    columns = ", ".join(RECIPE_BODY_COLUMNS)
+    await db.create_function(
+        "recipe_body_hash", len(RECIPE_BODY_COLUMNS), recipe_body_hash, deterministic=True
+    )
+    await db.execute("""
+        CREATE TABLE recipe_bodies (
+            body_hash BLOB PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            calories INTEGER,
+            protein INTEGER,
+            fats INTEGER,
+            carbs INTEGER,
+            cooking_time INTEGER,
+            ingredients TEXT,
+            steps TEXT,
+            image_url TEXT
+        )
+    """)
+    await db.execute(f"""
+        INSERT OR IGNORE INTO recipe_bodies (body_hash, {columns})
+        SELECT recipe_body_hash({columns}), {columns} FROM recipes
+    """)
+
+    # recipe_id сохраняются: на них ссылаются cooking_sessions
+    await db.execute("""
+        CREATE TABLE recipes_new (
+            recipe_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            body_hash BLOB NOT NULL,
+            is_favorite BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (body_hash) REFERENCES recipe_bodies (body_hash)
+        )
+    """)
+    await db.execute(f"""
+        INSERT INTO recipes_new (recipe_id, user_id, body_hash, is_favorite, created_at)
+        SELECT recipe_id, user_id, recipe_body_hash({columns}), is_favorite, created_at
+        FROM recipes
+    """)
+    await db.execute("DROP TABLE recipes")
+    await db.execute("ALTER TABLE recipes_new RENAME TO recipes")
+    await db.execute("""
+        CREATE INDEX idx_recipes_user_favorite
+        ON recipes (user_id, is_favorite, created_at)
+    """)
+    await db.execute("CREATE INDEX idx_recipes_body ON recipes (body_hash)")
+
+    # Кэш AI: вместо payload — ссылка на тело
+    await db.execute("""
+        CREATE TABLE recipe_cache_new (
+            cache_key TEXT NOT NULL,
+            name TEXT NOT NULL,
+            body_hash BLOB NOT NULL,
+            created_at TIMESTAMP,
+            last_used_at TIMESTAMP,
+            hits INTEGER DEFAULT 0,
+            PRIMARY KEY (cache_key, name)
+        )
+    """)
+    async with db.execute(
+        "SELECT cache_key, name, payload, created_at, last_used_at, hits FROM recipe_cache"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    bodies, entries = [], []
+    for cache_key, name, payload, created_at, last_used_at, hits in rows:
+        data = json.loads(payload)
+        body = (
+            data["name"], data.get("description"), data.get("calories"), data.get("protein"),
+            data.get("fats"), data.get("carbs"), data.get("cooking_time"),
+            json.dumps(data.get("ingredients", []), ensure_ascii=False, separators=(",", ":")),
+            json.dumps(data.get("steps", []), ensure_ascii=False, separators=(",", ":")),
+            None,
+        )
+        body_hash = recipe_body_hash(*body)
+        bodies.append((body_hash,) + body)
+        entries.append((cache_key, name, body_hash, created_at, last_used_at, hits))
+    await db.executemany(f"""
+        INSERT OR IGNORE INTO recipe_bodies (body_hash, {columns})
+        VALUES ({", ".join("?" * (len(RECIPE_BODY_COLUMNS) + 1))})
+    """, bodies)
+    await db.executemany("""
+        INSERT INTO recipe_cache_new
+        (cache_key, name, body_hash, created_at, last_used_at, hits)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, entries)
+    await db.execute("DROP TABLE recipe_cache")
+    await db.execute("ALTER TABLE recipe_cache_new RENAME TO recipe_cache")
+    await db.execute(
+        "CREATE INDEX idx_recipe_cache_last_used ON recipe_cache (last_used_at)"
+    )
+    await db.execute("CREATE INDEX idx_recipe_cache_body ON recipe_cache (body_hash)")
+
+
+def _owned_terms(row: str, column: str) -> str:
+    # «курица рис» у пользователя 42 → «u42uкуриц u42uрис»: списки документов
+    # каждого терма принадлежат одному пользователю, поэтому и поиск, и bm25
+    # (частоты термов) не перебирают чужие рецепты
+    prefix = f"'u' || {row}.user_id || 'u'"
+    return (
+        f"CASE WHEN b.{column} = '' THEN '' "
+        f"ELSE {prefix} || replace(b.{column}, ' ', ' ' || {prefix}) END"
+    )
+
+
+def _search_values(row: str) -> str:
+    """Значения строки recipe_search для рецепта row (NEW, OLD или алиас) с телом b"""
+    return ", ".join(
+        _owned_terms(row, column)
+        for column in ("search_name", "search_description", "search_ingredients")
+    )
+
+
+async def _recipe_search(db: aiosqlite.Connection):
+    """Полнотекстовый поиск FTS5 по рецептам пользователя"""
+    # В индекс идут основы слов (services.text.search_terms), а не сами слова:
+    # запрос ищет точные термы, без дорогого префиксного поиска
+    await db.create_function("search_terms", 1, search_terms, deterministic=True)
+    for column in ("search_name", "search_description", "search_ingredients"):
+        await db.execute(f"ALTER TABLE recipe_bodies ADD COLUMN {column} TEXT")
+    # Из ингредиентов в индекс идут только названия
+    await db.execute("""
+        UPDATE recipe_bodies SET
+            search_name = search_terms(name),
+            search_description = search_terms(coalesce(description, '')),
+            search_ingredients = search_terms(coalesce((
+                SELECT group_concat(json_extract(value, '$.name'), ' ') FROM json_each(ingredients)
+            ), ''))
+    """)
+
+    # Без хранения текста: индексу нужны только термы
+    await db.execute("""
+        CREATE VIRTUAL TABLE recipe_search USING fts5(
+            name, description, ingredients, content = ''
+        )
+    """)
+    # Совпадение в названии важнее, чем в составе и описании
+    await db.execute(
+        "INSERT INTO recipe_search (recipe_search, rank) VALUES ('rank', 'bm25(10.0, 2.0, 4.0)')"
+    )
+    await db.execute(f"""
+        INSERT INTO recipe_search (rowid, name, description, ingredients)
+        SELECT r.recipe_id, {_search_values("r")}
+        FROM recipes r JOIN recipe_bodies b ON b.body_hash = r.body_hash
+    """)
+
+    # Тело неизменно и удаляется только после рецепта, поэтому при удалении
+    # из contentless-индекса можно передать те же значения, что при вставке
+    insert = f"""
+        INSERT INTO recipe_search (rowid, name, description, ingredients)
+        SELECT NEW.recipe_id, {_search_values("NEW")}
+        FROM recipe_bodies b WHERE b.body_hash = NEW.body_hash;
+    """
+    delete = f"""
+        INSERT INTO recipe_search (recipe_search, rowid, name, description, ingredients)
+        SELECT 'delete', OLD.recipe_id, {_search_values("OLD")}
+        FROM recipe_bodies b WHERE b.body_hash = OLD.body_hash;
+    """
+    await db.execute(f"CREATE TRIGGER recipes_search_insert AFTER INSERT ON recipes BEGIN {insert} END")
+    await db.execute(f"CREATE TRIGGER recipes_search_delete AFTER DELETE ON recipes BEGIN {delete} END")
+    await db.execute(f"""
+        CREATE TRIGGER recipes_search_update AFTER UPDATE OF user_id, body_hash ON recipes
+        BEGIN {delete} {insert} END
+    """)
+
+
+# Порядок менять нельзя: номер версии схемы = позиция в списке
+MIGRATIONS: List[Migration] = [
+    _initial_schema,
+    _query_indexes,
+    _compact_recipe_history,
+    _fsm_storage,
+    _epoch_timestamps,
+    _content_addressed_recipes,
+    _recipe_search,
+]
+
+
+async def run_migrations(db: aiosqlite.Connection) -> int:
+    """Применить недостающие миграции; вернуть итоговую версию схемы.
+
+    Версия хранится в PRAGMA user_version, поэтому повторный запуск стоит
+    одного чтения заголовка. Вызывать внутри транзакции писателя.
+    """
+    async with db.execute("PRAGMA user_version") as cursor:
+        version = (await cursor.fetchone())[0]
+    if version >= len(MIGRATIONS):
+        return version
+
+    # Блокируем запись, чтобы параллельно стартующие процессы не мигрировали дважды
+    await db.execute("BEGIN IMMEDIATE")
+    async with db.execute("PRAGMA user_version") as cursor:
+        version = (await cursor.fetchone())[0]
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f"[DB MIGRATION] {number}: {migration.__doc__}")
+        await migration(db)
+        await db.execute(f"PRAGMA user_version = {number}")
+    return len(MIGRATIONS)
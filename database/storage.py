@@ -0,0 +1,203 @@
+import asyncio
+import json
+import time
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from config import FSM_TTL, FSM_FLUSH_INTERVAL, FSM_PURGE_INTERVAL
+from database.connection import ConnectionManager, manager
+from models.user import Recipe
+
+# Рецепт хранится списком значений полей в порядке объявления
+_RECIPE_FIELDS = tuple(field.name for field in fields(Recipe) if field.init)
+_RECIPE_TAG = "__recipe__"
+_CREATED_AT = _RECIPE_FIELDS.index("created_at")
+
+# Поле ещё не менялось в текущей пачке записи
+_UNSET = object()
+
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, Recipe):
+        values = [getattr(value, name) for name in _RECIPE_FIELDS]
+        values[_CREATED_AT] = values[_CREATED_AT].isoformat()
+        return {_RECIPE_TAG: values}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_hook(obj: Dict[str, Any]) -> Any:
+    values = obj.get(_RECIPE_TAG)
+    if values is None or len(obj) != 1:
+        return obj
+    values[_CREATED_AT] = datetime.fromisoformat(values[_CREATED_AT])
+    return Recipe(*values)
+
+
+def encode_data(data: Mapping[str, Any]) -> str:
+    """Данные FSM в компактный JSON; Recipe кодируется списком значений"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_encode_default)
+
+
+def decode_data(payload: Optional[str]) -> Dict[str, Any]:
+    """Обратное преобразование encode_data"""
+    if not payload:
+        return {}
+    return json.loads(payload, object_hook=_decode_hook)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в общей SQLite базе.
+
+    Состояние переживает перезапуск и доступно всем процессам бота, которые
+    открывают тот же файл БД. Изменения копятся в памяти и записываются одной
+    транзакцией раз в FSM_FLUSH_INTERVAL; до записи процесс читает их из
+    памяти. Запись без изменений дольше FSM_TTL считается удалённой.
+    """
+
+    def __init__(
+        self,
+        connections: ConnectionManager = manager,
+        ttl: float = FSM_TTL,
+        flush_interval: float = FSM_FLUSH_INTERVAL
+    ):
+        self.connections = connections
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # key -> [state, data]; _UNSET — поле не менялось
+        self._pending: Dict[str, list] = {}
+        self._flushing: Dict[str, list] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._purged_at = 0.0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        if isinstance(state, State):
+            state = state.state
+        self._put(self.key_builder.build(key), state, _UNSET)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._get(self.key_builder.build(key), 0)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        self._put(self.key_builder.build(key), _UNSET, encode_data(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return decode_data(await self._get(self.key_builder.build(key), 1))
+
+    async def close(self) -> None:
+        """Записать накопленные изменения и остановить фоновую запись"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def _put(self, key: str, state: Any, data: Any):
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = [_UNSET, _UNSET]
+        if state is not _UNSET:
+            entry[0] = state
+        if data is not _UNSET:
+            entry[1] = data
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def _get(self, key: str, column: int) -> Any:
+        for entries in (self._pending, self._flushing):
+            entry = entries.get(key)
+            if entry is not None and entry[column] is not _UNSET:
+                return entry[column]
+
+        async with self.connections.read() as db:
+            async with db.execute(
+                "SELECT state, data FROM fsm_storage WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ) as cursor:
+                row = await cursor.fetchone()
+        return row[column] if row else None
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[FSM STORAGE ERROR] {e!r}")
+                # Несохранённые изменения вернулись в очередь, повторим позже
+                self._wakeup.set()
+            # Изменения за это время попадут в следующую пачку
+            await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        """Записать все накопленные изменения одной транзакцией"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._flushing = batch
+        now = time.time()
+        expires_at = now + self.ttl
+
+        upsert_both: List[tuple] = []
+        upsert_state: List[tuple] = []
+        upsert_data: List[tuple] = []
+        for key, (state, data) in batch.items():
+            if data is _UNSET:
+                upsert_state.append((key, state, expires_at))
+            elif state is _UNSET:
+                upsert_data.append((key, data, expires_at))
+            else:
+                upsert_both.append((key, state, data, expires_at))
+
+        try:
+            async with self.connections.write() as db:
+                # Частичное обновление не должно воскрешать просроченные поля
+                await db.executemany(
+                    "DELETE FROM fsm_storage WHERE key = ? AND expires_at <= ?",
+                    [(key, now) for key in batch]
+                )
+                await db.executemany("""
+                    INSERT INTO fsm_storage (key, state, data, expires_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        state = excluded.state, data = excluded.data, expires_at = excluded.expires_at
+                """, upsert_both)
+                await db.executemany("""
+                    INSERT INTO fsm_storage (key, state, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        state = excluded.state, expires_at = excluded.expires_at
+                """, upsert_state)
+                await db.executemany("""
+                    INSERT INTO fsm_storage (key, data, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        data = excluded.data, expires_at = excluded.expires_at
+                """, upsert_data)
+                # Пустые записи (state.clear()) не храним
+                await db.executemany("""
+                    DELETE FROM fsm_storage
+                    WHERE key = ? AND state IS NULL AND (data IS NULL OR data = '{}')
+                """, [(key,) for key in batch])
+
+                if now - self._purged_at >= FSM_PURGE_INTERVAL:
+                    await db.execute("DELETE FROM fsm_storage WHERE expires_at <= ?", (now,))
+                    self._purged_at = now
+        except BaseException:
+            # Возвращаем несохранённые поля, если их ещё не перезаписали
+            for key, entry in batch.items():
+                newer = self._pending.setdefault(key, [_UNSET, _UNSET])
+                for column in (0, 1):
+                    if newer[column] is _UNSET:
+                        newer[column] = entry[column]
+            raise
+        finally:
+            self._flushing = {}
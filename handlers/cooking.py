@@ -1,11 +1,15 @@
-from aiogram import Router, F
+import asyncio
+
+from aiogram import Bot, Router, F
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from datetime import datetime, timedelta
-import asyncio
 
 from models.user import Recipe, CookingSession
 from database import db
+from services.timer_scheduler import timer_scheduler
+from config import TIMER_RESTORE_BATCH_SIZE
 from keyboards.cooking_kb import get_cooking_keyboard, get_completion_keyboard
 
 router = Router()
@@ -25,100 +29,131 @@ async def start_cooking_session(message: Message, recipe: Recipe, user_id: int):
         updated_at=datetime.now()
     )
     
-    await db.save_cooking_session(session)
+    session.session_id = await db.save_cooking_session(session)
     
     # Отправляем первый шаг
-    await send_cooking_step(message, recipe, session)
-
-
-async def send_cooking_step(message: Message, recipe: Recipe, session: CookingSession):
-    """Отправка текущего шага готовки и установка таймера"""
-    step_data = recipe.steps[session.current_step]
-    total_steps = len(recipe.steps)
+    await send_cooking_step(message.bot, message.chat.id, recipe, session)
 
-    duration = step_data.get('duration', 1)  # минимум 1 минута
-    step_text = (
-        f"👨‍🍳 *Шаг {session.current_step + 1} из {total_steps}*\n\n"
-        f"{step_data['description']}\n\n"
-        f"⏱ Время: {duration} мин"
-    )
 
-    # Устанавливаем таймер и сохраняем в БД до отправки сообщения
+async def start_step_timer(session: CookingSession, recipe: Recipe):
+    """Таймер текущего шага: сохранить в БД и поставить в планировщик"""
+    duration = recipe.steps[session.current_step].get('duration', 1)  # минимум 1 минута
     session.timer_end = datetime.now() + timedelta(minutes=duration)
     session.updated_at = datetime.now()
     await db.update_cooking_session(session)
 
+    if session.is_paused:
+        timer_scheduler.cancel(session.user_id)
+    else:
+        timer_scheduler.schedule(session.user_id, session.session_id, session.timer_end)
+
     print(f"⏰ Таймер установлен для user {session.user_id}: {session.timer_end}")
 
-    await message.answer(
+
+async def send_message_retrying(bot: Bot, chat_id: int, text: str, **kwargs):
+    """Отправка сообщения; при TelegramRetryAfter — одна повторная попытка после паузы"""
+    try:
+        await bot.send_message(chat_id, text, **kwargs)
+    except TelegramRetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        await bot.send_message(chat_id, text, **kwargs)
+
+
+async def send_step_message(bot: Bot, chat_id: int, recipe: Recipe, session: CookingSession):
+    """Сообщение с текущим шагом готовки"""
+    step_data = recipe.steps[session.current_step]
+    step_text = (
+        f"👨‍🍳 *Шаг {session.current_step + 1} из {len(recipe.steps)}*\n\n"
+        f"{step_data['description']}\n\n"
+        f"⏱ Время: {step_data.get('duration', 1)} мин"
+    )
+    await send_message_retrying(
+        bot,
+        chat_id,
         step_text,
         parse_mode="Markdown",
         reply_markup=get_cooking_keyboard(is_paused=session.is_paused)
     )
 
-    # Запускаем фоновую задачу для проверки таймера
-    asyncio.create_task(check_timer(message.bot, session.user_id, session.session_id))
 
+async def send_cooking_step(bot: Bot, chat_id: int, recipe: Recipe, session: CookingSession):
+    """Отправка текущего шага готовки и установка таймера"""
+    # Таймер сохраняется до отправки сообщения: ошибка отправки его не теряет
+    await start_step_timer(session, recipe)
+    await send_step_message(bot, chat_id, recipe, session)
 
-async def check_timer(bot, user_id: int, session_id: int):
-    """Фоновая проверка таймера и переход к следующему шагу"""
-    while True:
-        await asyncio.sleep(10)  # Проверка каждые 10 секунд
 
-        session = await db.get_cooking_session(user_id)
+async def on_timer_expired(bot: Bot, user_id: int, session_id: int):
+    """Срабатывание таймера шага: переход к следующему шагу или завершение"""
+    session = await db.get_cooking_session(user_id)
 
-        if not session or session.session_id != session_id:
-            # Сессия завершена или изменена
-            break
+    if not session or session.session_id != session_id:
+        # Сессия завершена или изменена
+        return
 
-        if session.is_paused:
-            continue
-
-        if not session.timer_end:
-            # Таймер ещё не установлен, ждём
-            await asyncio.sleep(1)
-            continue
-
-        if datetime.now() >= session.timer_end:
-            # Таймер истёк — следующий шаг или завершение
-            recipe = await db.get_recipe(session.recipe_id)
-
-            if session.current_step < len(recipe.steps) - 1:
-                session.current_step += 1
-                session.updated_at = datetime.now()
-                await db.update_cooking_session(session)
-
-                try:
-                    temp_message = type('Message', (), {
-                        'bot': bot,
-                        'chat': type('Chat', (), {'id': user_id})()
-                    })()
-
-                    await bot.send_message(
-                        user_id,
-                        f"✅ Шаг {session.current_step} завершен!"
-                    )
-
-                    await send_cooking_step(temp_message, recipe, session)
-                except Exception as e:
-                    print(f"Ошибка отправки сообщения: {e}")
-
-            else:
-                # Все шаги пройдены — готовка завершена
-                await db.delete_cooking_session(user_id)
-                try:
-                    await bot.send_message(
-                        user_id,
-                        f"🎉 *Поздравляю!*\n\n"
-                        f"Блюдо '{recipe.name}' готово! Приятного аппетита! 😋",
-                        parse_mode="Markdown",
-                        reply_markup=get_completion_keyboard(recipe.recipe_id)
-                    )
-                except Exception as e:
-                    print(f"Ошибка отправки финального сообщения: {e}")
+    if session.is_paused or not session.timer_end:
+        return
 
-            break
+    if datetime.now() < session.timer_end:
+        # Таймер продлили, пока срабатывание было в пути
+        timer_scheduler.schedule(user_id, session_id, session.timer_end)
+        return
+
+    recipe = await db.get_recipe(session.recipe_id)
+
+    if session.current_step < len(recipe.steps) - 1:
+        # Следующий шаг и его таймер сохраняются до отправки сообщений:
+        # если Telegram откажет, готовка всё равно продолжится
+        session.current_step += 1
+        await start_step_timer(session, recipe)
+
+        try:
+            await send_message_retrying(bot, user_id, f"✅ Шаг {session.current_step} завершен!")
+        except Exception as e:
+            print(f"Ошибка отправки сообщения: {e}")
+        try:
+            await send_step_message(bot, user_id, recipe, session)
+        except Exception as e:
+            print(f"Ошибка отправки сообщения: {e}")
 
+    else:
+        # Все шаги пройдены — готовка завершена
+        await db.delete_cooking_session(user_id)
+        try:
+            await send_message_retrying(
+                bot,
+                user_id,
+                f"🎉 *Поздравляю!*\n\n"
+                f"Блюдо '{recipe.name}' готово! Приятного аппетита! 😋",
+                parse_mode="Markdown",
+                reply_markup=get_completion_keyboard(recipe.recipe_id)
+            )
+        except Exception as e:
+            print(f"Ошибка отправки финального сообщения: {e}")
+
+
+async def restore_cooking_timers(shard: int = 0, shards: int = 1) -> int:
+    """Восстановление таймеров активных сессий после перезапуска.
+
+    Сессии читаются пачками по session_id. Просроченные за время простоя
+    таймеры тоже ставятся в планировщик и срабатывают сразу после его запуска,
+    не больше TIMER_MAX_CONCURRENT_FIRES одновременно.
+    В многопроцессном режиме процесс восстанавливает только своих
+    пользователей (user_id % shards == shard).
+    """
+    restored = 0
+    last_session_id = 0
+    while True:
+        batch = await db.get_running_cooking_sessions(
+            last_session_id, TIMER_RESTORE_BATCH_SIZE, shard, shards
+        )
+        if not batch:
+            break
+        for session_id, user_id, timer_end in batch:
+            timer_scheduler.schedule(user_id, session_id, timer_end)
+        restored += len(batch)
+        last_session_id = batch[-1][0]
+    return restored
 
 
 @router.callback_query(F.data == "cooking_next")
@@ -138,9 +173,10 @@ async def next_step(callback: CallbackQuery):
         await db.update_cooking_session(session)
         
         await callback.message.answer("➡️ Переходим к следующему шагу")
-        await send_cooking_step(callback.message, recipe, session)
+        await send_cooking_step(callback.bot, callback.message.chat.id, recipe, session)
     else:
         # Завершаем готовку
+        timer_scheduler.cancel(callback.from_user.id)
         await db.delete_cooking_session(callback.from_user.id)
         await callback.message.answer(
             f"🎉 *Поздравляю!*\n\n"
@@ -164,6 +200,7 @@ async def pause_cooking(callback: CallbackQuery):
     session.is_paused = True
     session.updated_at = datetime.now()
     await db.update_cooking_session(session)
+    timer_scheduler.cancel(session.user_id)
     
     await callback.answer("⏸ Готовка на паузе")
     await callback.message.answer(
@@ -183,9 +220,14 @@ async def resume_cooking(callback: CallbackQuery):
         await callback.answer("Активная готовка не найдена", show_alert=True)
         return
     
+    if session.is_paused and session.timer_end:
+        # Сдвигаем окончание шага на время, проведённое на паузе
+        session.timer_end += datetime.now() - session.updated_at
     session.is_paused = False
     session.updated_at = datetime.now()
     await db.update_cooking_session(session)
+    if session.timer_end:
+        timer_scheduler.schedule(session.user_id, session.session_id, session.timer_end)
     
     await callback.answer("▶️ Готовка возобновлена")
     await callback.message.answer("▶️ Готовка возобновлена!")
@@ -222,6 +264,7 @@ async def modify_timer(callback: CallbackQuery):
     # Сохраняем изменения
     session.updated_at = datetime.now()
     await db.update_cooking_session(session)
+    timer_scheduler.schedule(session.user_id, session.session_id, session.timer_end)
 
     await callback.answer(text)
 
@@ -245,7 +288,7 @@ async def restart_cooking(callback: CallbackQuery):
     await db.update_cooking_session(session)
     
     await callback.message.answer("🔄 Начинаем заново!")
-    await send_cooking_step(callback.message, recipe, session)
+    await send_cooking_step(callback.bot, callback.message.chat.id, recipe, session)
     await callback.answer()
 
 
@@ -255,6 +298,7 @@ async def cancel_cooking(event):
     """Отмена готовки"""
     user_id = event.from_user.id
     
+    timer_scheduler.cancel(user_id)
     await db.delete_cooking_session(user_id)
     
     message = event.message if hasattr(event, 'message') else event
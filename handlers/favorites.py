@@ -1,7 +1,10 @@
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
+from typing import Optional, Tuple
 
+from config import FAVORITES_PAGE_SIZE
 from models.user import UserProfile
 from database import db
 from keyboards.favorites_kb import get_favorites_keyboard, get_favorite_detail_keyboard
@@ -9,6 +12,38 @@ from keyboards.favorites_kb import get_favorites_keyboard, get_favorite_detail_k
 router = Router()
 
 
+async def render_favorites_page(
+    user_id: int,
+    page: int = 0,
+    anchor: Optional[Tuple[int, int]] = None,
+    backward: bool = False
+) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+    """Текст и клавиатура страницы избранного; None, если избранное пусто"""
+    recipes, has_more = await db.get_favorites_page(user_id, FAVORITES_PAGE_SIZE, anchor, backward)
+    if not recipes and anchor is not None:
+        # Рецепты со страницы удалили — начинаем сначала
+        recipes, has_more = await db.get_favorites_page(user_id, FAVORITES_PAGE_SIZE)
+        page, backward = 0, False
+    if not recipes:
+        return None
+
+    if backward:
+        has_prev, has_next = has_more, True
+        if not has_prev:
+            page = 0
+    else:
+        has_prev, has_next = page > 0, has_more
+
+    total = await db.count_favorites(user_id)
+    pages = max(1, -(-total // FAVORITES_PAGE_SIZE))
+    page_text = f" · стр. {min(page, pages - 1) + 1} из {pages}" if pages > 1 else ""
+    text = (
+        f"⭐️ *Твои избранные рецепты* ({total}){page_text}:\n\n"
+        "Выбери рецепт:"
+    )
+    return text, get_favorites_keyboard(recipes, page, has_prev, has_next)
+
+
 @router.message(Command("favorites"))
 async def cmd_favorites(message: Message, user_profile: UserProfile = None):
     """Команда /favorites - показать избранные рецепты"""
@@ -16,21 +51,40 @@ async def cmd_favorites(message: Message, user_profile: UserProfile = None):
         await message.answer("Сначала зарегистрируйся! Напиши /start")
         return
     
-    favorites = await db.get_favorites(user_profile.user_id)
+    rendered = await render_favorites_page(user_profile.user_id)
     
-    if not favorites:
+    if not rendered:
         await message.answer(
             "📂 Избранное пусто\n\n"
             "Готовь рецепты и добавляй понравившиеся в избранное!"
         )
         return
     
-    await message.answer(
-        f"⭐️ *Твои избранные рецепты* ({len(favorites)}):\n\n"
-        "Выбери рецепт:",
-        parse_mode="Markdown",
-        reply_markup=get_favorites_keyboard(favorites)
+    text, keyboard = rendered
+    await message.answer(text, parse_mode="Markdown", reply_markup=keyboard)
+
+
+@router.callback_query(F.data.startswith("fav_page_"))
+async def page_favorites(callback: CallbackQuery):
+    """Листание избранного"""
+    _, _, direction, page, created_at, recipe_id = callback.data.split("_")
+    rendered = await render_favorites_page(
+        callback.from_user.id,
+        int(page),
+        (int(created_at), int(recipe_id)),
+        backward=direction == "prev"
     )
+    
+    if not rendered:
+        await callback.message.edit_text("📂 Избранное пусто")
+    else:
+        text, keyboard = rendered
+        try:
+            await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=keyboard)
+        except TelegramBadRequest:
+            # Страница не изменилась (повторное нажатие)
+            pass
+    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("fav_view_"))
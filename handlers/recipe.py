@@ -1,17 +1,226 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
+from typing import Any, Dict, List, Optional, Set
+import asyncio
 import html
+import time
 
 from models.user import UserProfile, Recipe
 from database import db
-from services.ai_service import generate_recipe
+from services import goal_fit
+from services.ai_service import SOURCE_AI, generate_recipe
+from services.ai_dispatcher import (
+    PRIORITY_REGENERATE,
+    PRIORITY_SPECULATIVE,
+    DispatcherStoppedError,
+    QueueFullError,
+    QuotaExceededError,
+)
 from keyboards.recipe_kb import get_recipe_action_keyboard
 from states.states import RecipeStates
-from config import RECIPE_HISTORY_SIZE
+from config import (
+    RECIPE_HISTORY_SIZE,
+    SPECULATIVE_ALTERNATIVES,
+    SPECULATIVE_TTL,
+    STREAM_EDIT_INTERVAL,
+)
 
 router = Router()
 
+# Фоновые генерации альтернатив: user_id -> задача
+_speculations: Dict[int, asyncio.Task] = {}
+# Пользователи, чью фоновую генерацию уже выполняет воркер (она не ждёт в очереди)
+_speculations_running: Set[int] = set()
+
+
+def format_recipe_text(recipe: Recipe) -> str:
+    """Карточка рецепта для выбора"""
+    ingredients_text = '\n'.join([
+        f"• {html.escape(ing['name'])} - {html.escape(ing['amount'])}"
+        for ing in recipe.ingredients
+    ])
+
+    return (
+        f"🍽 <b>{html.escape(recipe.name)}</b>\n\n"
+        f"<i>{html.escape(recipe.description)}</i>\n\n"
+        f"⏱ Время: {recipe.cooking_time} мин\n"
+        f"📊 КБЖУ на порцию:\n"
+        f"  • Калории: {recipe.calories} ккал\n"
+        f"  • Белки: {recipe.protein} г\n"
+        f"  • Жиры: {recipe.fats} г\n"
+        f"  • Углеводы: {recipe.carbs} г\n\n"
+        f"🛒 <b>Ингредиенты:</b>\n{ingredients_text}"
+    )
+
+
+def format_partial_recipe_text(fields: Dict[str, Any]) -> str:
+    """Карточка рецепта, который ещё генерируется"""
+    parts = []
+    if 'name' in fields:
+        parts.append(f"🍽 <b>{html.escape(str(fields['name']))}</b>")
+    if 'description' in fields:
+        parts.append(f"<i>{html.escape(str(fields['description']))}</i>")
+
+    macros = [
+        (key, label, unit) for key, label, unit in (
+            ('calories', 'Калории', 'ккал'),
+            ('protein', 'Белки', 'г'),
+            ('fats', 'Жиры', 'г'),
+            ('carbs', 'Углеводы', 'г'),
+        ) if key in fields
+    ]
+    if macros:
+        parts.append("📊 КБЖУ на порцию:\n" + '\n'.join(
+            f"  • {label}: {html.escape(str(fields[key]))} {unit}" for key, label, unit in macros
+        ))
+
+    if isinstance(fields.get('ingredients'), list):
+        parts.append("🛒 <b>Ингредиенты:</b>\n" + '\n'.join(
+            f"• {html.escape(str(ing.get('name', '')))} - {html.escape(str(ing.get('amount', '')))}"
+            for ing in fields['ingredients'] if isinstance(ing, dict)
+        ))
+
+    parts.append("⏳ Дописываю рецепт...")
+    return '\n\n'.join(parts)
+
+
+def overload_text(error: Exception) -> str:
+    """Сообщение об отказе очереди генераций"""
+    if isinstance(error, QuotaExceededError):
+        return "⏳ Слишком много запросов подряд. Подожди немного и попробуй снова."
+    return "🚦 Сейчас слишком много запросов. Попробуй через минуту."
+
+
+class RecipeProgress:
+    """Обновление одного сообщения по мере генерации рецепта (не чаще STREAM_EDIT_INTERVAL)"""
+
+    def __init__(self, message: Message):
+        self.message = message
+        self._last_edit = 0.0
+        self._last_text = message.text
+
+    async def update(self, fields: Dict[str, Any]):
+        now = time.monotonic()
+        if now - self._last_edit < STREAM_EDIT_INTERVAL:
+            return
+        text = format_partial_recipe_text(fields)
+        if text == self._last_text:
+            return
+        self._last_edit = now
+        self._last_text = text
+        await self.message.edit_text(text, parse_mode="HTML")
+
+    async def queued(self, position: int):
+        """Показать место в очереди генераций"""
+        text = f"⏳ Сейчас много запросов, ты в очереди: {position}"
+        self._last_text = text
+        await self.message.edit_text(text)
+
+    async def finish(self, recipe: Recipe):
+        """Показать готовый рецепт с кнопками в том же сообщении"""
+        try:
+            await self.message.edit_text(
+                format_recipe_text(recipe),
+                parse_mode="HTML",
+                reply_markup=get_recipe_action_keyboard()
+            )
+        except TelegramBadRequest:
+            await self.message.answer(
+                format_recipe_text(recipe),
+                parse_mode="HTML",
+                reply_markup=get_recipe_action_keyboard()
+            )
+
+    async def fail(self, text: str):
+        """Заменить недописанную карточку сообщением об ошибке"""
+        try:
+            await self.message.edit_text(text)
+        except TelegramBadRequest:
+            await self.message.answer(text)
+
+
+def cancel_speculation(user_id: int):
+    """Остановить фоновую генерацию альтернатив"""
+    task = _speculations.pop(user_id, None)
+    _speculations_running.discard(user_id)
+    if task:
+        task.cancel()
+
+
+def start_speculation(state: FSMContext, user_profile: UserProfile, dish_request: str, exclude: List[str]):
+    """Заранее сгенерировать альтернативы, чтобы «Другой вариант» отвечал сразу"""
+    user_id = user_profile.user_id
+    cancel_speculation(user_id)
+    if SPECULATIVE_ALTERNATIVES <= 0:
+        return
+
+    task = asyncio.create_task(_speculate(state, user_profile, dish_request, list(exclude)))
+    _speculations[user_id] = task
+    task.add_done_callback(lambda done: _forget_speculation(user_id, done))
+
+
+def _forget_speculation(user_id: int, task: asyncio.Task):
+    if _speculations.get(user_id) is task:
+        del _speculations[user_id]
+        _speculations_running.discard(user_id)
+
+
+async def _speculate(state: FSMContext, user_profile: UserProfile, dish_request: str, exclude: List[str]):
+    data = await state.get_data()
+    alternatives: List[Recipe] = list(data.get('alternatives') or [])
+    exclude.extend(alt.name for alt in alternatives)
+    try:
+        async with asyncio.timeout(SPECULATIVE_TTL):
+            while len(alternatives) < SPECULATIVE_ALTERNATIVES:
+                recipe = await generate_recipe(
+                    user_profile=user_profile,
+                    dish_request=dish_request,
+                    exclude_recipes=exclude,
+                    priority=PRIORITY_SPECULATIVE,
+                    use_quota=False,
+                    on_start=lambda: _speculations_running.add(user_profile.user_id)
+                )
+                _speculations_running.discard(user_profile.user_id)
+                if not recipe:
+                    return
+                # Следующая альтернатива не должна повторять эту
+                exclude.append(recipe.name)
+                alternatives.append(recipe)
+                await state.update_data(
+                    alternatives=alternatives,
+                    alternatives_expire=time.time() + SPECULATIVE_TTL
+                )
+    except (TimeoutError, QueueFullError, QuotaExceededError, DispatcherStoppedError):
+        pass
+
+
+async def take_alternative(state: FSMContext, user_profile: UserProfile) -> Optional[Recipe]:
+    """Забрать готовую альтернативу, лучше всего подходящую под цель.
+
+    Уже выполняющуюся фоновую генерацию дожидаемся. Если она ещё ждёт
+    в очереди с PRIORITY_SPECULATIVE, её отменяем: пользователь ждёт ответа,
+    и вызывающий сгенерирует рецепт сам с PRIORITY_REGENERATE.
+    """
+    user_id = user_profile.user_id
+    task = _speculations.get(user_id)
+    if task and not task.done():
+        if user_id in _speculations_running:
+            await asyncio.wait({task})
+        else:
+            cancel_speculation(user_id)
+
+    data = await state.get_data()
+    alternatives: List[Recipe] = list(data.get('alternatives') or [])
+    if not alternatives or data.get('alternatives_expire', 0) < time.time():
+        await state.update_data(alternatives=[])
+        return None
+
+    recipe, *alternatives = goal_fit.best_recipes(user_profile.goal, alternatives)
+    await state.update_data(alternatives=alternatives)
+    return recipe
+
 
 @router.message(F.text, ~F.text.startswith('/'))
 async def handle_recipe_request(message: Message, state: FSMContext, user_profile: UserProfile = None):
@@ -29,55 +238,52 @@ async def handle_recipe_request(message: Message, state: FSMContext, user_profil
         )
         return
 
-    await message.answer("🔍 Ищу подходящий рецепт...")
-    await state.update_data(request=message.text)
+    cancel_speculation(user_profile.user_id)
+    status = await message.answer("🔍 Ищу подходящий рецепт...")
+    progress = RecipeProgress(status)
+    await state.update_data(request=message.text, alternatives=[])
 
     # История рецептов (чтобы не повторять)
     recent_recipes = await db.get_recent_recipe_names(user_profile.user_id, RECIPE_HISTORY_SIZE)
 
     # Генерация рецепта
-    recipe = await generate_recipe(
-        user_profile=user_profile,
-        dish_request=message.text,
-        exclude_recipes=recent_recipes
-    )
+    sources: List[str] = []
+    try:
+        recipe = await generate_recipe(
+            user_profile=user_profile,
+            dish_request=message.text,
+            exclude_recipes=recent_recipes,
+            on_progress=progress.update,
+            on_queued=progress.queued,
+            # Первый ответ можно подобрать из готовых; «Другой вариант» — всегда новый рецепт
+            retrieve=True,
+            on_source=sources.append
+        )
+    except (QueueFullError, QuotaExceededError) as e:
+        await progress.fail(overload_text(e))
+        await state.clear()
+        return
 
     if not recipe:
-        await message.answer("😔 Не удалось сгенерировать рецепт. Попробуй переформулировать запрос.")
+        await progress.fail("😔 Не удалось сгенерировать рецепт. Попробуй переформулировать запрос.")
         await state.clear()
         return
 
     # Сохраняем рецепт во временное состояние
-    await state.update_data(recipe=recipe)
+    await state.update_data(recipe=recipe, shown=[recipe.name])
 
-    # Форматируем текст
-    ingredients_text = '\n'.join([
-        f"• {html.escape(ing['name'])} - {html.escape(ing['amount'])}"
-        for ing in recipe.ingredients
-    ])
-
-    recipe_text = (
-        f"🍽 <b>{html.escape(recipe.name)}</b>\n\n"
-        f"<i>{html.escape(recipe.description)}</i>\n\n"
-        f"⏱ Время: {recipe.cooking_time} мин\n"
-        f"📊 КБЖУ на порцию:\n"
-        f"  • Калории: {recipe.calories} ккал\n"
-        f"  • Белки: {recipe.protein} г\n"
-        f"  • Жиры: {recipe.fats} г\n"
-        f"  • Углеводы: {recipe.carbs} г\n\n"
-        f"🛒 <b>Ингредиенты:</b>\n{ingredients_text}"
-    )
+    await progress.finish(recipe)
 
-    await message.answer(
-        recipe_text,
-        parse_mode="HTML",
-        reply_markup=get_recipe_action_keyboard()
-    )
+    # Ответ из кэша или из готовых рецептов не стоил запроса к AI —
+    # не тратим запросы и на альтернативы, которых могут и не попросить
+    if SOURCE_AI in sources:
+        start_speculation(state, user_profile, message.text, recent_recipes + [recipe.name])
 
 
 @router.callback_query(F.data == "recipe_accept")
 async def accept_recipe(callback: CallbackQuery, state: FSMContext, user_profile: UserProfile):
     """Принятие рецепта и начало готовки"""
+    cancel_speculation(user_profile.user_id)
     data = await state.get_data()
     recipe: Recipe = data.get('recipe')
 
@@ -103,7 +309,6 @@ async def regenerate_recipe(callback: CallbackQuery, state: FSMContext, user_pro
     """Регенерация нового рецепта"""
     data = await state.get_data()
 
-    old_recipe: Recipe = data.get('recipe')
     dish_request: str = data.get('request')
 
     if not dish_request:
@@ -112,47 +317,59 @@ async def regenerate_recipe(callback: CallbackQuery, state: FSMContext, user_pro
         await callback.answer()
         return
 
-    await callback.message.answer("🔁 Генерирую новый рецепт...")
+    await callback.answer()
 
-    # Добавляем старый рецепт в исключения
+    # Альтернатива, сгенерированная заранее
+    progress = None
+    if not data.get('alternatives') or data.get('alternatives_expire', 0) < time.time():
+        progress = RecipeProgress(await callback.message.answer("🔁 Генерирую новый рецепт..."))
+    new_recipe = await take_alternative(state, user_profile)
+
+    # Добавляем уже показанные рецепты в исключения
+    data = await state.get_data()
+    shown: List[str] = list(data.get('shown') or [])
     recent_recipes = await db.get_recent_recipe_names(user_profile.user_id, RECIPE_HISTORY_SIZE)
-    if old_recipe and old_recipe.name not in recent_recipes:
-        recent_recipes.append(old_recipe.name)
+    recent_recipes += [name for name in shown if name not in recent_recipes]
 
-    new_recipe = await generate_recipe(
-        user_profile=user_profile,
-        dish_request=dish_request,
-        exclude_recipes=recent_recipes
-    )
+    sources: List[str] = []
+    if not new_recipe:
+        if progress is None:
+            progress = RecipeProgress(await callback.message.answer("🔁 Генерирую новый рецепт..."))
+        try:
+            new_recipe = await generate_recipe(
+                user_profile=user_profile,
+                dish_request=dish_request,
+                exclude_recipes=recent_recipes,
+                on_progress=progress.update,
+                priority=PRIORITY_REGENERATE,
+                on_queued=progress.queued,
+                on_source=sources.append
+            )
+        except (QueueFullError, QuotaExceededError) as e:
+            await progress.fail(overload_text(e))
+            return
 
     if not new_recipe:
-        await callback.message.answer("😔 Не удалось сгенерировать новый рецепт. Попробуй изменить запрос.")
+        failure = "😔 Не удалось сгенерировать новый рецепт. Попробуй изменить запрос."
+        if progress:
+            await progress.fail(failure)
+        else:
+            await callback.message.answer(failure)
         await state.clear()
-        await callback.answer()
         return
 
-    await state.update_data(recipe=new_recipe)
+    shown.append(new_recipe.name)
+    await state.update_data(recipe=new_recipe, shown=shown)
 
-    ingredients_text = '\n'.join([
-        f"• {html.escape(ing['name'])} - {html.escape(ing['amount'])}"
-        for ing in new_recipe.ingredients
-    ])
-
-    recipe_text = (
-        f"🍽 <b>{html.escape(new_recipe.name)}</b>\n\n"
-        f"<i>{html.escape(new_recipe.description)}</i>\n\n"
-        f"⏱ Время: {new_recipe.cooking_time} мин\n"
-        f"📊 КБЖУ на порцию:\n"
-        f"  • Калории: {new_recipe.calories} ккал\n"
-        f"  • Белки: {new_recipe.protein} г\n"
-        f"  • Жиры: {new_recipe.fats} г\n"
-        f"  • Углеводы: {new_recipe.carbs} г\n\n"
-        f"🛒 <b>Ингредиенты:</b>\n{ingredients_text}"
-    )
+    if progress:
+        await progress.finish(new_recipe)
+    else:
+        await callback.message.answer(
+            format_recipe_text(new_recipe),
+            parse_mode="HTML",
+            reply_markup=get_recipe_action_keyboard()
+        )
 
-    await callback.message.answer(
-        recipe_text,
-        parse_mode="HTML",
-        reply_markup=get_recipe_action_keyboard()
-    )
-    await callback.answer()
+    # Альтернатива из заранее сгенерированных (sources пуст) или новый рецепт от AI
+    if not sources or SOURCE_AI in sources:
+        start_speculation(state, user_profile, dish_request, recent_recipes + [new_recipe.name])
@@ -26,7 +26,8 @@ async def cmd_start(message: Message, state: FSMContext, user_profile: UserProfi
             "Напиши, что хочешь приготовить, и я помогу!\n\n"
             "Доступные команды:\n"
             "/profile - редактировать профиль\n"
-            "/favorites - избранные рецепты"
+            "/favorites - избранные рецепты\n"
+            "/search - поиск по своим рецептам"
         )
     else:
         await message.answer(
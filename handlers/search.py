@@ -0,0 +1,92 @@
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
+from typing import Optional, Tuple
+
+from config import SEARCH_PAGE_SIZE
+from models.user import UserProfile
+from database import db
+from keyboards.search_kb import get_search_keyboard
+from services.text import normalize_request
+
+router = Router()
+
+# Символы разметки Markdown, которые нельзя показывать из запроса как есть
+_MARKDOWN_CHARS = str.maketrans("", "", "*_`[")
+
+
+async def render_search_page(
+    user_id: int,
+    query: str,
+    page: int = 0
+) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+    """Текст и клавиатура страницы результатов; None, если ничего не найдено"""
+    # Основы слов тем же стеммером, что и в индексе: «курицей» находит «курица»
+    terms = normalize_request(query).split()
+    if not terms:
+        return None
+    recipes, has_next = await db.search_recipes(
+        user_id, terms, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE
+    )
+    if not recipes:
+        return None
+
+    page_text = f" · стр. {page + 1}" if page > 0 or has_next else ""
+    text = (
+        f"🔎 *Найдено по запросу* «{query.translate(_MARKDOWN_CHARS)}»{page_text}:\n\n"
+        "Выбери рецепт:"
+    )
+    return text, get_search_keyboard(recipes, page, page > 0, has_next)
+
+
+@router.message(Command("search"))
+async def cmd_search(
+    message: Message,
+    command: CommandObject,
+    state: FSMContext,
+    user_profile: UserProfile = None
+):
+    """Команда /search <текст> - поиск по своим рецептам"""
+    if not user_profile:
+        await message.answer("Сначала зарегистрируйся! Напиши /start")
+        return
+    
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer(
+            "🔎 Напиши, что найти среди твоих рецептов, например:\n"
+            "/search курица с рисом"
+        )
+        return
+    
+    rendered = await render_search_page(user_profile.user_id, query)
+    
+    if not rendered:
+        await message.answer("🤷 Ничего не нашлось. Попробуй другие слова.")
+        return
+    
+    await state.update_data(search_query=query)
+    text, keyboard = rendered
+    await message.answer(text, parse_mode="Markdown", reply_markup=keyboard)
+
+
+@router.callback_query(F.data.startswith("search_page_"))
+async def page_search(callback: CallbackQuery, state: FSMContext):
+    """Листание результатов поиска"""
+    page = int(callback.data.split("_")[2])
+    query = (await state.get_data()).get("search_query")
+    rendered = await render_search_page(callback.from_user.id, query, page) if query else None
+    
+    if not rendered:
+        await callback.answer("Результаты устарели, повтори /search", show_alert=True)
+        return
+    
+    text, keyboard = rendered
+    try:
+        await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=keyboard)
+    except TelegramBadRequest:
+        # Страница не изменилась (повторное нажатие)
+        pass
+    await callback.answer()
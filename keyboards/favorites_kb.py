@@ -1,9 +1,9 @@
 from typing import List
-from models.user import Recipe
+from models.user import RecipeSummary
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-def get_favorites_keyboard(recipes: List[Recipe]):
-    """Клавиатура списка избранного"""
+def get_favorites_keyboard(recipes: List[RecipeSummary], page: int, has_prev: bool, has_next: bool):
+    """Клавиатура страницы избранного"""
     buttons = []
     
     for recipe in recipes:
@@ -12,6 +12,23 @@ def get_favorites_keyboard(recipes: List[Recipe]):
             callback_data=f"fav_view_{recipe.recipe_id}"
         )])
     
+    # Кнопки листания несут ключ крайней записи страницы: fav_page_<направление>_<страница>_<created_at>_<recipe_id>
+    navigation = []
+    if has_prev:
+        first = recipes[0]
+        navigation.append(InlineKeyboardButton(
+            text="⬅️ Назад",
+            callback_data=f"fav_page_prev_{page - 1}_{first.created_at}_{first.recipe_id}"
+        ))
+    if has_next:
+        last = recipes[-1]
+        navigation.append(InlineKeyboardButton(
+            text="Вперёд ➡️",
+            callback_data=f"fav_page_next_{page + 1}_{last.created_at}_{last.recipe_id}"
+        ))
+    if navigation:
+        buttons.append(navigation)
+    
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
@@ -21,4 +38,4 @@ def get_favorite_detail_keyboard(recipe_id: int):
         [InlineKeyboardButton(text="👨‍🍳 Начать готовить", callback_data=f"fav_cook_{recipe_id}")],
         [InlineKeyboardButton(text="🗑 Удалить из избранного", callback_data=f"fav_remove_{recipe_id}")]
     ])
-    return keyboard
\ No newline at end of file
+    return keyboard
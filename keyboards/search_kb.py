@@ -0,0 +1,28 @@
+from typing import List
+from models.user import RecipeSummary
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+def get_search_keyboard(recipes: List[RecipeSummary], page: int, has_prev: bool, has_next: bool):
+    """Клавиатура страницы результатов поиска"""
+    buttons = []
+    
+    for recipe in recipes:
+        buttons.append([InlineKeyboardButton(
+            text=f"🍽 {recipe.name} ({recipe.cooking_time} мин)",
+            callback_data=f"fav_view_{recipe.recipe_id}"
+        )])
+    
+    # Сам запрос хранится в данных FSM: в callback_data (64 байта) он может не поместиться
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=f"search_page_{page - 1}"
+        ))
+    if has_next:
+        navigation.append(InlineKeyboardButton(
+            text="Вперёд ➡️", callback_data=f"search_page_{page + 1}"
+        ))
+    if navigation:
+        buttons.append(navigation)
+    
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
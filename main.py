@@ -1,13 +1,12 @@
 import asyncio
 import logging
 from aiogram import Bot
-from aiogram import Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN
-from handlers import registration, profile, recipe, cooking, favorites
-from middlewares.user_middleware import UserMiddleware
+from app import create_dispatcher, start_services, stop_services
+from config import BOT_TOKEN, WEBHOOK_URL, WORKER_PROCESSES
 from database.db import init_db
+from services.webhook import run_webhook
+from services.workers import run_supervisor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,22 +16,23 @@ async def main():
     await init_db()
     
     bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-    
-    dp.message.middleware(UserMiddleware())
-    dp.callback_query.middleware(UserMiddleware())
-    
-    dp.include_router(registration.router)
-    dp.include_router(profile.router)
-    dp.include_router(recipe.router)
-    dp.include_router(cooking.router)
-    dp.include_router(favorites.router)
+    dp = create_dispatcher()
+    await start_services(bot)
     
     logger.info("Бот запущен")
-    await dp.start_polling(bot)
+    try:
+        if WEBHOOK_URL:
+            await run_webhook(dp, bot)
+        else:
+            # getUpdates не работает, пока у бота установлен webhook
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await stop_services(dp)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
-
+    if WORKER_PROCESSES > 1:
+        run_supervisor(WORKER_PROCESSES)
+    else:
+        asyncio.run(main())
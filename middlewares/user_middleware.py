@@ -1,3 +1,4 @@
+from dataclasses import replace
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
@@ -14,8 +15,19 @@ class UserMiddleware(BaseMiddleware):
         event: Message | CallbackQuery,
         data: Dict[str, Any]
     ) -> Any:
-        # Загружаем профиль пользователя
-        user_profile = await db.get_user(event.from_user.id)
+        # Загружаем профиль пользователя (сначала из кэша)
+        user_id = event.from_user.id
+        user_profile = db.user_cache.get(user_id)
+        if user_profile is None:
+            user_profile = await db.get_user(user_id)
+            if user_profile:
+                db.user_cache.set(user_id, user_profile)
+
+        # Хендлеры меняют профиль на месте, поэтому отдаём им копию
+        if user_profile:
+            user_profile = replace(
+                user_profile, dietary_restrictions=list(user_profile.dietary_restrictions)
+            )
         data['user_profile'] = user_profile
         
-        return await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
@@ -1,9 +1,10 @@
-from dataclasses import dataclass
-from typing import Optional, List
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class UserProfile:
     """Профиль пользователя"""
     user_id: int
@@ -17,7 +18,7 @@ class UserProfile:
     updated_at: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Recipe:
     """Рецепт блюда"""
     recipe_id: Optional[int]
@@ -34,9 +35,45 @@ class Recipe:
     image_url: Optional[str]
     created_at: datetime
     is_favorite: bool = False
+    # JSON ingredients/steps, которые ещё ни разу не читали (см. from_encoded)
+    _encoded: Optional[Dict[str, str]] = field(default=None, init=False, repr=False, compare=False)
 
+    @classmethod
+    def from_encoded(cls, ingredients: str, steps: str, **kwargs) -> "Recipe":
+        """Рецепт, у которого ingredients и steps разбираются при первом обращении"""
+        recipe = cls(ingredients=None, steps=None, **kwargs)
+        del recipe.ingredients, recipe.steps
+        recipe._encoded = {"ingredients": ingredients, "steps": steps}
+        return recipe
 
-@dataclass
+    def __getattr__(self, name: str):
+        # Вызывается, только если слот не заполнен: поле ещё не разобрано
+        encoded = object.__getattribute__(self, "_encoded")
+        if encoded and name in encoded:
+            value = json.loads(encoded.pop(name))
+            setattr(self, name, value)
+            if not encoded:
+                self._encoded = None
+            return value
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def encoded(self, name: str) -> str:
+        """JSON поля ingredients или steps; без разбора, если поле не читали"""
+        if self._encoded and name in self._encoded:
+            return self._encoded[name]
+        return json.dumps(getattr(self, name), ensure_ascii=False, separators=(",", ":"))
+
+
+@dataclass(slots=True)
+class RecipeSummary:
+    """Рецепт в списке избранного: только поля для кнопки и ключ пагинации"""
+    recipe_id: int
+    name: str
+    cooking_time: int
+    created_at: int  # секунды Unix
+
+
+@dataclass(slots=True)
 class CookingSession:
     """Активная сессия готовки"""
     session_id: Optional[int]
@@ -49,9 +86,9 @@ class CookingSession:
     updated_at: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class RecipeHistory:
     """История сгенерированных рецептов (для избежания повторов)"""
     user_id: int
     recipe_name: str
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
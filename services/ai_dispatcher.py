@@ -0,0 +1,281 @@
+import asyncio
+import bisect
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from config import (
+    AI_WORKERS,
+    AI_QUEUE_SIZE,
+    AI_USER_RATE,
+    AI_USER_BURST,
+)
+
+# Приоритеты: меньше — раньше
+PRIORITY_FIRST = 0
+PRIORITY_REGENERATE = 1
+PRIORITY_SPECULATIVE = 2
+
+# Границы корзин гистограммы ожидания, секунды
+WAIT_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60)
+
+# Как часто (в вызовах submit) удалять лимиты пользователей, которые полностью восстановились
+PRUNE_BUCKETS_EVERY = 1000
+
+
+class QueueFullError(Exception):
+    """Очередь генераций переполнена"""
+
+
+class QuotaExceededError(Exception):
+    """Пользователь исчерпал лимит генераций"""
+
+
+class DispatcherStoppedError(Exception):
+    """Очередь генераций остановлена"""
+
+
+class TokenBucket:
+    """Лимит запросов пользователя: rate токенов в секунду, не больше burst"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def is_full(self, now: float) -> bool:
+        """Лимит восстановился полностью: такой bucket не отличается от нового"""
+        return self.tokens + (now - self.updated_at) * self.rate >= self.burst
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"<={bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+        }
+
+
+class AIDispatcher:
+    """Ограниченный пул воркеров перед генерацией рецептов.
+
+    Задачи ждут в очереди с приоритетом (первые генерации раньше
+    перегенераций), очередь ограничена: при переполнении submit сразу
+    бросает QueueFullError. Для каждого пользователя действует token bucket;
+    полностью восстановившиеся лимиты удаляются. После stop() submit бросает
+    DispatcherStoppedError.
+    """
+
+    def __init__(self, workers: int = AI_WORKERS, queue_size: int = AI_QUEUE_SIZE):
+        self.workers_count = workers
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._seq = itertools.count()
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._submits = 0
+        # Задачи в очереди, которые ещё не взял воркер: (приоритет, порядковый номер)
+        self._waiting: Set[Tuple[int, int]] = set()
+        # Срабатывает, когда воркер берёт задачу и места в очереди сдвигаются
+        self._moved = asyncio.Event()
+        self._stopped = False
+        self._active = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.wait_time = Histogram(WAIT_BUCKETS)
+        self.queue_depth = Histogram((0, 1, 5, 10, 25, 50, 100))
+
+    def start(self):
+        """Запуск воркеров"""
+        if self._workers:
+            return
+        self._stopped = False
+        self._waiting.clear()
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+
+    async def stop(self):
+        """Остановка воркеров; ожидающие в очереди получают DispatcherStoppedError"""
+        self._stopped = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while self._queue is not None and not self._queue.empty():
+            future = self._queue.get_nowait()[-1]
+            if not future.done():
+                future.set_exception(DispatcherStoppedError())
+        self._waiting.clear()
+        self._moved.set()
+
+    def position(self, priority: int) -> int:
+        """Место в очереди для новой задачи с таким приоритетом (0 — есть свободный воркер)"""
+        return self._position(sum(1 for p, _ in self._waiting if p <= priority))
+
+    def _position(self, ahead: int) -> int:
+        free_workers = self.workers_count - self._active
+        return max(0, ahead + 1 - free_workers)
+
+    def _prune_buckets(self):
+        now = time.monotonic()
+        for user_id in [user_id for user_id, bucket in self._buckets.items() if bucket.is_full(now)]:
+            del self._buckets[user_id]
+
+    async def _report_position(self, key: Tuple[int, int], on_queued: Callable[[int], Awaitable[None]]):
+        """Сообщать место задачи в очереди при каждом его изменении, пока её не взял воркер"""
+        reported = None
+        while key in self._waiting:
+            moved = self._moved
+            position = self._position(sum(1 for other in self._waiting if other < key))
+            if position and position != reported:
+                reported = position
+                try:
+                    await on_queued(position)
+                except Exception as e:
+                    print(f"[AI QUEUE NOTIFY ERROR] {e!r}")
+            await moved.wait()
+
+    def admit(self, user_id: int, use_quota: bool = True):
+        """Проверить, что задачу можно поставить в очередь, и списать квоту пользователя.
+
+        Бросает DispatcherStoppedError, QueueFullError или QuotaExceededError.
+        """
+        if self._stopped:
+            raise DispatcherStoppedError()
+        if self._queue is None:
+            self.start()
+
+        depth = self._queue.qsize()
+        self.queue_depth.observe(depth)
+        if depth >= self.queue_size:
+            self.rejected += 1
+            raise QueueFullError()
+        if use_quota:
+            self.charge(user_id)
+
+    def charge(self, user_id: int):
+        """Списать генерацию с лимита пользователя; QuotaExceededError, если лимит исчерпан"""
+        self._submits += 1
+        if self._submits % PRUNE_BUCKETS_EVERY == 0:
+            self._prune_buckets()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(AI_USER_RATE, AI_USER_BURST)
+        if not bucket.take():
+            self.throttled += 1
+            raise QuotaExceededError()
+
+    async def submit(
+        self,
+        user_id: int,
+        factory: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_FIRST,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+        use_quota: bool = True
+    ) -> Any:
+        """Поставить генерацию в очередь и дождаться результата.
+
+        on_queued(position) вызывается, если свободных воркеров нет, и затем
+        каждый раз, когда место в очереди меняется.
+        """
+        self.admit(user_id, use_quota)
+        return await self.enqueue(factory, priority, on_queued)
+
+    async def enqueue(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_FIRST,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> Any:
+        """Поставить в очередь задачу, уже прошедшую admit, и дождаться результата"""
+        if self._stopped:
+            raise DispatcherStoppedError()
+        if self._queue is None:
+            self.start()
+
+        key = (priority, next(self._seq))
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((*key, time.monotonic(), factory, future))
+        self._waiting.add(key)
+
+        if not on_queued:
+            return await future
+        reporter = asyncio.create_task(self._report_position(key, on_queued))
+        try:
+            return await future
+        finally:
+            reporter.cancel()
+
+    async def _worker(self):
+        while True:
+            priority, seq, queued_at, factory, future = await self._queue.get()
+            self._waiting.discard((priority, seq))
+            self._moved.set()
+            self._moved = asyncio.Event()
+            if future.cancelled():
+                continue
+            self.wait_time.observe(time.monotonic() - queued_at)
+
+            # Если ожидающий ушёл, генерация отменяется и не тратит квоту
+            task = asyncio.ensure_future(factory())
+            future.add_done_callback(lambda done, task=task: task.cancel() if done.cancelled() else None)
+            self._active += 1
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                future.cancel()
+                raise
+            finally:
+                self._active -= 1
+
+            if future.done():
+                continue
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди, гистограммы ожидания и отказы"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "active": self._active,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "buckets": len(self._buckets),
+            "wait_time": self.wait_time.snapshot(),
+            "queue_depth_on_submit": self.queue_depth.snapshot(),
+        }
+
+
+dispatcher = AIDispatcher()
@@ -1,10 +1,29 @@
 # services/ai_service.py
-import requests
+import aiohttp
+import asyncio
+import hashlib
 import json
-from typing import Optional, List
+import time
+import zlib
+from dataclasses import replace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, List
 from datetime import datetime
 from models.user import UserProfile, Recipe
-from config import AI_API_TOKEN, MODEL
+from services import ai_usage, goal_fit, nutrition, recipe_cache, recipe_parser
+from services.retrieval import retriever
+from services.ai_dispatcher import dispatcher, PRIORITY_FIRST
+from services.recipe_parser import RecipeParseError, RecipeSchema, RecipeStreamParser
+from config import (
+    AI_API_TOKEN,
+    MODEL,
+    AI_CONNECT_TIMEOUT,
+    AI_READ_TIMEOUT,
+    AI_MAX_CONNECTIONS_PER_HOST,
+    AI_KEEPALIVE_TIMEOUT,
+    MAX_RECIPE_ATTEMPTS,
+    PROMPT_COMPACT_SHARE,
+    RECIPE_REPAIR_BACKOFF,
+)
 
 API_URL = "https://router.huggingface.co/v1/chat/completions"
 
@@ -13,20 +32,204 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
+_session: Optional[aiohttp.ClientSession] = None
 
-def query(payload: dict) -> Optional[dict]:
+# Откуда generate_recipe взял рецепт (см. on_source)
+SOURCE_CACHE = "cache"
+SOURCE_RETRIEVAL = "retrieval"
+SOURCE_AI = "ai"
+
+# Одинаковые генерации, которые сейчас выполняются: ключ -> генерация и её ожидающие
+_inflight: Dict[str, "_Flight"] = {}
+started_generations = 0
+coalesced_generations = 0
+# Разбор ответов модели: сколько всего, сколько не разобралось с первого раза,
+# сколько запросов на исправление отправлено и сколько ответов так и не разобрано
+parsed_responses = 0
+first_parse_failures = 0
+repair_requests = 0
+failed_parses = 0
+# Ответы, оборванные на середине (finish_reason=length или незакрытый JSON)
+truncated_responses = 0
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Общая HTTP-сессия с пулом keep-alive соединений"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=AI_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=AI_KEEPALIVE_TIMEOUT
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=AI_CONNECT_TIMEOUT,
+            sock_read=AI_READ_TIMEOUT
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS)
+    return _session
+
+
+async def close_session():
+    """Закрыть HTTP-сессию при остановке бота"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def query(payload: dict) -> Optional[dict]:
     """Отправка запроса в Hugging Face API"""
     try:
-        response = requests.post(API_URL, headers=HEADERS, json=payload, timeout=60)
-        if response.status_code != 200:
-            print(f"[AI API ERROR] {response.status_code}: {response.text}")
-            return None
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"[AI API EXCEPTION] {e}")
+        async with get_session().post(API_URL, json=payload) as response:
+            if response.status != 200:
+                print(f"[AI API ERROR] {response.status}: {await response.text()}")
+                return None
+            return await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+        print(f"[AI API EXCEPTION] {e!r}")
         return None
 
 
+async def query_stream(
+    payload: dict,
+    usage: Optional[dict] = None,
+    finish: Optional[dict] = None
+) -> AsyncIterator[str]:
+    """Потоковый запрос (SSE): отдаёт куски текста ответа по мере генерации.
+
+    Поле usage последнего куска (токены промпта и ответа) записывается в usage,
+    причина окончания ответа — в finish["finish_reason"].
+    """
+    stream_payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    try:
+        async with get_session().post(API_URL, json=stream_payload) as response:
+            if response.status != 200:
+                print(f"[AI API ERROR] {response.status}: {await response.text()}")
+                return
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    return
+                chunk = json.loads(data)
+                if chunk.get("usage") and usage is not None:
+                    usage.update(chunk["usage"])
+                if not chunk.get("choices"):
+                    continue
+                if chunk["choices"][0].get("finish_reason") and finish is not None:
+                    finish["finish_reason"] = chunk["choices"][0]["finish_reason"]
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    yield content
+    except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+        print(f"[AI API EXCEPTION] {e!r}")
+
+
+async def query_streaming(
+    payload: dict,
+    on_progress: Callable[[Dict[str, Any]], Awaitable[None]]
+) -> Optional[dict]:
+    """Потоковый запрос с передачей готовых полей рецепта в on_progress.
+
+    Возвращает ответ в том же виде, что и query().
+    """
+    parser = RecipeStreamParser()
+    parts = []
+    usage: Dict[str, Any] = {}
+    finish: Dict[str, Any] = {}
+    async for content in query_stream(payload, usage, finish):
+        parts.append(content)
+        if parser.feed(content):
+            try:
+                await on_progress(recipe_parser.normalize_fields(parser.fields))
+            except Exception as e:
+                print(f"[AI STREAM PROGRESS ERROR] {e!r}")
+
+    if not parts:
+        return None
+    return {
+        "choices": [{"message": {"content": "".join(parts)}, "finish_reason": finish.get("finish_reason")}],
+        "usage": usage or None
+    }
+
+
+GOAL_TEXT = {
+    "weight_loss": "похудение (низкокалорийное)",
+    "muscle_gain": "набор мышечной массы (высокобелковое)",
+    "high_protein": "высокое содержание белка",
+    "none": "неважно"
+}
+
+# Варианты промпта генерации: подробный (один длинный запрос) и компактный
+# (одинаковый для всех system-промпт и короткий запрос)
+PROMPT_FULL = "full"
+PROMPT_COMPACT = "compact"
+
+# Статический префикс компактного промпта. Он не меняется от запроса к запросу,
+# поэтому провайдер может кэшировать его и не обрабатывать заново.
+# Ответ короче подробного: ингредиенты и шаги — пары без ключей и номеров шагов
+COMPACT_SYSTEM_PROMPT = """Ты — шеф-повар и диетолог. Ответь одним JSON-объектом без markdown и пояснений:
+{"name":"Название","description":"1-2 предложения","calories":0,"protein":0,"fats":0,"carbs":0,"cooking_time":0,"servings":0,"ingredients":[["Ингредиент","200г"]],"steps":[["Что сделать",5]]}
+КБЖУ — на одну порцию, количества ингредиентов — на все порции (servings), время в минутах, cooking_time — сумма шагов.
+Соблюдай цель, ограничения и оборудование пользователя, не предлагай перечисленные блюда."""
+
+
+def prompt_variant(user_id: int) -> str:
+    """Вариант промпта для пользователя: постоянный, доля компактного — PROMPT_COMPACT_SHARE"""
+    bucket = zlib.crc32(str(user_id).encode()) % 1000
+    return PROMPT_COMPACT if bucket < PROMPT_COMPACT_SHARE * 1000 else PROMPT_FULL
+
+
+def _equipment_text(user_profile: UserProfile) -> str:
+    equipment = []
+    if user_profile.has_oven:
+        equipment.append("духовка")
+    if user_profile.has_microwave:
+        equipment.append("микроволновка")
+    if user_profile.has_stove:
+        equipment.append("плита")
+    return ", ".join(equipment) if equipment else "нет специального оборудования"
+
+
+def build_compact_prompt(
+    user_profile: UserProfile,
+    dish_request: str,
+    ingredients: Optional[List[str]] = None,
+    exclude_recipes: Optional[List[str]] = None
+) -> str:
+    """Изменяемая часть компактного промпта (после COMPACT_SYSTEM_PROMPT)"""
+    lines = [
+        f"Запрос: {dish_request}",
+        f"Цель: {GOAL_TEXT[goal_fit.goal_key(user_profile.goal)]}",
+        f"Ограничения: {', '.join(user_profile.dietary_restrictions) or 'нет'}",
+        f"Оборудование: {_equipment_text(user_profile)}",
+    ]
+    if ingredients:
+        lines.append(f"Ингредиенты: {', '.join(ingredients)}")
+    if exclude_recipes:
+        lines.append(f"Не предлагай: {', '.join(exclude_recipes)}")
+    return "\n".join(lines)
+
+
+def build_recipe_messages(
+    variant: str,
+    user_profile: UserProfile,
+    dish_request: str,
+    ingredients: Optional[List[str]] = None,
+    exclude_recipes: Optional[List[str]] = None
+) -> List[Dict[str, str]]:
+    """Сообщения запроса на генерацию для варианта промпта variant"""
+    if variant == PROMPT_COMPACT:
+        return [
+            {"role": "system", "content": COMPACT_SYSTEM_PROMPT},
+            {"role": "user", "content": build_compact_prompt(user_profile, dish_request, ingredients, exclude_recipes)},
+        ]
+    return [{"role": "user", "content": build_recipe_prompt(user_profile, dish_request, ingredients, exclude_recipes)}]
+
+
 def build_recipe_prompt(
     user_profile: UserProfile,
     dish_request: str,
@@ -34,21 +237,10 @@ def build_recipe_prompt(
     exclude_recipes: Optional[List[str]] = None
 ) -> str:
     """Создание промпта для генерации рецепта"""
-    goal_text = {
-        "weight_loss": "похудение (низкокалорийное)",
-        "muscle_gain": "набор мышечной массы (высокобелковое)",
-        "none": "неважно"
-    }.get(user_profile.goal, "")
+    goal_text = GOAL_TEXT[goal_fit.goal_key(user_profile.goal)]
 
     restrictions = ", ".join(user_profile.dietary_restrictions) if user_profile.dietary_restrictions else "нет"
-    equipment = []
-    if user_profile.has_oven:
-        equipment.append("духовка")
-    if user_profile.has_microwave:
-        equipment.append("микроволновка")
-    if user_profile.has_stove:
-        equipment.append("плита")
-    equipment_text = ", ".join(equipment) if equipment else "нет специального оборудования"
+    equipment_text = _equipment_text(user_profile)
     ingredients_text = ", ".join(ingredients) if ingredients else "любые"
 
     exclude_text = ""
@@ -75,6 +267,7 @@ def build_recipe_prompt(
     "fats": xxx,
     "carbs": xxx,
     "cooking_time": xxx,
+    "servings": x,
     "ingredients": [
         {{"name": "Ингридиент1", "amount": "xxxг"}},
         {{"name": "Ингридиент2", "amount": "xxxг"}}
@@ -88,6 +281,7 @@ def build_recipe_prompt(
 
 Требования:
 - КБЖУ должны соответствовать цели пользователя
+- КБЖУ — на одну порцию, количества ингредиентов — на все порции (servings)
 - Учитывай пищевые ограничения
 - Используй только доступное оборудование
 - Время в минутах для каждого шага
@@ -97,61 +291,382 @@ def build_recipe_prompt(
     return prompt
 
 
-def parse_recipe_response(response: dict, user_id: int) -> Optional[Recipe]:
-    """Парсинг ответа AI в объект Recipe"""
+# Формат полей рецепта для запроса на исправление ответа
+REPAIR_FIELD_FORMATS = {
+    "name": '"Название блюда"',
+    "description": '"Краткое описание (1-2 предложения)"',
+    "calories": "xxx",
+    "protein": "xxx",
+    "fats": "xxx",
+    "carbs": "xxx",
+    "cooking_time": "xxx",
+    "servings": "x",
+    "ingredients": '[{"name": "Ингредиент", "amount": "xxxг"}]',
+    "steps": '[{"step": 1, "description": "Что сделать", "duration": 5}]',
+}
+
+
+def build_repair_prompt(reply_text: str, error: RecipeParseError) -> str:
+    """Промпт, который просит модель исправить только сломанную часть ответа"""
+    if error.truncated:
+        broken = recipe_parser.extract_json(reply_text)
+        return f"""JSON ниже оборван на середине. Напиши его целиком: сохрани уже написанное, допиши недописанное значение и оставшиеся поля. Ответь только полным JSON, без markdown и пояснений.
+
+{broken}"""
+
+    if error.data is None:
+        broken = recipe_parser.extract_json(reply_text)
+        return f"""Исправь синтаксис JSON, не меняя содержания. Ответь только исправленным JSON, без markdown и пояснений.
+
+{broken}"""
+
+    context = {key: error.data[key] for key in ("name", "ingredients") if key in error.data and key not in error.fields}
+    formats = ",\n".join(
+        f'    "{field}": {REPAIR_FIELD_FORMATS[field]}' for field in error.fields if field in REPAIR_FIELD_FORMATS
+    )
+    return f"""В рецепте ниже поля {", ".join(error.fields)} отсутствуют или заполнены неверно ({error}).
+
+{json.dumps(context, ensure_ascii=False)}
+
+Верни строго JSON только с этими полями, без markdown:
+{{
+{formats}
+}}"""
+
+
+def recipe_from_schema(schema: RecipeSchema, user_id: int) -> Recipe:
+    """Recipe из проверенного ответа модели с КБЖУ, сверенными по таблице ингредиентов"""
+    recipe = Recipe(
+        recipe_id=None,
+        user_id=user_id,
+        name=schema.name,
+        description=schema.description,
+        calories=schema.calories,
+        protein=schema.protein,
+        fats=schema.fats,
+        carbs=schema.carbs,
+        cooking_time=schema.cooking_time,
+        ingredients=[ingredient.model_dump() for ingredient in schema.ingredients],
+        steps=[step.model_dump() for step in schema.steps],
+        image_url=None,
+        created_at=datetime.now(),
+        is_favorite=False
+    )
+    # КБЖУ от модели часто не сходятся с составом: сверяем с таблицей ингредиентов
+    return nutrition.check(recipe, schema.servings or 0)
+
+
+def _reply_text(response: dict) -> Optional[str]:
     try:
-        reply_text = response["choices"][0]["message"]["content"].strip()
-
-        # Убираем блоки <think>...</think> и markdown ```
-        if "<think>" in reply_text and "</think>" in reply_text:
-            reply_text = reply_text.split("</think>")[-1].strip()
-
-        if reply_text.startswith("```"):
-            reply_text = reply_text.split("```")[-1].strip()
-            if reply_text.startswith("json"):
-                reply_text = reply_text[4:].strip()
-
-        data = json.loads(reply_text)
-
-        return Recipe(
-            recipe_id=None,
-            user_id=user_id,
-            name=data["name"],
-            description=data["description"],
-            calories=int(data["calories"]),
-            protein=int(data["protein"]),
-            fats=int(data["fats"]),
-            carbs=int(data["carbs"]),
-            cooking_time=int(data["cooking_time"]),
-            ingredients=data["ingredients"],
-            steps=data["steps"],
-            image_url=None,
-            created_at=datetime.now(),
-            is_favorite=False
-        )
+        return response["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def _is_truncated(response: dict) -> bool:
+    # Модель упёрлась в лимит токенов: даже закрытый JSON может быть недописан
+    try:
+        return response["choices"][0].get("finish_reason") == "length"
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return False
+
+
+async def parse_recipe_response(response: dict, user_id: int, variant: str = PROMPT_FULL) -> Optional[Recipe]:
+    """Парсинг ответа AI в объект Recipe.
 
-    except Exception as e:
-        print(f"[AI PARSE ERROR] {e}")
-        print(f"Ответ AI: {response}")
+    Синтаксис JSON сначала чинится локально (services.recipe_parser). Если
+    ответ всё равно не разбирается или не проходит схему, модель до
+    MAX_RECIPE_ATTEMPTS - 1 раз просят исправить только сломанное: синтаксис
+    или неверные поля, которые затем подставляются в уже разобранный ответ.
+    Перед каждым запросом — пауза RECIPE_REPAIR_BACKOFF, удваивающаяся.
+    Оборванный ответ (finish_reason=length или незакрытый JSON) не проверяется
+    схемой и не подставляется в рецепт: модель просят написать его целиком.
+    Результат и запросы на исправление учитываются в ai_usage по варианту промпта.
+    """
+    global parsed_responses, first_parse_failures, repair_requests, failed_parses, truncated_responses
+    text = _reply_text(response)
+    if text is None:
+        print(f"[AI PARSE ERROR] Неожиданный ответ API: {response}")
         return None
 
+    parsed_responses += 1
+    data = None
+    truncated = _is_truncated(response)
+    for attempt in range(MAX_RECIPE_ATTEMPTS):
+        try:
+            if data is None:
+                if truncated:
+                    raise RecipeParseError("ответ оборван: finish_reason=length", truncated=True)
+                data = recipe_parser.load_json_object(text)
+            recipe = recipe_from_schema(recipe_parser.validate_recipe(data), user_id)
+            ai_usage.record_parse(variant, attempt + 1, True)
+            return recipe
+        except RecipeParseError as e:
+            error = e
+        if attempt == 0:
+            first_parse_failures += 1
+            if error.truncated:
+                truncated_responses += 1
+        # Ответ без JSON (отказ, пустой текст) исправлять нечего
+        if attempt + 1 == MAX_RECIPE_ATTEMPTS or recipe_parser.extract_json(text) is None:
+            break
+
+        print(f"[AI PARSE ERROR] Попытка {attempt + 1}: {error}")
+        await asyncio.sleep(RECIPE_REPAIR_BACKOFF * 2 ** attempt)
+        repair_requests += 1
+        started = time.perf_counter()
+        reply = await query({
+            "model": MODEL,
+            "messages": [{"role": "user", "content": build_repair_prompt(text, error)}]
+        })
+        ai_usage.record_call(variant, ai_usage.REPAIR, reply, started)
+        repair_text = _reply_text(reply) if reply else None
+        if repair_text is None:
+            continue
+        if error.data is None:
+            text = repair_text
+            truncated = _is_truncated(reply)
+            continue
+        # Оборванное исправление может нести недописанное значение поля
+        if _is_truncated(reply):
+            continue
+        try:
+            patch = recipe_parser.load_json_object(repair_text)
+        except RecipeParseError:
+            continue
+        data = {**error.data, **{field: patch[field] for field in error.fields if field in patch}}
+
+    failed_parses += 1
+    ai_usage.record_parse(variant, MAX_RECIPE_ATTEMPTS, False)
+    print(f"[AI PARSE ERROR] {error}")
+    print(f"Ответ AI: {text}")
+    return None
+
+
+def get_parse_stats() -> dict:
+    """Доля ответов, не разобранных с первого раза, и число запросов на исправление"""
+    return {
+        "responses": parsed_responses,
+        "local_repairs": recipe_parser.local_repairs,
+        "first_parse_failures": first_parse_failures,
+        "repair_requests": repair_requests,
+        "failed": failed_parses,
+        "truncated": truncated_responses,
+        "first_failure_rate": first_parse_failures / parsed_responses if parsed_responses else 0.0,
+        "retry_rate": repair_requests / parsed_responses if parsed_responses else 0.0,
+        "failure_rate": failed_parses / parsed_responses if parsed_responses else 0.0,
+    }
+
+
+class _Flight:
+    """Генерация, которую ждут несколько вызовов, и callbacks каждого из них"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.progress_callbacks: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+        self.queued_callbacks: List[Callable[[int], Awaitable[None]]] = []
+        self.start_callbacks: List[Callable[[], None]] = []
+        self.started = False
+        # Последние готовые поля и место в очереди — для присоединившихся позже
+        self.fields: Optional[Dict[str, Any]] = None
+        self.position = 0
+
+    def join(self, on_progress, on_queued, on_start):
+        self.waiters += 1
+        for callbacks, callback in (
+            (self.progress_callbacks, on_progress),
+            (self.queued_callbacks, on_queued),
+            (self.start_callbacks, on_start),
+        ):
+            if callback:
+                callbacks.append(callback)
+        if on_start and self.started:
+            on_start()
+
+    def leave(self, on_progress, on_queued, on_start):
+        self.waiters -= 1
+        for callbacks, callback in (
+            (self.progress_callbacks, on_progress),
+            (self.queued_callbacks, on_queued),
+            (self.start_callbacks, on_start),
+        ):
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def start(self):
+        self.started = True
+        for callback in list(self.start_callbacks):
+            callback()
+
+    async def progress(self, fields: Dict[str, Any]):
+        self.fields = fields
+        for callback in list(self.progress_callbacks):
+            try:
+                await callback(fields)
+            except Exception as e:
+                print(f"[AI STREAM PROGRESS ERROR] {e!r}")
+
+    async def queued(self, position: int):
+        self.position = position
+        for callback in list(self.queued_callbacks):
+            try:
+                await callback(position)
+            except Exception as e:
+                print(f"[AI QUEUE NOTIFY ERROR] {e!r}")
+
+    async def replay(self, on_progress, on_queued):
+        """Сообщить присоединившемуся то, что остальные уже получили"""
+        try:
+            if on_progress and self.fields:
+                await on_progress(self.fields)
+            elif on_queued and self.position and not self.started:
+                await on_queued(self.position)
+        except Exception as e:
+            print(f"[AI STREAM PROGRESS ERROR] {e!r}")
+
+
+async def _single_flight(
+    key: str,
+    factory: Callable[[_Flight], Awaitable[Optional[Recipe]]],
+    admit: Callable[[bool], None],
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    on_start: Optional[Callable[[], None]] = None
+) -> Optional[Recipe]:
+    """Выполнить factory один раз для всех одновременных вызовов с одним ключом.
+
+    admit(leader) вызывается до присоединения к генерации: его исключение
+    (квота, переполненная очередь) получает только этот вызов. on_progress,
+    on_queued и on_start каждого ожидающего получают события общей генерации.
+    """
+    global started_generations, coalesced_generations
+    flight = _inflight.get(key)
+    admit(flight is None)
+    if flight is None:
+        started_generations += 1
+        flight = _Flight()
+        flight.task = asyncio.create_task(factory(flight))
+        _inflight[key] = flight
+        flight.task.add_done_callback(
+            lambda done: _inflight.pop(key, None) if _inflight.get(key) is flight else None
+        )
+    else:
+        coalesced_generations += 1
+
+    flight.join(on_progress, on_queued, on_start)
+    try:
+        await flight.replay(on_progress, on_queued)
+        # shield: отмена одного ожидающего не должна отменять запрос для остальных
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.leave(on_progress, on_queued, on_start)
+        # Результат больше никому не нужен — не тратим квоту API
+        if not flight.waiters and not flight.task.done():
+            flight.task.cancel()
+            if _inflight.get(key) is flight:
+                del _inflight[key]
+
+
+def get_generation_stats() -> dict:
+    """Сколько генераций запущено и сколько вызовов к ним присоединилось"""
+    total = started_generations + coalesced_generations
+    return {
+        "started": started_generations,
+        "coalesced": coalesced_generations,
+        "in_flight": len(_inflight),
+        "coalesced_rate": coalesced_generations / total if total else 0.0,
+    }
+
+
 async def generate_recipe(
     user_profile: UserProfile,
     dish_request: str,
     ingredients: Optional[List[str]] = None,
-    exclude_recipes: Optional[List[str]] = None
+    exclude_recipes: Optional[List[str]] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    priority: int = PRIORITY_FIRST,
+    on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    use_quota: bool = True,
+    retrieve: bool = False,
+    on_start: Optional[Callable[[], None]] = None,
+    on_source: Optional[Callable[[str], None]] = None
 ) -> Optional[Recipe]:
-    """Генерация рецепта через Hugging Face API"""
-    prompt = build_recipe_prompt(user_profile, dish_request, ingredients, exclude_recipes)
+    """Генерация рецепта через Hugging Face API.
+
+    Если передан on_progress, ответ запрашивается потоком и callback получает
+    уже готовые поля рецепта (name, description, КБЖУ, ingredients...).
+    Запрос к API проходит через очередь dispatcher и может бросить
+    QueueFullError или QuotaExceededError. С retrieve=True сначала ищется
+    подходящий рецепт среди уже сгенерированных (services.retrieval).
+    on_start вызывается, когда воркер очереди начинает запрос к API.
+    on_source(source) сообщает, откуда взят рецепт: SOURCE_CACHE,
+    SOURCE_RETRIEVAL или SOURCE_AI.
+    """
+    cache_key = recipe_cache.make_cache_key(user_profile, dish_request, ingredients)
+    cached = await recipe_cache.lookup(
+        cache_key, user_profile.user_id, exclude_recipes, user_profile.goal
+    )
+    if cached:
+        if on_source:
+            on_source(SOURCE_CACHE)
+        return cached
+
+    if retrieve:
+        found = await retriever.find(user_profile, dish_request, ingredients, exclude_recipes)
+        if found:
+            if on_source:
+                on_source(SOURCE_RETRIEVAL)
+            return found
+
+    variant = prompt_variant(user_profile.user_id)
     payload = {
         "model": MODEL,
-        "messages": [{"role": "user", "content": prompt}]
+        "messages": build_recipe_messages(variant, user_profile, dish_request, ingredients, exclude_recipes)
     }
 
-    response = query(payload)
-    if not response:
-        print("[AI API ERROR] Пустой ответ")
-        return None
+    async def run(flight: _Flight) -> Optional[Recipe]:
+        flight.start()
+        started = time.perf_counter()
+        # Поток, если хоть один из ожидающих показывает поля по мере генерации
+        if flight.progress_callbacks:
+            response = await query_streaming(payload, flight.progress)
+        else:
+            response = await query(payload)
+        ai_usage.record_call(variant, ai_usage.GENERATION, response, started)
+        if not response:
+            print("[AI API ERROR] Пустой ответ")
+            return None
 
-    return parse_recipe_response(response, user_profile.user_id)
+        recipe = await parse_recipe_response(response, user_profile.user_id, variant)
+        if recipe:
+            await recipe_cache.store(cache_key, recipe)
+        return recipe
+
+    def admit(leader: bool):
+        # Первый вызов занимает место в очереди, каждый присоединившийся
+        # платит своей квотой; ошибки получает только сам вызывающий
+        if leader:
+            dispatcher.admit(user_profile.user_id, use_quota)
+        elif use_quota:
+            dispatcher.charge(user_profile.user_id)
+
+    # Ключ — то же, что определяет рецепт в кэше, плюс исключения, вариант промпта,
+    # приоритет и режим квоты (срочный запрос не ждёт на месте фоновой генерации);
+    # имя и user_id в него не входят, поэтому одинаковые профили делят один запрос
+    flight_key = hashlib.sha1("|".join([
+        cache_key, variant, str(priority), str(use_quota),
+        *sorted(name.casefold() for name in exclude_recipes or [])
+    ]).encode()).hexdigest()
+    recipe = await _single_flight(
+        flight_key,
+        lambda flight: dispatcher.enqueue(lambda: run(flight), priority, flight.queued),
+        admit, on_progress, on_queued, on_start
+    )
+    if recipe is None:
+        return None
+    if on_source:
+        on_source(SOURCE_AI)
+    # Каждый вызывающий получает свою копию рецепта
+    return replace(recipe, user_id=user_profile.user_id)
 
@@ -0,0 +1,88 @@
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from services.ai_dispatcher import Histogram
+
+# Границы корзин гистограммы длительности запроса к AI, секунды
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120)
+
+# Виды запросов: генерация рецепта и просьба исправить ответ
+GENERATION = "generation"
+REPAIR = "repair"
+
+
+class CallStats:
+    """Запросы одного варианта промпта и вида: токены из поля usage ответа,
+    длительность и успешность разбора"""
+
+    def __init__(self):
+        self.calls = 0
+        self.unreported = 0  # Ответы без поля usage
+        self.prompt_tokens = 0
+        self.cached_tokens = 0  # Токены промпта, взятые провайдером из кэша префикса
+        self.completion_tokens = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.parsed_first_try = 0
+        self.parsed = 0
+        self.failed = 0
+
+    def record(self, response: Optional[Dict[str, Any]], elapsed: float):
+        self.calls += 1
+        self.latency.observe(elapsed)
+        usage = (response or {}).get("usage")
+        if not usage:
+            self.unreported += 1
+            return
+        self.prompt_tokens += usage.get("prompt_tokens") or 0
+        self.completion_tokens += usage.get("completion_tokens") or 0
+        self.cached_tokens += (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        reported = self.calls - self.unreported
+        parses = self.parsed + self.failed
+        return {
+            "calls": self.calls,
+            "unreported": self.unreported,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_prompt_tokens": self.prompt_tokens / reported if reported else 0.0,
+            "avg_completion_tokens": self.completion_tokens / reported if reported else 0.0,
+            "latency": self.latency.snapshot(),
+            "first_try_parse_rate": self.parsed_first_try / parses if parses else 0.0,
+            "parse_rate": self.parsed / parses if parses else 0.0,
+        }
+
+
+_stats: Dict[Tuple[str, str], CallStats] = {}
+
+
+def _get(variant: str, kind: str) -> CallStats:
+    stats = _stats.get((variant, kind))
+    if stats is None:
+        stats = _stats[(variant, kind)] = CallStats()
+    return stats
+
+
+def record_call(variant: str, kind: str, response: Optional[Dict[str, Any]], started: float):
+    """Учесть запрос к AI, начатый в started (time.perf_counter())"""
+    _get(variant, kind).record(response, time.perf_counter() - started)
+
+
+def record_parse(variant: str, attempts: int, ok: bool):
+    """Учесть разбор ответа на генерацию: с какой попытки и удался ли он"""
+    stats = _get(variant, GENERATION)
+    if ok:
+        stats.parsed += 1
+        if attempts == 1:
+            stats.parsed_first_try += 1
+    else:
+        stats.failed += 1
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Сводка по вариантам промпта: {вариант: {вид запроса: ...}}"""
+    result: Dict[str, Dict[str, Any]] = {}
+    for (variant, kind), call_stats in sorted(_stats.items()):
+        result.setdefault(variant, {})[kind] = call_stats.snapshot()
+    return result
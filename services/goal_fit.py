@@ -0,0 +1,84 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from models.user import Recipe
+
+INF = float("inf")
+
+# Порядок признаков в матрице КБЖУ: строка на признак, столбец на рецепт.
+# Такая раскладка втрое быстрее «строки на рецепт»: каждая операция идёт
+# по непрерывному массиву
+FEATURES = ("calories", "protein", "fats", "carbs", "cooking_time")
+
+# Цель → допустимый диапазон на порцию (от, до) для каждого признака FEATURES.
+# Внутри диапазона штрафа нет, за его пределами он растёт квадратично
+GOAL_RANGES = {
+    "weight_loss": ((250, 450), (25, INF), (0, 15), (0, 45), (0, 40)),
+    "muscle_gain": ((600, 850), (40, INF), (10, 30), (60, 110), (0, 60)),
+    "high_protein": ((400, 650), (45, INF), (0, 25), (20, 60), (0, 50)),
+    "none": ((350, 750), (15, INF), (0, 35), (0, 90), (0, 60)),
+}
+
+# Отклонение от диапазона, при котором штраф по признаку равен весу признака
+TOLERANCES = (150.0, 15.0, 10.0, 25.0, 30.0)
+FEATURE_WEIGHTS = (1.0, 1.0, 0.5, 0.5, 0.25)
+
+_GOALS = {goal: i for i, goal in enumerate(GOAL_RANGES)}
+_LOW = np.array([[low for low, _ in ranges] for ranges in GOAL_RANGES.values()], np.float32)[..., None]
+_HIGH = np.array([[high for _, high in ranges] for ranges in GOAL_RANGES.values()], np.float32)[..., None]
+_INVERSE_SCALE = 1 / np.array(TOLERANCES, np.float32)[:, None]
+_WEIGHTS = np.array(FEATURE_WEIGHTS, np.float32) / sum(FEATURE_WEIGHTS)
+
+
+def goal_key(goal: Optional[str]) -> str:
+    """Ключ GOAL_RANGES для цели из профиля.
+
+    При регистрации цель сохраняется как "goal_weight_loss", при смене
+    в профиле — первым словом ("weight"); неизвестная цель — "none".
+    """
+    goal = (goal or "").removeprefix("goal_")
+    for key in GOAL_RANGES:
+        if goal in (key, key.split("_")[0]):
+            return key
+    return "none"
+
+
+def recipe_macros(recipes: Sequence[Recipe]) -> np.ndarray:
+    """Матрица КБЖУ и времени: строки — FEATURES, столбцы — recipes"""
+    return np.array(
+        [[getattr(recipe, feature) or 0 for recipe in recipes] for feature in FEATURES],
+        np.float32
+    ).reshape(len(FEATURES), -1)
+
+
+def score(goal: Optional[str], macros: np.ndarray) -> np.ndarray:
+    """Соответствие цели от 0 до 1 для каждого столбца macros (строки — FEATURES)"""
+    i = _GOALS[goal_key(goal)]
+    # Диапазон не пуст, поэтому положительна не больше чем одна из разностей
+    excess = np.maximum(_LOW[i] - macros, macros - _HIGH[i])
+    np.maximum(excess, 0, out=excess)
+    excess *= _INVERSE_SCALE
+    excess *= excess
+    penalty = _WEIGHTS @ excess
+    penalty += 1
+    return np.reciprocal(penalty, out=penalty)
+
+
+def rank(goal: Optional[str], macros: np.ndarray, limit: Optional[int] = None) -> np.ndarray:
+    """Номера столбцов macros от лучшего к худшему; при limit — только limit лучших.
+
+    Равные оценки сохраняют исходный порядок столбцов.
+    """
+    fit = score(goal, macros)
+    if limit is not None and limit < fit.size:
+        top = np.argpartition(-fit, limit - 1)[:limit]
+        return top[np.lexsort((top, -fit[top]))]
+    return np.argsort(-fit, kind="stable")
+
+
+def best_recipes(goal: Optional[str], recipes: Sequence[Recipe]) -> List[Recipe]:
+    """Рецепты от лучше всего подходящего под цель; при равенстве — в исходном порядке"""
+    if len(recipes) < 2:
+        return list(recipes)
+    return [recipes[i] for i in rank(goal, recipe_macros(recipes))]
@@ -0,0 +1,328 @@
+import re
+from dataclasses import replace
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import NUTRITION_TOLERANCE, NUTRITION_MIN_COVERAGE
+from models.user import Recipe
+from services.text import search_terms, stem_matches
+
+# Ингредиент → (ккал, белки, жиры, углеводы на 100 г, вес одной штуки в граммах или None).
+# Ключ — основы через пробел (services.text.search_terms); подходит, если каждая
+# встречается в названии ингредиента. Из подходящих берётся ключ с большим числом
+# основ, затем более длинный: «сливочн масл» точнее «масл», «маслин» — чем «масл»
+NUTRITION = {
+    # Мясо и птица
+    ("курин фил", "курин грудк", "фил куриц", "грудк куриц"): (113, 23.6, 1.9, 0.4, 200),
+    ("курин бедр", "бедр"): (185, 18.5, 12.0, 0.0, 120),
+    ("курин крыл", "крылышк"): (186, 19.2, 12.2, 0.0, 40),
+    ("курин печен",): (137, 20.4, 5.9, 0.7, None),
+    ("курин фарш",): (143, 17.4, 8.1, 0.0, None),
+    ("куриц", "цыпл"): (190, 16.0, 14.0, 0.0, None),
+    ("индейк фарш",): (161, 18.0, 9.8, 0.0, None),
+    ("индейк",): (115, 24.0, 2.0, 0.0, None),
+    ("грудк", "фил"): (113, 23.6, 1.9, 0.4, 200),
+    ("говяж фарш",): (254, 17.2, 20.0, 0.0, None),
+    ("говяд", "говяж"): (187, 18.9, 12.4, 0.0, None),
+    ("телят",): (97, 19.7, 1.2, 0.0, None),
+    ("свин",): (259, 16.0, 21.6, 0.0, None),
+    ("фарш",): (263, 17.0, 21.5, 0.0, None),
+    ("баран", "ягнят"): (209, 16.3, 15.3, 0.0, None),
+    ("кролик",): (183, 21.0, 11.0, 0.0, None),
+    ("утк", "утин"): (308, 16.5, 27.0, 0.0, None),
+    ("бекон",): (500, 23.0, 45.0, 0.0, None),
+    ("ветчин",): (270, 14.0, 23.6, 0.0, None),
+    ("колбас",): (260, 13.0, 22.0, 1.5, None),
+    ("сосиск",): (266, 11.0, 24.0, 1.6, 50),
+    # Рыба и морепродукты
+    ("лосос", "семг"): (208, 20.4, 13.4, 0.0, None),
+    ("форел",): (141, 19.9, 6.2, 0.0, None),
+    ("горбуш",): (140, 20.5, 6.5, 0.0, None),
+    ("треск",): (78, 17.7, 0.7, 0.0, None),
+    ("минта",): (72, 15.9, 0.9, 0.0, None),
+    ("хек",): (86, 16.6, 2.2, 0.0, None),
+    ("судак",): (84, 18.4, 1.1, 0.0, None),
+    ("тунц", "тунец"): (101, 23.4, 0.9, 0.0, None),
+    ("скумбр",): (191, 18.0, 13.2, 0.0, None),
+    ("сельд",): (246, 17.7, 19.5, 0.0, None),
+    ("рыб",): (90, 18.0, 2.0, 0.0, None),
+    ("креветк",): (95, 20.0, 1.2, 0.5, None),
+    ("кальмар",): (100, 18.0, 2.2, 2.0, None),
+    ("миди",): (77, 11.5, 2.0, 3.3, None),
+    ("краб",): (73, 6.0, 1.0, 10.0, None),
+    # Яйца и молочные продукты
+    ("яйц", "яиц"): (157, 12.7, 10.9, 0.7, 55),
+    ("желтк",): (352, 16.2, 31.2, 1.0, 18),
+    ("молок",): (52, 2.8, 2.5, 4.7, None),
+    ("кокосов молок",): (230, 2.3, 24.0, 6.0, None),
+    ("кефир",): (51, 2.8, 2.5, 4.0, None),
+    ("йогурт",): (66, 5.0, 3.2, 3.5, None),
+    ("греческ йогурт",): (73, 10.0, 2.0, 3.6, None),
+    ("сметан",): (162, 2.6, 15.0, 3.6, None),
+    ("сливк",): (206, 2.5, 20.0, 3.4, None),
+    ("творог", "творож"): (121, 17.2, 5.0, 1.8, None),
+    ("сыр",): (350, 25.0, 27.0, 0.0, None),
+    ("сливочн сыр",): (342, 6.0, 34.0, 4.0, None),
+    ("пармезан",): (392, 35.8, 25.8, 3.2, None),
+    ("моцарелл",): (280, 22.0, 22.0, 0.0, None),
+    ("фет", "брынз"): (260, 17.0, 20.0, 1.0, None),
+    ("рикотт",): (174, 11.0, 13.0, 3.0, None),
+    # Масла и соусы
+    ("масл", "оливков масл", "подсолнечн масл", "кунжутн масл", "растительн масл"): (899, 0.0, 99.9, 0.0, None),
+    ("сливочн масл",): (748, 0.5, 82.5, 0.8, None),
+    ("маслин", "оливк"): (115, 0.8, 10.7, 6.3, 4),
+    ("майонез",): (629, 2.4, 67.0, 3.9, None),
+    ("соев соус",): (53, 6.0, 0.0, 6.6, None),
+    ("томатн паст",): (99, 4.8, 0.0, 19.0, None),
+    ("томатн соус",): (29, 2.5, 0.0, 4.0, None),
+    ("кетчуп",): (93, 1.8, 1.0, 22.2, None),
+    ("горчиц",): (162, 9.9, 12.7, 5.3, None),
+    ("уксус",): (20, 0.0, 0.0, 5.0, None),
+    # Крупы, мука, макароны, хлеб (сухой вес)
+    ("рис",): (344, 6.7, 0.7, 78.9, None),
+    ("гречк", "гречнев"): (313, 12.6, 3.3, 62.1, None),
+    ("булгур",): (342, 12.3, 1.3, 57.6, None),
+    ("кускус",): (376, 12.8, 0.6, 77.4, None),
+    ("кино",): (368, 14.1, 6.1, 57.2, None),
+    ("овсян", "геркулес"): (352, 12.3, 6.1, 59.5, None),
+    ("перлов",): (320, 9.3, 1.1, 66.9, None),
+    ("пшен",): (342, 11.5, 3.3, 66.5, None),
+    ("мук", "пшеничн мук"): (334, 10.3, 1.1, 70.0, None),
+    ("манк",): (333, 10.3, 1.0, 70.6, None),
+    ("крахмал",): (343, 0.1, 0.0, 83.5, None),
+    ("макарон", "спагетт", "паст", "лапш", "вермишел", "феттучин", "пенн"): (344, 11.0, 1.3, 70.5, None),
+    ("хлеб",): (250, 8.0, 3.0, 49.0, None),
+    ("батон", "багет"): (262, 7.5, 2.9, 51.4, None),
+    ("лаваш",): (236, 7.9, 1.0, 47.6, 80),
+    ("тортиль",): (306, 8.0, 8.0, 50.0, 40),
+    ("сухар", "панировочн"): (347, 9.7, 1.9, 71.0, None),
+    # Бобовые и соя
+    ("фасол",): (298, 21.0, 2.0, 47.0, None),
+    ("консервированн фасол",): (99, 6.7, 0.3, 17.4, None),
+    ("стручков фасол",): (24, 2.0, 0.2, 3.6, None),
+    ("нут",): (364, 19.0, 6.0, 61.0, None),
+    ("консервированн нут",): (120, 7.0, 2.6, 18.0, None),
+    ("чечевиц",): (295, 24.0, 1.5, 46.3, None),
+    ("горох",): (298, 20.5, 2.0, 49.5, None),
+    ("тоф",): (76, 8.0, 4.8, 1.9, None),
+    # Овощи, зелень, грибы
+    ("картоф", "картош"): (77, 2.0, 0.4, 16.3, 120),
+    ("морков",): (35, 1.3, 0.1, 6.9, 80),
+    ("лук",): (41, 1.4, 0.0, 10.4, 80),
+    ("зелен лук",): (19, 1.3, 0.0, 4.6, None),
+    ("чеснок",): (149, 6.5, 0.5, 29.9, 5),
+    ("помидор", "томат"): (20, 1.1, 0.2, 3.8, 120),
+    ("томат черр", "помидор черр", "черр"): (20, 1.1, 0.2, 3.8, 15),
+    ("огур",): (15, 0.8, 0.1, 2.8, 100),
+    ("перец", "перц"): (27, 1.3, 0.0, 5.3, 150),
+    ("черн перец", "молот перец"): (251, 10.4, 3.3, 64.0, None),
+    ("кабач", "цукин"): (24, 0.6, 0.3, 4.6, 250),
+    ("баклажан",): (24, 1.2, 0.1, 4.5, 250),
+    ("капуст",): (27, 1.8, 0.1, 4.7, None),
+    ("цветн капуст",): (30, 2.5, 0.3, 5.4, None),
+    ("броккол",): (34, 2.8, 0.4, 6.6, None),
+    ("шпинат",): (23, 2.9, 0.3, 2.0, None),
+    ("тыкв",): (22, 1.0, 0.1, 4.4, None),
+    ("свекл",): (42, 1.5, 0.1, 8.8, 150),
+    ("сельдер",): (13, 0.9, 0.1, 2.1, None),
+    ("гриб", "шампиньон"): (27, 4.3, 1.0, 0.1, 20),
+    ("кукуруз",): (58, 2.2, 0.4, 11.2, None),
+    ("горошек",): (55, 3.6, 0.2, 9.8, None),
+    ("авокад",): (160, 2.0, 14.7, 1.8, 150),
+    ("салат", "рукол", "айсберг"): (14, 1.2, 0.3, 1.3, None),
+    ("зелен", "петрушк", "укроп", "кинз", "базилик", "мят"): (40, 3.0, 0.5, 6.0, None),
+    ("имбир",): (80, 1.8, 0.8, 15.8, None),
+    # Фрукты, ягоды, сухофрукты
+    ("лимон",): (34, 0.9, 0.1, 3.0, 100),
+    ("сок лимон", "лимон сок"): (22, 0.4, 0.2, 6.9, None),
+    ("лайм",): (30, 0.7, 0.2, 10.0, 70),
+    ("банан",): (96, 1.5, 0.2, 21.8, 120),
+    ("яблок",): (47, 0.4, 0.4, 9.8, 150),
+    ("груш",): (47, 0.4, 0.3, 10.3, 150),
+    ("апельсин",): (43, 0.9, 0.2, 8.1, 150),
+    ("ягод", "клубник", "черник", "малин"): (43, 0.9, 0.4, 8.0, None),
+    ("изюм",): (264, 2.9, 0.6, 66.0, None),
+    ("кураг",): (232, 5.2, 0.3, 51.0, None),
+    # Орехи и семена
+    ("орех",): (654, 15.2, 65.2, 7.0, None),
+    ("миндал",): (609, 18.6, 57.7, 13.6, None),
+    ("кешь",): (600, 18.5, 48.5, 22.5, None),
+    ("арахис",): (551, 26.3, 45.2, 9.9, None),
+    ("арахисов паст",): (588, 25.0, 50.0, 20.0, None),
+    ("кунжут",): (565, 19.4, 48.7, 12.2, None),
+    ("чиа",): (486, 16.5, 30.7, 42.1, None),
+    # Сладкое
+    ("сахар",): (398, 0.0, 0.0, 99.7, None),
+    ("мед",): (329, 0.8, 0.0, 80.3, None),
+    ("шоколад",): (540, 5.4, 35.3, 56.5, None),
+    ("кака",): (289, 24.3, 15.0, 10.2, None),
+    # Специи и жидкости: по массе почти ничего не добавляют, но должны находиться
+    ("сол", "специ", "паприк", "кориц", "куркум", "зир", "прован", "орегано", "лавров"): (0, 0.0, 0.0, 0.0, 1),
+    ("вод", "лед"): (0, 0.0, 0.0, 0.0, None),
+    ("бульон",): (15, 2.0, 0.5, 0.5, None),
+}
+
+# Единица количества → граммов в единице; None — штуки (вес штуки из NUTRITION).
+# Ложки и стаканы пересчитаны по воде. Короткие единицы сравниваются целиком, длинные — по началу.
+# Сокращения ложек («ст.л.», «ст. ложка», «ч. ложки») _AMOUNT_RE сводит к «стл», «чл», «десл»
+UNITS = {
+    "г": 1.0, "гр": 1.0, "грамм": 1.0, "кг": 1000.0, "килограмм": 1000.0, "мг": 0.001,
+    "мл": 1.0, "миллилитр": 1.0, "л": 1000.0, "литр": 1000.0,
+    "стл": 15.0, "столов": 15.0, "чл": 5.0, "чайн": 5.0, "десл": 10.0, "десертн": 10.0,
+    "стакан": 200.0, "щепотк": 0.5, "пучок": 30.0, "пучк": 30.0, "зубчик": 5.0,
+    "ломтик": 30.0, "ломт": 30.0, "веточк": 1.0,
+    "шт": None, "штук": None,
+}
+
+# Абсолютное расхождение (ккал, г, г, г), меньше которого расчёт не поправляет модель
+_SLACK = np.array((50.0, 5.0, 5.0, 5.0), np.float32)
+
+_NUMBER = r"(\d+(?:\.\d+)?)(?:\s*/\s*(\d+))?(?:\s*(?:-|–|—|до)\s*(\d+(?:\.\d+)?))?"
+# «ст.л.», «ст л», «ст. ложка», «ч.ложки» → единица «стл», «чл», «десл»
+_AMOUNT_RE = re.compile(_NUMBER + r"\s*(?:(ст|ч|дес)\.?\s*л(?:ож[а-я]*)?\b\.?|([а-я]+))?")
+_FRACTIONS = {"½": "1/2", "⅓": "1/3", "¼": "1/4", "¾": "3/4", "⅔": "2/3"}
+
+_KEYS = [
+    (tuple(key.split()), entry)
+    for entry, keys in enumerate(NUTRITION)
+    for key in keys
+]
+# Пищевая ценность одного грамма: строка на запись NUTRITION
+_PER_GRAM = np.array([values[:4] for values in NUTRITION.values()], np.float32) / 100
+_PIECE_GRAMS = [values[4] for values in NUTRITION.values()]
+
+checked = 0
+corrected = 0
+uncovered = 0
+
+
+@lru_cache(maxsize=16384)
+def find_ingredient(name: str) -> Optional[int]:
+    """Номер записи NUTRITION для названия ингредиента или None"""
+    terms = search_terms(name).split()
+    best, best_rank = None, None
+    for stems, entry in _KEYS:
+        if all(any(stem_matches(term, stem) for term in terms) for stem in stems):
+            rank = (len(stems), sum(map(len, stems)))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = entry, rank
+    return best
+
+
+def _unit_grams(match: re.Match) -> Tuple[bool, Optional[float]]:
+    """(распознана ли единица, граммов в единице или None для штук)"""
+    spoon, word = match.group(4), match.group(5)
+    unit = f"{spoon}л" if spoon else word
+    if not unit:
+        return False, None
+    for key, grams in UNITS.items():
+        if unit == key or (len(key) >= 4 and unit.startswith(key)):
+            return True, grams
+    return False, None
+
+
+@lru_cache(maxsize=16384)
+def parse_amount(amount: str) -> Optional[Tuple[float, Optional[float]]]:
+    """Количество из строки вроде "200г", "1 шт", "2 ст.л.", "1/2 стакана".
+
+    Возвращает (количество, граммов в единице или None для штук) или None, если
+    числа нет («по вкусу»). Диапазон «2-3» даёт среднее; если в строке есть
+    масса или объём («1 банка (400 г)»), берётся он.
+    """
+    text = amount.lower().replace("ё", "е").replace(",", ".")
+    for fraction, value in _FRACTIONS.items():
+        text = text.replace(fraction, value)
+
+    found = None
+    for match in _AMOUNT_RE.finditer(text):
+        value, denominator, upper = match.group(1), match.group(2), match.group(3)
+        quantity = float(value) / float(denominator) if denominator else float(value)
+        if upper:
+            quantity = (quantity + float(upper)) / 2
+        known, grams = _unit_grams(match)
+        if known and grams is not None:
+            return quantity, grams
+        if found is None:
+            # Незнакомое слово после числа («2 крупных») — тоже штуки
+            found = quantity, None
+    return found
+
+
+def estimate(recipes: Sequence[Recipe], servings: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """КБЖУ на порцию по таблице NUTRITION и доля массы, которую удалось в ней найти.
+
+    Возвращает (матрица n × 4: ккал, белки, жиры, углеводы; покрытие n). Покрытие 0,
+    если массу какого-то ингредиента определить нельзя. Названия и количества
+    разбираются с кэшем, сама сумма считается одним проходом NumPy.
+    """
+    entries, grams, owners = [], [], []
+    found_mass = np.zeros(len(recipes), np.float32)
+    unknown_mass = np.zeros(len(recipes), np.float32)
+    broken = np.zeros(len(recipes), bool)
+    for i, recipe in enumerate(recipes):
+        for ingredient in recipe.ingredients:
+            amount = parse_amount(str(ingredient.get("amount", "")))
+            if amount is None:
+                continue
+            quantity, unit_grams = amount
+            entry = find_ingredient(str(ingredient.get("name", "")))
+            if unit_grams is None:
+                unit_grams = _PIECE_GRAMS[entry] if entry is not None else None
+                if unit_grams is None:
+                    broken[i] = True
+                    continue
+            mass = quantity * unit_grams
+            if entry is None:
+                unknown_mass[i] += mass
+                continue
+            found_mass[i] += mass
+            entries.append(entry)
+            grams.append(mass)
+            owners.append(i)
+
+    totals = np.zeros((len(recipes), 4), np.float32)
+    if entries:
+        np.add.at(totals, owners, _PER_GRAM[entries] * np.array(grams, np.float32)[:, None])
+    totals /= np.maximum(np.asarray(servings, np.float32), 1)[:, None]
+    total_mass = found_mass + unknown_mass
+    coverage = np.where(broken | (total_mass == 0), 0, found_mass / np.maximum(total_mass, 1))
+    return totals, coverage
+
+
+def check(recipe: Recipe, servings: Optional[float]) -> Recipe:
+    """Рецепт с КБЖУ из расчёта, если ответ модели слишком от него отличается.
+
+    Без числа порций или при покрытии меньше NUTRITION_MIN_COVERAGE КБЖУ модели
+    остаются как есть: проверить их нечем.
+    """
+    global checked, corrected, uncovered
+    if not servings or servings <= 0:
+        uncovered += 1
+        return recipe
+    totals, coverage = estimate([recipe], [servings])
+    if coverage[0] < NUTRITION_MIN_COVERAGE:
+        uncovered += 1
+        return recipe
+
+    checked += 1
+    computed = totals[0]
+    model = np.array((recipe.calories, recipe.protein, recipe.fats, recipe.carbs), np.float32)
+    if not np.any(np.abs(model - computed) > np.maximum(NUTRITION_TOLERANCE * computed, _SLACK)):
+        return recipe
+    corrected += 1
+    calories, protein, fats, carbs = (int(round(float(value))) for value in computed)
+    return replace(recipe, calories=calories, protein=protein, fats=fats, carbs=carbs)
+
+
+def stats() -> dict:
+    """Сколько ответов проверено по таблице и сколько из них исправлено"""
+    total = checked + uncovered
+    return {
+        "checked": checked,
+        "corrected": corrected,
+        "uncovered": uncovered,
+        "coverage_rate": checked / total if total else 0.0,
+        "correction_rate": corrected / checked if checked else 0.0,
+    }
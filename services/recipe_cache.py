@@ -0,0 +1,83 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from config import AI_CACHE_SIZE, AI_CACHE_TTL_DAYS
+from database import db
+from models.user import UserProfile, Recipe
+from services import goal_fit
+from services.text import normalize_request
+
+# Как часто (в записях) чистить кэш от лишнего
+EVICT_EVERY = 100
+
+hits = 0
+misses = 0
+_stores = 0
+
+
+def make_cache_key(
+    user_profile: UserProfile,
+    dish_request: str,
+    ingredients: Optional[List[str]] = None
+) -> str:
+    """Ключ кэша: нормализованный запрос и поля профиля, влияющие на рецепт.
+
+    Цель приводится к ключу goal_fit: "goal_weight_loss" из регистрации и
+    "weight" из редактирования профиля дают один ключ.
+    """
+    parts = [
+        normalize_request(dish_request),
+        goal_fit.goal_key(user_profile.goal),
+        ",".join(sorted(user_profile.dietary_restrictions)),
+        f"{int(user_profile.has_oven)}{int(user_profile.has_microwave)}{int(user_profile.has_stove)}",
+        normalize_request(" ".join(ingredients)) if ingredients else "",
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+async def lookup(
+    cache_key: str,
+    user_id: int,
+    exclude_recipes: Optional[List[str]] = None,
+    goal: Optional[str] = None
+) -> Optional[Recipe]:
+    """Найти в кэше рецепт, которого нет среди исключённых, лучше всего подходящий под цель"""
+    global hits, misses
+    excluded = {name.casefold() for name in exclude_recipes or []}
+    min_created_at = datetime.now() - timedelta(days=AI_CACHE_TTL_DAYS)
+
+    candidates = [
+        recipe for recipe in await db.get_cached_recipes(cache_key, min_created_at, user_id)
+        if recipe.name.casefold() not in excluded
+    ]
+    if candidates:
+        # При одинаковом соответствии цели остаётся порядок популярности
+        recipe = goal_fit.best_recipes(goal, candidates)[0]
+        await db.touch_cached_recipe(cache_key, recipe.name)
+        hits += 1
+        return recipe
+
+    misses += 1
+    return None
+
+
+async def store(cache_key: str, recipe: Recipe):
+    """Сохранить сгенерированный рецепт в кэш"""
+    global _stores
+    await db.put_cached_recipe(cache_key, recipe)
+    _stores += 1
+    if _stores % EVICT_EVERY == 0:
+        await db.evict_cached_recipes(
+            AI_CACHE_SIZE, datetime.now() - timedelta(days=AI_CACHE_TTL_DAYS)
+        )
+
+
+def stats() -> dict:
+    """Доля запросов, обслуженных из кэша"""
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+    }
@@ -0,0 +1,397 @@
+import json
+import math
+import re
+from typing import Annotated, Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, BeforeValidator, Field, ValidationError, model_validator
+
+
+class RecipeStreamParser:
+    """Инкрементальный разбор JSON-рецепта, приходящего по кускам.
+
+    Следит за вложенностью и строками и, как только значение поля верхнего
+    уровня дописано (встретилась запятая или закрывающая скобка объекта),
+    разбирает пару "ключ: значение" целиком. Блок <think>...</think> перед
+    JSON пропускается.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._segment_start = 0
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """Добавить кусок текста; вернуть поля, которые дописались в этом куске"""
+        self._buffer += chunk
+        completed: Dict[str, Any] = {}
+        if self._finished or not self._find_start():
+            return completed
+
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_segment(i, completed)
+                    self._finished = True
+                    self._pos = i + 1
+                    return completed
+            elif char == "," and self._depth == 1:
+                self._complete_segment(i, completed)
+                self._segment_start = i + 1
+
+        self._pos = len(buffer)
+        return completed
+
+    def _find_start(self) -> bool:
+        if self._started:
+            return True
+        buffer = self._buffer
+        if "<think>" in buffer:
+            end = buffer.find("</think>")
+            if end == -1:
+                return False
+            offset = end + len("</think>")
+        else:
+            offset = 0
+        brace = buffer.find("{", offset)
+        if brace == -1:
+            return False
+        self._started = True
+        self._depth = 1
+        self._pos = brace + 1
+        self._segment_start = brace + 1
+        return True
+
+    def _complete_segment(self, end: int, completed: Dict[str, Any]):
+        segment = self._buffer[self._segment_start:end].strip()
+        if not segment:
+            return
+        try:
+            field = json.loads("{" + segment + "}")
+        except json.JSONDecodeError:
+            return
+        self.fields.update(field)
+        completed.update(field)
+
+
+class RecipeParseError(ValueError):
+    """Ответ модели не удалось превратить в рецепт.
+
+    data — объект JSON, если синтаксис удалось разобрать (тогда fields —
+    поля верхнего уровня, не прошедшие проверку схемы); None — JSON не найден,
+    не восстанавливается или оборван (truncated): такой ответ не проверяется
+    схемой, даже если repair_json его закрыл.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        data: Optional[Dict[str, Any]] = None,
+        fields: Sequence[str] = (),
+        truncated: bool = False
+    ):
+        super().__init__(message)
+        self.data = data
+        self.fields = list(fields)
+        self.truncated = truncated
+
+
+# Сколько раз синтаксис JSON пришлось чинить repair_json (и это удалось)
+local_repairs = 0
+
+_NUMBER_RE = re.compile(r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?")
+_WORD_RE = re.compile(r"\w+")
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+# Открывающая кавычка → кавычки, которые её закрывают
+_QUOTES = {'"': '"', "'": "'", "“": "”“", "”": "”“"}
+# Висящий ключ без значения в конце оборванного объекта
+_DANGLING_KEY_RE = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+
+def extract_json(text: str) -> Optional[str]:
+    """Первый объект JSON в ответе: после блока <think>, от «{» до парной «}».
+
+    Пояснения и markdown вокруг отбрасываются; оборванный ответ возвращается
+    до конца текста. None — в тексте нет «{».
+    """
+    if "</think>" in text:
+        text = text.rsplit("</think>", 1)[-1]
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = escape = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _closes_string(text: str, i: int) -> bool:
+    # Кавычка внутри строки закрывает её, только если дальше идёт разделитель
+    # или перевод строки: иначе это кавычка в тексте («соус "Песто" с базиликом»)
+    for char in text[i + 1:]:
+        if char == "\n" or char in ",:}]":
+            return True
+        if not char.isspace():
+            return False
+    return True
+
+
+def repair_json(text: str) -> str:
+    """Исправить типичные ошибки JSON от языковой модели.
+
+    Одинарные и «умные» кавычки, ключи без кавычек, True/None из Python,
+    комментарии, лишние и пропущенные запятые, неэкранированные кавычки
+    и переводы строк внутри строк, оборванный конец (незакрытые строки
+    и скобки, ключ без значения).
+    """
+    return _repair_json(text)[0]
+
+
+def _repair_json(text: str) -> Tuple[str, bool]:
+    # repair_json и признак оборванного конца: пришлось закрывать строки или скобки
+    out: List[str] = []
+    closers: List[str] = []
+    after_value = False  # Последним записано значение: перед следующим нужна запятая
+    i, n = 0, len(text)
+
+    def value_start():
+        if after_value:
+            out.append(",")
+
+    while i < n:
+        char = text[i]
+        if char in _QUOTES:
+            value_start()
+            ends = _QUOTES[char]
+            chars = ['"']
+            i += 1
+            while i < n:
+                c = text[i]
+                if c in ends and (c != '"' or _closes_string(text, i)):
+                    break
+                if c == "\\" and i + 1 < n:
+                    # \' в JSON недопустимо
+                    chars.append("'" if text[i + 1] == "'" else text[i:i + 2])
+                    i += 2
+                    continue
+                chars.append({'"': '\\"', "\n": "\\n", "\r": "", "\t": "\\t"}.get(c, c))
+                i += 1
+            chars.append('"')
+            out.append("".join(chars))
+            after_value = True
+            i += 1
+        elif char in "{[":
+            value_start()
+            closers.append("}" if char == "{" else "]")
+            out.append(char)
+            after_value = False
+            i += 1
+        elif char in "}]":
+            if closers:
+                _drop_trailing_comma(out)
+                out.append(closers.pop())
+                after_value = True
+            i += 1
+        elif char == ",":
+            if after_value:
+                out.append(",")
+            after_value = False
+            i += 1
+        elif char == ":":
+            out.append(":")
+            after_value = False
+            i += 1
+        elif char == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif char == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif (char.isdigit() or char in "-+.") and (number := _NUMBER_RE.match(text, i)):
+            value_start()
+            value = number.group().lstrip("+")
+            if value.startswith("."):
+                value = "0" + value
+            elif value.startswith("-."):
+                value = "-0" + value[1:]
+            out.append(value)
+            after_value = True
+            i = number.end()
+        elif char.isalpha() or char == "_":
+            word = _WORD_RE.match(text, i).group()
+            value_start()
+            out.append(_LITERALS.get(word) or json.dumps(word, ensure_ascii=False))
+            after_value = True
+            i += len(word)
+        else:
+            if char.isspace():
+                out.append(char)
+            i += 1
+
+    if closers:
+        repaired = "".join(out).rstrip()
+        if closers[-1] == "}":
+            repaired = _DANGLING_KEY_RE.sub(r"\1", repaired)
+        repaired = repaired.rstrip().rstrip(",")
+        if repaired.endswith(":"):
+            repaired += "null"
+        return repaired + "".join(reversed(closers)), True
+    return "".join(out), False
+
+
+def _drop_trailing_comma(out: List[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def load_json_object(text: str) -> Dict[str, Any]:
+    """Объект JSON из ответа модели; при ошибке синтаксиса — после repair_json.
+
+    Оборванный ответ (repair_json пришлось закрывать скобки) не принимается:
+    последнее значение в нём может быть недописано («30» вместо «300г»).
+    """
+    global local_repairs
+    candidate = extract_json(text)
+    if candidate is None:
+        raise RecipeParseError("в ответе нет объекта JSON")
+    try:
+        data = json.loads(candidate)
+    except json.JSONDecodeError:
+        repaired, truncated = _repair_json(candidate)
+        if truncated:
+            raise RecipeParseError("ответ оборван: JSON не дописан до конца", truncated=True)
+        try:
+            data = json.loads(repaired)
+        except json.JSONDecodeError as e:
+            raise RecipeParseError(f"JSON не восстанавливается: {e}") from None
+        local_repairs += 1
+    if not isinstance(data, dict):
+        raise RecipeParseError("ответ — не объект JSON")
+    return data
+
+
+def _round_number(value: Any) -> Any:
+    # «450 ккал», "450" и 450.6 → 450; остальное отклонит схема
+    if isinstance(value, str):
+        match = _NUMBER_RE.search(value.replace(",", "."))
+        if not match:
+            return value
+        value = float(match.group())
+    if isinstance(value, float) and math.isfinite(value):
+        return round(value)
+    return value
+
+
+def _to_text(value: Any) -> Any:
+    return str(value) if isinstance(value, (int, float)) else value
+
+
+def _ingredient_dict(value: Any) -> Any:
+    # Компактный формат ответа: ["Ингредиент", "200г"]
+    if isinstance(value, (list, tuple)) and value:
+        return {"name": value[0], **({"amount": value[1]} if len(value) > 1 else {})}
+    return value
+
+
+def _step_dict(value: Any) -> Any:
+    # Компактный формат ответа: ["Что сделать", 5]
+    if isinstance(value, (list, tuple)) and value:
+        return {"description": value[0], **({"duration": value[1]} if len(value) > 1 else {})}
+    return value
+
+
+def normalize_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Поля рецепта с ingredients и steps из словарей, в каком бы формате их ни прислала модель"""
+    result = dict(fields)
+    for key, convert in (("ingredients", _ingredient_dict), ("steps", _step_dict)):
+        if isinstance(result.get(key), list):
+            result[key] = [convert(item) for item in result[key]]
+    return result
+
+
+Quantity = Annotated[int, BeforeValidator(_round_number), Field(ge=0)]
+Text = Annotated[str, BeforeValidator(_to_text), Field(min_length=1)]
+
+
+class IngredientSchema(BaseModel):
+    name: Text
+    amount: Annotated[str, BeforeValidator(_to_text)] = ""
+
+
+class StepSchema(BaseModel):
+    step: int = 0
+    description: Text
+    duration: Annotated[int, BeforeValidator(_round_number), Field(ge=1)] = 1
+
+
+class RecipeSchema(BaseModel):
+    """Схема ответа модели; лишние поля игнорируются"""
+    name: Text
+    description: Annotated[str, BeforeValidator(_to_text)] = ""
+    calories: Quantity
+    protein: Quantity
+    fats: Quantity
+    carbs: Quantity
+    cooking_time: Quantity
+    servings: Annotated[Optional[int], BeforeValidator(_round_number), Field(ge=0)] = None
+    ingredients: Annotated[
+        List[Annotated[IngredientSchema, BeforeValidator(_ingredient_dict)]], Field(min_length=1)
+    ]
+    steps: Annotated[List[Annotated[StepSchema, BeforeValidator(_step_dict)]], Field(min_length=1)]
+
+    @model_validator(mode="after")
+    def _number_steps(self) -> "RecipeSchema":
+        for number, step in enumerate(self.steps, 1):
+            step.step = number
+        return self
+
+
+def validate_recipe(data: Dict[str, Any]) -> RecipeSchema:
+    """Проверить объект по RecipeSchema; RecipeParseError перечисляет неверные поля"""
+    try:
+        return RecipeSchema.model_validate(data)
+    except ValidationError as e:
+        fields = sorted({str(error["loc"][0]) for error in e.errors() if error["loc"]})
+        details = "; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()[:5]
+        )
+        raise RecipeParseError(details, data, fields) from None
@@ -0,0 +1,403 @@
+import asyncio
+import copy
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set
+
+import numpy as np
+
+from config import (
+    RETRIEVAL_REFRESH_INTERVAL,
+    RETRIEVAL_BATCH_SIZE,
+    RETRIEVAL_CANDIDATES,
+    RETRIEVAL_FIT_WEIGHT,
+)
+from database import db
+from models.user import Recipe, UserProfile
+from services import goal_fit
+from services.ai_dispatcher import Histogram
+from services.text import normalize_request, search_terms, stem_matches
+
+# Основы запрещённых ингредиентов (сравниваются через text.stem_matches)
+_MEAT = (
+    "мяс", "мясн", "фарш", "говяд", "телят", "свин", "баран", "ягнят", "куриц", "курин", "цыпл",
+    "индейк", "утк", "утин", "гус", "кролик", "бекон", "ветчин", "колбас", "сосиск",
+    "сардельк", "сал", "грудк", "бедр", "фил", "окорок", "хамон", "прошутт", "салям",
+    "пепперон", "фрикадельк", "котлет", "стейк", "печен", "бульон",
+)
+_FISH = (
+    "рыб", "рыбн", "лосос", "семг", "форел", "треск", "тунц", "тунец", "скумбр", "сельд", "минта",
+    "хек", "судак", "карп", "горбуш", "кальмар", "креветк", "миди", "краб", "икр", "анчоус",
+    "шпрот", "морепродукт",
+)
+_EGGS = ("яйц", "яиц", "желтк", "майонез")
+_DAIRY = (
+    "молок", "молоч", "сливк", "сливочн", "сыр", "сырн", "творог", "творож", "сметан",
+    "кефир", "йогурт", "ряженк", "брынз", "моцарелл", "пармезан", "рикотт", "маскарпон",
+    "сгущенк",
+)
+_GLUTEN = (
+    "пшени", "мук", "макарон", "спагетт", "паст", "лапш", "хлеб", "батон", "булк",
+    "булгур", "кускус", "манк", "ячмен", "перлов", "ржан", "овсян", "геркулес",
+    "панировочн", "сухар", "лаваш", "тест", "вермишел", "пельмен", "пицц",
+)
+_PORK = (
+    "свин", "бекон", "сал", "ветчин", "хамон", "прошутт", "колбас", "сосиск",
+    "сардельк", "пепперон", "салям",
+)
+_ALCOHOL = ("вин", "винн", "пив", "коньяк", "водк", "ром", "ликер", "херес", "бренд", "виск")
+
+# Ограничение профиля → основы ингредиентов, которые его нарушают.
+# Порядок задаёт биты маски, ключи — значения из get_restrictions_keyboard
+RESTRICTED_STEMS: Dict[str, tuple] = {
+    "vegan": _MEAT + _FISH + _EGGS + _DAIRY + ("мед", "медов"),
+    "vegetarian": _MEAT + _FISH,
+    "muslim": _PORK + _ALCOHOL,
+    "fasting": _MEAT + _FISH + _EGGS + _DAIRY,
+    "gluten_free": _GLUTEN,
+    "lactose_free": _DAIRY,
+}
+
+# Оборудование → основы слов в шагах, по которым видно, что оно нужно
+EQUIPMENT_STEMS: Dict[str, tuple] = {
+    "has_oven": ("духовк", "запек", "запеч", "выпек", "запекан"),
+    "has_microwave": ("микроволн", "свч"),
+    "has_stove": (
+        "плит", "сковород", "кастрюл", "сотейник", "вари", "свар", "отвар", "довед", "кипя",
+        "жари", "жарк", "обжар", "поджар", "туши", "тушен", "потуш", "бланшир", "пассер",
+        "карамелиз",
+    ),
+}
+
+_TABLES = {"restricted": RESTRICTED_STEMS, "equipment": EQUIPMENT_STEMS}
+
+# Вес слова в зависимости от поля: совпадение в названии важнее всего
+NAME_WEIGHT = 3.0
+INGREDIENTS_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Параметры BM25
+K1 = 1.2
+B = 0.75
+
+# Границы корзин гистограммы задержки подбора, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+
+
+def _matches(term: str, stems: Sequence[str]) -> bool:
+    return any(stem_matches(term, stem) for stem in stems)
+
+
+@lru_cache(maxsize=65536)
+def _term_mask(term: str, table: str) -> int:
+    # Словарь основ мал по сравнению с числом рецептов, поэтому маска слова кэшируется
+    mask = 0
+    for bit, stems in enumerate(_TABLES[table].values()):
+        if _matches(term, stems):
+            mask |= 1 << bit
+    return mask
+
+
+def _mask(terms: Sequence[str], table: str) -> int:
+    """Биты таблицы _TABLES[table] (по порядку ключей), основы которых встречаются среди terms"""
+    mask = 0
+    for term in terms:
+        mask |= _term_mask(term, table)
+    return mask
+
+
+@dataclass(slots=True)
+class IndexedBody:
+    """Тело рецепта, подготовленное для индекса"""
+    body_hash: bytes
+    name: str
+    macros: tuple  # Значения goal_fit.FEATURES
+    restricted: int  # Биты RESTRICTED_STEMS, которые рецепт нарушает
+    equipment: int  # Биты EQUIPMENT_STEMS, которые рецепт требует
+    terms: Dict[str, float]  # Основа → взвешенная частота по полям
+    name_terms: FrozenSet[str]
+
+
+def index_body(row) -> IndexedBody:
+    """IndexedBody из строки db.get_recipe_bodies_for_index"""
+    (_, body_hash, name, calories, protein, fats, carbs, cooking_time,
+     search_name, search_description, search_ingredients, steps) = row
+    name_terms = (search_name or "").split()
+    ingredient_terms = (search_ingredients or "").split()
+    terms: Dict[str, float] = {}
+    for words, weight in (
+        (name_terms, NAME_WEIGHT),
+        (ingredient_terms, INGREDIENTS_WEIGHT),
+        ((search_description or "").split(), DESCRIPTION_WEIGHT),
+    ):
+        for term in words:
+            terms[term] = terms.get(term, 0.0) + weight
+    return IndexedBody(
+        body_hash=body_hash,
+        name=name,
+        macros=(calories or 0, protein or 0, fats or 0, carbs or 0, cooking_time or 0),
+        restricted=_mask(ingredient_terms, "restricted"),
+        equipment=_mask(search_terms(steps or "").split(), "equipment"),
+        terms=terms,
+        name_terms=frozenset(name_terms),
+    )
+
+
+def _index_bodies(rows) -> List[IndexedBody]:
+    return [index_body(row) for row in rows]
+
+
+class RecipeIndex:
+    """BM25 по названиям, описаниям и ингредиентам тел рецептов.
+
+    Индекс хранится в массивах NumPy: списки документов каждой основы
+    (term_ptr → docs, tf, weights, in_name) и признаки документов (КБЖУ,
+    маски ограничений и оборудования). Из тела рецепта остаются только хэш
+    и название. Построенный индекс не меняется: extended() возвращает новый,
+    разбирая только добавленные тела.
+    """
+
+    def __init__(self, bodies: Sequence[IndexedBody] = ()):
+        self.vocab: Dict[str, int] = {}
+        self.body_hashes: List[bytes] = []
+        self.names: List[str] = []  # casefold, для exclude
+        self.term_ptr = np.zeros(1, np.int64)
+        self.docs = np.zeros(0, np.int32)
+        self.tf = np.zeros(0, np.float32)
+        self.in_name = np.zeros(0, bool)
+        self.weights = np.zeros(0, np.float32)
+        self.doc_length = np.zeros(0, np.float32)
+        self.macros = np.zeros((5, 0), np.float32)
+        self.restricted = np.zeros(0, np.uint8)
+        self.equipment = np.zeros(0, np.uint8)
+        if bodies:
+            self._add(bodies)
+
+    def extended(self, bodies: Sequence[IndexedBody]) -> "RecipeIndex":
+        """Новый индекс: документы этого и bodies"""
+        index = copy.copy(self)
+        index.vocab = dict(self.vocab)
+        index.body_hashes = list(self.body_hashes)
+        index.names = list(self.names)
+        index._add(bodies)
+        return index
+
+    def _add(self, bodies: Sequence[IndexedBody]):
+        # Массивы не меняются на месте, а заменяются: их могут читать копии индекса
+        first = len(self.body_hashes)
+        terms, docs, tf, in_name = [], [], [], []
+        for doc, body in enumerate(bodies, first):
+            for term, freq in body.terms.items():
+                terms.append(self.vocab.setdefault(term, len(self.vocab)))
+                docs.append(doc)
+                tf.append(freq)
+                in_name.append(term in body.name_terms)
+            self.body_hashes.append(body.body_hash)
+            self.names.append(body.name.casefold())
+
+        # Старые списки уже упорядочены по (основа, документ), а новые документы
+        # идут после старых, поэтому хватает устойчивой сортировки по основе
+        old_terms = np.repeat(np.arange(len(self.term_ptr) - 1), np.diff(self.term_ptr))
+        all_terms = np.concatenate([old_terms, np.array(terms, np.int64)])
+        order = np.argsort(all_terms, kind="stable")
+        self.docs = np.concatenate([self.docs, np.array(docs, np.int32)])[order]
+        self.tf = np.concatenate([self.tf, np.array(tf, np.float32)])[order]
+        self.in_name = np.concatenate([self.in_name, np.array(in_name, bool)])[order]
+        lengths = np.bincount(all_terms, minlength=len(self.vocab))
+        self.term_ptr = np.zeros(len(self.vocab) + 1, np.int64)
+        np.cumsum(lengths, out=self.term_ptr[1:])
+
+        self.doc_length = np.concatenate([
+            self.doc_length,
+            np.fromiter((sum(body.terms.values()) for body in bodies), np.float32, len(bodies))
+        ])
+        self.macros = np.concatenate([
+            self.macros, np.array([body.macros for body in bodies], np.float32).reshape(-1, 5).T
+        ], axis=1)
+        self.restricted = np.concatenate([
+            self.restricted, np.fromiter((body.restricted for body in bodies), np.uint8, len(bodies))
+        ])
+        self.equipment = np.concatenate([
+            self.equipment, np.fromiter((body.equipment for body in bodies), np.uint8, len(bodies))
+        ])
+
+        # idf и средняя длина зависят от всех документов: веса пересчитываются целиком
+        average = float(self.doc_length.mean()) if len(self.doc_length) else 1.0
+        idf = np.log1p((len(self.doc_length) - lengths + 0.5) / (lengths + 0.5)).astype(np.float32)
+        norm = K1 * (1 - B + B * self.doc_length[self.docs] / average)
+        self.weights = np.repeat(idf, lengths) * self.tf * (K1 + 1) / (self.tf + norm)
+
+    def __len__(self) -> int:
+        return len(self.body_hashes)
+
+    def _postings(self, term_id: int) -> slice:
+        return slice(self.term_ptr[term_id], self.term_ptr[term_id + 1])
+
+    def best(
+        self,
+        terms: Sequence[str],
+        goal: str,
+        restricted: int = 0,
+        equipment: int = 0,
+        exclude: Optional[Set[str]] = None,
+        limit: int = RETRIEVAL_CANDIDATES
+    ) -> List[bytes]:
+        """Хэши тел, уверенно подходящих под запрос, лучшие сначала.
+
+        Уверенное совпадение: все основы запроса есть в рецепте, хотя бы одна —
+        в названии, рецепт не нарушает ограничений restricted и обходится
+        оборудованием equipment. Порядок — релевантность BM25 вместе
+        с соответствием КБЖУ цели goal.
+        """
+        term_ids = [self.vocab.get(term) for term in terms]
+        if not term_ids or None in term_ids:
+            return []
+
+        # Пересечение списков документов, начиная с самого короткого
+        term_ids.sort(key=lambda term_id: self.term_ptr[term_id + 1] - self.term_ptr[term_id])
+        candidates = self.docs[self._postings(term_ids[0])]
+        for term_id in term_ids[1:]:
+            candidates = np.intersect1d(candidates, self.docs[self._postings(term_id)], assume_unique=True)
+        missing = 0xFF & ~equipment
+        allowed = (self.restricted[candidates] & restricted) == 0
+        allowed &= (self.equipment[candidates] & missing) == 0
+        candidates = candidates[allowed]
+        if not candidates.size:
+            return []
+
+        scores = np.zeros(candidates.size, np.float32)
+        in_name = np.zeros(candidates.size, bool)
+        for term_id in term_ids:
+            postings = self._postings(term_id)
+            positions = np.searchsorted(self.docs[postings], candidates)
+            scores += self.weights[postings][positions]
+            in_name |= self.in_name[postings][positions]
+        candidates, scores = candidates[in_name], scores[in_name]
+        if not candidates.size:
+            return []
+
+        rank = (1 - RETRIEVAL_FIT_WEIGHT) * scores / scores.max()
+        rank += RETRIEVAL_FIT_WEIGHT * goal_fit.score(goal, self.macros[:, candidates])
+        found = []
+        for doc in candidates[np.argsort(-rank, kind="stable")]:
+            if exclude and self.names[doc] in exclude:
+                continue
+            found.append(self.body_hashes[doc])
+            if len(found) >= limit:
+                break
+        return found
+
+
+def profile_masks(user_profile: UserProfile) -> Optional[tuple]:
+    """(restricted, equipment) для RecipeIndex.best; None — ограничение нельзя проверить"""
+    bits = {item: 1 << bit for bit, item in enumerate(RESTRICTED_STEMS)}
+    restricted = 0
+    for item in user_profile.dietary_restrictions:
+        if item not in bits:
+            return None
+        restricted |= bits[item]
+    equipment = 0
+    for bit, flag in enumerate(EQUIPMENT_STEMS):
+        if getattr(user_profile, flag):
+            equipment |= 1 << bit
+    return restricted, equipment
+
+
+class Retriever:
+    """Подбор уже сгенерированного рецепта до запроса к AI.
+
+    Индекс строится в фоне из recipe_bodies и раз в RETRIEVAL_REFRESH_INTERVAL
+    пополняется новыми телами; разбираются только они. Удалённые тела остаются в индексе до перезапуска,
+    но не выдаются: их не найдёт db.get_recipe_body.
+    """
+
+    def __init__(self):
+        self.index = RecipeIndex()
+        self._last_rowid = 0
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"[RETRIEVAL ERROR] Не удалось обновить индекс: {e!r}")
+            await asyncio.sleep(RETRIEVAL_REFRESH_INTERVAL)
+
+    async def refresh(self) -> int:
+        """Добавить в индекс новые тела рецептов; вернуть их количество"""
+        bodies: List[IndexedBody] = []
+        last_rowid = self._last_rowid
+        while True:
+            rows = await db.get_recipe_bodies_for_index(last_rowid, RETRIEVAL_BATCH_SIZE)
+            if not rows:
+                break
+            # Разбор тел (основы, маски) — в отдельном потоке, чтобы не держать цикл событий
+            bodies.extend(await asyncio.to_thread(_index_bodies, rows))
+            last_rowid = rows[-1][0]
+        if bodies:
+            self.index = await asyncio.to_thread(self.index.extended, bodies)
+            self._last_rowid = last_rowid
+        return len(bodies)
+
+    async def find(
+        self,
+        user_profile: UserProfile,
+        dish_request: str,
+        ingredients: Optional[List[str]] = None,
+        exclude_recipes: Optional[List[str]] = None
+    ) -> Optional[Recipe]:
+        """Уверенно подходящий рецепт из уже сгенерированных или None"""
+        started = time.perf_counter()
+        recipe = None
+        masks = profile_masks(user_profile)
+        terms = normalize_request(" ".join([dish_request] + list(ingredients or []))).split()
+        if masks is not None and terms:
+            found = self.index.best(
+                terms,
+                user_profile.goal,
+                *masks,
+                exclude={name.casefold() for name in exclude_recipes or []}
+            )
+            for body_hash in found:
+                recipe = await db.get_recipe_body(body_hash, user_profile.user_id)
+                if recipe is not None:
+                    break
+
+        self.latency.observe(time.perf_counter() - started)
+        if recipe is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return recipe
+
+    def stats(self) -> dict:
+        """Размер индекса, доля запросов, обслуженных без AI, и задержка подбора"""
+        total = self.hits + self.misses
+        return {
+            "indexed": len(self.index),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "latency": self.latency.snapshot(),
+        }
+
+
+retriever = Retriever()
@@ -0,0 +1,45 @@
+import re
+
+_TOKEN_RE = re.compile(r"[a-zа-я0-9]+")
+
+STOP_WORDS = frozenset("""
+    а без бы в во вот для до же за и из или как к ко ли мне мой на над не ни
+    но о об от по под при про с со то у уж хочу хочется хотел хотела
+    приготовить приготовь сделать сделай рецепт рецепта рецепты блюдо
+    что нибудь какой какое какую какие чтобы было был была
+    мне меня пожалуйста можно давай дай очень
+""".split())
+
+# Окончания для грубого стемминга, от длинных к коротким
+_ENDINGS = sorted("""
+    иями ями ами ого его ому ему ыми ими ией ием иям иях
+    ая яя ое ее ые ие ой ей ий ый ом ем ам ям ах ях ов ев ию ья ье ью ия
+    а я о е ы и у ю ь й
+""".split(), key=len, reverse=True)
+
+def stem(word: str) -> str:
+    """Отрезать падежное окончание, оставив основу не короче 3 букв"""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def normalize_request(text: str) -> str:
+    """Нормализация запроса: регистр, стоп-слова, основы слов, порядок"""
+    tokens = _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    stems = {stem(token) for token in tokens if token not in STOP_WORDS}
+    return " ".join(sorted(stems))
+
+
+def search_terms(text: str) -> str:
+    """Основы слов текста по порядку, без стоп-слов: то, что кладётся в индекс поиска"""
+    tokens = _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return " ".join(stem(token) for token in tokens if token not in STOP_WORDS)
+
+
+def stem_matches(term: str, stem: str) -> bool:
+    """Совпадает ли основа слова term с основой из таблицы: основа из 4+ букв —
+    с любым словом, которое с неё начинается, короткая — только целиком
+    («сал» — сало, но не салат)"""
+    return term == stem or (len(stem) >= 4 and term.startswith(stem))
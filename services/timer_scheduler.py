@@ -0,0 +1,132 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from config import TIMER_MAX_CONCURRENT_FIRES
+
+TimerCallback = Callable[[int, int], Awaitable[None]]
+
+# Позиции полей в записи кучи
+_DEADLINE, _SEQ, _USER_ID, _SESSION_ID, _ACTIVE = range(5)
+
+
+class TimerScheduler:
+    """Единый планировщик таймеров готовки.
+
+    Таймеры хранятся в min-куче по времени окончания шага, одна фоновая
+    задача спит до ближайшего дедлайна. У пользователя не больше одного
+    активного таймера: новая постановка заменяет старую. Отмена помечает
+    запись неактивной (ленивое удаление), куча периодически сжимается.
+    Одновременно обрабатывается не больше max_concurrent сработавших таймеров:
+    после простоя их может накопиться много, остальные ждут в куче.
+    """
+
+    def __init__(self, max_concurrent: int = TIMER_MAX_CONCURRENT_FIRES):
+        self._heap: List[list] = []
+        self._entries: Dict[int, list] = {}
+        self._seq = itertools.count()
+        self._cancelled = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._callback: Optional[TimerCallback] = None
+        self._running: Set[asyncio.Task] = set()
+        self._limit = asyncio.Semaphore(max_concurrent)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def start(self, callback: TimerCallback):
+        """Запуск фоновой задачи; callback(user_id, session_id) вызывается по истечении таймера"""
+        self._callback = callback
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка планировщика"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, user_id: int, session_id: int, deadline: datetime):
+        """Поставить (или переставить) таймер пользователя, O(log n)"""
+        self.cancel(user_id)
+        entry = [deadline.timestamp(), next(self._seq), user_id, session_id, True]
+        heapq.heappush(self._heap, entry)
+        self._entries[user_id] = entry
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, user_id: int):
+        """Снять таймер пользователя, если он есть"""
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        entry[_ACTIVE] = False
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) // 2:
+            self._compact()
+
+    def get_deadline(self, user_id: int) -> Optional[datetime]:
+        """Время срабатывания таймера пользователя"""
+        entry = self._entries.get(user_id)
+        return datetime.fromtimestamp(entry[_DEADLINE]) if entry else None
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if entry[_ACTIVE]]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
+
+    def _pop_inactive(self):
+        while self._heap and not self._heap[0][_ACTIVE]:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self._pop_inactive()
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][_DEADLINE] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Пока все слоты заняты, таймер остаётся в куче: его можно снять или переставить
+            await self._limit.acquire()
+            self._pop_inactive()
+            if not self._heap or self._heap[0][_DEADLINE] > time.time():
+                self._limit.release()
+                continue
+
+            entry = heapq.heappop(self._heap)
+            entry[_ACTIVE] = False
+            del self._entries[entry[_USER_ID]]
+
+            task = asyncio.create_task(self._fire(entry[_USER_ID], entry[_SESSION_ID]))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, user_id: int, session_id: int):
+        try:
+            await self._callback(user_id, session_id)
+        except Exception as e:
+            print(f"[TIMER ERROR] user {user_id}: {e!r}")
+        finally:
+            self._limit.release()
+
+
+timer_scheduler = TimerScheduler()
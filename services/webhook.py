@@ -0,0 +1,193 @@
+import asyncio
+import hmac
+from abc import ABC, abstractmethod
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from pydantic import ValidationError
+
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_DRAIN_TIMEOUT,
+)
+from services.ai_dispatcher import Histogram, WAIT_BUCKETS
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Границы корзин гистограммы обработки апдейта, секунды
+HANDLE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+
+class WebhookReceiver(ABC):
+    """Приём запросов Telegram на webhook: секретный токен, разбор, ответ.
+
+    Куда девать апдейт, решает accept(raw): False — принять некуда, и
+    Telegram получает 503, чтобы повторить доставку позже.
+    """
+
+    def __init__(self, secret: Optional[str] = WEBHOOK_SECRET):
+        self.secret = secret
+        self.accepted = 0
+        self.rejected = 0
+        self.unauthorized = 0
+
+    def make_app(self, path: str = WEBHOOK_PATH) -> web.Application:
+        """aiohttp-приложение с обработчиком webhook"""
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret
+        ):
+            self.unauthorized += 1
+            return web.Response(status=401)
+
+        try:
+            accepted = self.accept(await request.read())
+        except (ValueError, ValidationError):
+            return web.Response(status=400)
+
+        if not accepted:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.accepted += 1
+        return web.Response()
+
+    @abstractmethod
+    def accept(self, raw: bytes) -> bool:
+        """Принять тело запроса; ValueError — некорректный апдейт"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "unauthorized": self.unauthorized,
+        }
+
+
+class WebhookServer(WebhookReceiver):
+    """Приём апдейтов Telegram через webhook.
+
+    Запрос проверяется по секретному токену, апдейт кладётся в ограниченную
+    очередь, и Telegram сразу получает 200. Обработкой занимаются workers
+    воркеров. Если очередь полна, отвечаем 503 — Telegram повторит доставку
+    позже, и апдейт не теряется.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        secret: Optional[str] = WEBHOOK_SECRET,
+        workers: int = WEBHOOK_WORKERS,
+        queue_size: int = WEBHOOK_QUEUE_SIZE
+    ):
+        super().__init__(secret)
+        self.dp = dp
+        self.bot = bot
+        self.workers_count = workers
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._workers: List[asyncio.Task] = []
+        self.wait_time = Histogram(WAIT_BUCKETS)
+        self.handle_time = Histogram(HANDLE_BUCKETS)
+
+    def accept(self, raw: bytes) -> bool:
+        update = Update.model_validate_json(raw, context={"bot": self.bot})
+        try:
+            self._queue.put_nowait((time.monotonic(), update))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def start(self):
+        """Запуск воркеров"""
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers_count)
+            ]
+
+    async def stop(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Дообработать принятые апдейты (не дольше timeout) и остановить воркеров"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[WEBHOOK] Не обработано апдейтов: {self._queue.qsize()}")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self):
+        while True:
+            queued_at, update = await self._queue.get()
+            started_at = time.monotonic()
+            self.wait_time.observe(started_at - queued_at)
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                print(f"[WEBHOOK ERROR] update {update.update_id}: {e!r}")
+            finally:
+                self.handle_time.observe(time.monotonic() - started_at)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди, отказы и гистограммы ожидания и обработки"""
+        return {
+            "queue_depth": self._queue.qsize(),
+            **super().stats(),
+            "wait_time": self.wait_time.snapshot(),
+            "handle_time": self.handle_time.snapshot(),
+        }
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    url: str = WEBHOOK_URL,
+    host: str = WEBHOOK_HOST,
+    port: int = WEBHOOK_PORT
+):
+    """Зарегистрировать webhook в Telegram и обслуживать его до SIGINT/SIGTERM"""
+    server = WebhookServer(dp, bot)
+    runner = web.AppRunner(server.make_app())
+    await runner.setup()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    server.start()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        await bot.set_webhook(
+            url,
+            secret_token=server.secret,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        print(f"[WEBHOOK] Слушаю {host}:{port}{WEBHOOK_PATH}")
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать запросы, затем дообрабатываем очередь
+        await runner.cleanup()
+        await server.stop()
+        try:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        finally:
+            await bot.session.close()
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import multiprocessing
+import queue
+import signal
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from app import create_dispatcher, start_services, stop_services
+from config import (
+    BOT_TOKEN,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_QUEUE_SIZE,
+    WORKER_LANES,
+)
+from database.db import init_db
+from services.webhook import WebhookReceiver
+
+# Процесс-обработчик: target(shard, shards, queue)
+WorkerTarget = Callable[[int, int, Any], None]
+
+POLLING_TIMEOUT = 30  # Long polling в режиме супервизора, секунды
+
+
+def update_user_id(update: Dict[str, Any]) -> int:
+    """user_id автора апдейта (from, иначе chat); 0, если его нет"""
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        author = value.get("from") or value.get("user")
+        if isinstance(author, dict) and "id" in author:
+            return author["id"]
+        chat = value.get("chat") or value.get("message", {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return 0
+
+
+def shard_for(user_id: int, shards: int) -> int:
+    """Номер процесса для пользователя; совпадает с фильтром в restore_cooking_timers"""
+    return user_id % shards
+
+
+class UpdateLanes:
+    """Обработка апдейтов внутри процесса: lanes очередей по user_id.
+
+    Апдейты одного пользователя попадают в одну очередь и обрабатываются
+    строго по порядку, разные пользователи — параллельно.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, lanes: int = WORKER_LANES):
+        self.dp = dp
+        self.bot = bot
+        self._queues = [asyncio.Queue(WEBHOOK_QUEUE_SIZE) for _ in range(lanes)]
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._lane(q)) for q in self._queues]
+
+    async def stop(self):
+        """Дообработать очереди и остановить обработчиков"""
+        await asyncio.gather(*(q.join() for q in self._queues))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, user_id: int, update: Update):
+        # Внутри шарда у всех user_id один остаток по модулю числа процессов,
+        # поэтому очередь выбираем по перемешанному хэшу, а не user_id % lanes
+        await self._queues[hash((user_id,)) % len(self._queues)].put(update)
+
+    async def _lane(self, lane: asyncio.Queue):
+        while True:
+            update = await lane.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                print(f"[WORKER ERROR] update {update.update_id}: {e!r}")
+            finally:
+                self.processed += 1
+                lane.task_done()
+
+
+async def consume(inbox: multiprocessing.Queue, bot: Bot, lanes: UpdateLanes):
+    """Читать апдейты супервизора из inbox, пока не придёт None"""
+    loop = asyncio.get_running_loop()
+    received: asyncio.Queue = asyncio.Queue(WEBHOOK_QUEUE_SIZE)
+
+    # multiprocessing.Queue блокирующая: читаем её в отдельном потоке
+    def reader():
+        while True:
+            item = inbox.get()
+            asyncio.run_coroutine_threadsafe(received.put(item), loop).result()
+            if item is None:
+                return
+
+    threading.Thread(target=reader, daemon=True).start()
+    while True:
+        item = await received.get()
+        if item is None:
+            return
+        user_id, raw = item
+        await lanes.put(user_id, Update.model_validate_json(raw, context={"bot": bot}))
+
+
+async def _worker_main(shard: int, shards: int, inbox: multiprocessing.Queue):
+    await init_db()
+    bot = Bot(token=BOT_TOKEN)
+    dp = create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    await start_services(bot, shard, shards)
+
+    lanes = UpdateLanes(dp, bot)
+    lanes.start()
+    print(f"[WORKER {shard}] Запущен")
+    try:
+        await consume(inbox, bot, lanes)
+    finally:
+        await lanes.stop()
+        try:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp)
+            await stop_services(dp)
+        finally:
+            await bot.session.close()
+
+
+def worker_process(shard: int, shards: int, inbox: multiprocessing.Queue):
+    """Точка входа процесса-обработчика"""
+    # Останавливает супервизор, отправляя None в очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_main(shard, shards, inbox))
+
+
+class ShardRouter:
+    """Процессы-обработчики и маршрутизация апдейтов по hash(user_id).
+
+    Все апдейты пользователя попадают в один процесс, поэтому его таймеры,
+    лимиты генераций и кэши живут в одном месте. Общая SQLite база (WAL)
+    и SQLiteStorage доступны всем процессам.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        target: WorkerTarget = worker_process,
+        queue_size: int = WEBHOOK_QUEUE_SIZE
+    ):
+        self.shards = processes
+        self.target = target
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = [self._context.Queue(queue_size) for _ in range(processes)]
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * processes
+        self._stopping = False
+        self.rejected = 0
+
+    def start(self):
+        for shard in range(self.shards):
+            self._spawn(shard)
+
+    def _spawn(self, shard: int):
+        process = self._context.Process(
+            target=self.target,
+            args=(shard, self.shards, self._queues[shard]),
+            name=f"cook-bot-worker-{shard}",
+            daemon=True
+        )
+        process.start()
+        self._processes[shard] = process
+
+    def respawn_dead(self) -> int:
+        """Перезапустить упавшие процессы; вернуть их количество"""
+        if self._stopping:
+            return 0
+        dead = [
+            shard for shard, process in enumerate(self._processes)
+            if process is not None and not process.is_alive()
+        ]
+        for shard in dead:
+            print(f"[SUPERVISOR] Процесс {shard} завершился с кодом "
+                  f"{self._processes[shard].exitcode}, перезапускаю")
+            self._spawn(shard)
+        return len(dead)
+
+    def route(self, update: Dict[str, Any], raw: Optional[bytes] = None) -> bool:
+        """Отправить апдейт процессу его пользователя; False — очередь процесса полна"""
+        user_id = update_user_id(update)
+        if raw is None:
+            raw = json.dumps(update, ensure_ascii=False).encode()
+        try:
+            self._queues[shard_for(user_id, self.shards)].put_nowait((user_id, raw))
+        except queue.Full:
+            self.rejected += 1
+            return False
+        return True
+
+    async def stop(self):
+        """Дать процессам дообработать очереди и дождаться их завершения"""
+        self._stopping = True
+        for inbox in self._queues:
+            await asyncio.to_thread(inbox.put, None)
+        for process in self._processes:
+            if process is not None:
+                await asyncio.to_thread(process.join)
+
+
+class ShardWebhook(WebhookReceiver):
+    """Webhook супервизора: апдейт без разбора в модели aiogram уходит процессу его пользователя"""
+
+    def __init__(self, router: ShardRouter, secret: Optional[str] = WEBHOOK_SECRET):
+        super().__init__(secret)
+        self.router = router
+
+    def accept(self, raw: bytes) -> bool:
+        return self.router.route(json.loads(raw), raw)
+
+
+async def _serve_webhook(router: ShardRouter, bot: Bot, allowed_updates: List[str], stop: asyncio.Event):
+    receiver = ShardWebhook(router)
+    runner = web.AppRunner(receiver.make_app())
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            WEBHOOK_URL, secret_token=receiver.secret, allowed_updates=allowed_updates
+        )
+        print(f"[SUPERVISOR] Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+async def _poll(router: ShardRouter, bot: Bot, allowed_updates: List[str], stop: asyncio.Event):
+    """Long polling без разбора апдейтов в модели aiogram: супервизору нужен только user_id"""
+    await bot.delete_webhook()
+    url = bot.session.api.api_url(bot.token, "getUpdates")
+    timeout = aiohttp.ClientTimeout(total=POLLING_TIMEOUT + 10)
+    offset = None
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        while not stop.is_set():
+            params = {"timeout": POLLING_TIMEOUT, "allowed_updates": json.dumps(allowed_updates)}
+            if offset is not None:
+                params["offset"] = offset
+            try:
+                async with session.post(url, data=params) as response:
+                    data = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                print(f"[SUPERVISOR POLLING ERROR] {e!r}")
+                await asyncio.sleep(1)
+                continue
+            if not data.get("ok"):
+                print(f"[SUPERVISOR POLLING ERROR] {data}")
+                await asyncio.sleep(1)
+                continue
+
+            for update in data["result"]:
+                while not router.route(update):
+                    await asyncio.sleep(0.1)
+                offset = update["update_id"] + 1
+
+
+async def _supervise(processes: int):
+    # Миграции — один раз до старта процессов
+    await init_db()
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    bot = Bot(token=BOT_TOKEN)
+
+    router = ShardRouter(processes)
+    router.start()
+    print(f"[SUPERVISOR] Запущено процессов: {processes}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    async def watch():
+        while True:
+            router.respawn_dead()
+            await asyncio.sleep(1)
+
+    intake = asyncio.create_task(
+        (_serve_webhook if WEBHOOK_URL else _poll)(router, bot, allowed_updates, stop)
+    )
+    watcher = asyncio.create_task(watch())
+    stopped = asyncio.create_task(stop.wait())
+    try:
+        await asyncio.wait({intake, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        if intake.done() and intake.exception() is not None:
+            print(f"[SUPERVISOR] Приём апдейтов остановился: {intake.exception()!r}")
+    finally:
+        for task in (intake, watcher, stopped):
+            task.cancel()
+        await asyncio.gather(intake, watcher, stopped, return_exceptions=True)
+        await router.stop()
+        await bot.session.close()
+
+
+def run_supervisor(processes: int):
+    """Многопроцессный режим: супервизор принимает апдейты, processes процессов их обрабатывают"""
+    asyncio.run(_supervise(processes))
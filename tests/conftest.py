@@ -0,0 +1,130 @@
+import asyncio
+import json
+import socket
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import db
+from database.connection import ConnectionManager
+from models.user import Recipe, UserProfile
+from services import ai_service
+from services.ai_dispatcher import AIDispatcher
+
+RECIPE = {
+    "name": "Курица с рисом",
+    "description": "Простое блюдо на каждый день",
+    "calories": 450,
+    "protein": 40,
+    "fats": 10,
+    "carbs": 50,
+    "cooking_time": 30,
+    "servings": 2,
+    "ingredients": [{"name": "Куриное филе", "amount": "300г"}, {"name": "Рис", "amount": "150г"}],
+    "steps": [
+        {"step": 1, "description": "Нарезать курицу кубиками", "duration": 5},
+        {"step": 2, "description": "Обжарить на сковороде", "duration": 10},
+        {"step": 3, "description": "Отварить рис", "duration": 15},
+    ],
+}
+
+
+def make_profile(user_id: int, name: str = "Анна", goal: str = "goal_weight_loss") -> UserProfile:
+    now = datetime.now()
+    return UserProfile(
+        user_id=user_id, name=name, goal=goal, dietary_restrictions=[],
+        has_oven=True, has_microwave=False, has_stove=True, created_at=now, updated_at=now,
+    )
+
+
+def make_recipe(user_id: int, **fields) -> Recipe:
+    values = {key: value for key, value in RECIPE.items() if key != "servings"}
+    values.update(fields)
+    return Recipe(recipe_id=None, user_id=user_id, image_url=None, created_at=datetime.now(), **values)
+
+
+def completion(content: str, finish_reason: str = "stop") -> dict:
+    """Ответ chat/completions с текстом content"""
+    return {"choices": [{"message": {"content": content}, "finish_reason": finish_reason}]}
+
+
+class StubAPI:
+    """Локальный сервер вместо API_URL: отвечает reply(payload) через delay секунд.
+
+    На запрос со stream=True тот же ответ отдаётся кусками SSE по chunk_size символов.
+    """
+
+    def __init__(self, port: int):
+        self.port = port
+        self.delay = 0.0
+        self.reply: Callable[[dict], dict] = lambda payload: completion(json.dumps(RECIPE, ensure_ascii=False))
+        self.requests: List[dict] = []
+        self.chunk_size = 16
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.requests.append(payload)
+        await asyncio.sleep(self.delay)
+        reply = self.reply(payload)
+        if not payload.get("stream"):
+            return web.json_response(reply)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        choice = reply["choices"][0]
+        content = choice["message"]["content"]
+        chunks = [
+            {"choices": [{"delta": {"content": content[i:i + self.chunk_size]}, "finish_reason": None}]}
+            for i in range(0, len(content), self.chunk_size)
+        ]
+        chunks.append({"choices": [{"delta": {}, "finish_reason": choice.get("finish_reason")}]})
+        for chunk in chunks:
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+
+    async def stop(self):
+        await ai_service.close_session()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Отдельная SQLite во временном каталоге вместо data/cooking_bot.db.
+
+    Соединения открываются в цикле событий теста: await db.init_db().
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db, "manager", ConnectionManager(str(tmp_path / "test.db")))
+    db.user_cache.clear()
+    db.recipe_cache.clear()
+    return db
+
+
+@pytest.fixture
+def ai_api(monkeypatch):
+    """StubAPI и свежая очередь генераций; сервер запускается в цикле теста: await ai_api.start()"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(ai_service, "API_URL", f"http://127.0.0.1:{port}/v1/chat/completions")
+    monkeypatch.setattr(ai_service, "dispatcher", AIDispatcher())
+    monkeypatch.setattr(ai_service, "_session", None)
+    monkeypatch.setattr(ai_service, "RECIPE_REPAIR_BACKOFF", 0)
+    return StubAPI(port)
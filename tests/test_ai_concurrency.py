@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from conftest import make_profile
+from services import ai_service
+
+GENERATIONS = 50
+TICK = 0.01
+# Запрос к API длится 0.2 с; если он блокирует цикл событий, тик опоздает минимум на столько же
+MAX_TICK_LAG = 0.1
+
+
+async def tick(lags, stop: asyncio.Event):
+    """Посторонний обработчик: просыпается каждые TICK секунд и записывает опоздание"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+def test_concurrent_generations_do_not_block_event_loop(database, ai_api):
+    ai_api.delay = 0.2
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        lags = []
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(tick(lags, stop))
+        try:
+            recipes = await asyncio.gather(*(
+                ai_service.generate_recipe(make_profile(user_id), f"блюдо номер {user_id}")
+                for user_id in range(GENERATIONS)
+            ))
+        finally:
+            stop.set()
+            await ticker
+            await ai_api.stop()
+            await database.close_db()
+        return recipes, lags
+
+    recipes, lags = asyncio.run(main())
+
+    assert len(ai_api.requests) == GENERATIONS
+    assert all(recipe is not None for recipe in recipes)
+    assert [recipe.user_id for recipe in recipes] == list(range(GENERATIONS))
+    assert len(lags) > 10
+    assert max(lags) < MAX_TICK_LAG
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from services import ai_dispatcher
+from services.ai_dispatcher import AIDispatcher, DispatcherStoppedError
+
+
+def test_queue_position_is_updated_as_queue_moves():
+    positions = {job: [] for job in range(4)}
+
+    async def main():
+        dispatcher = AIDispatcher(workers=1)
+        dispatcher.start()
+        releases = [asyncio.Event() for _ in range(4)]
+
+        def submit(job: int):
+            async def factory():
+                await releases[job].wait()
+                return job
+
+            async def on_queued(position: int):
+                positions[job].append(position)
+
+            return asyncio.create_task(dispatcher.submit(job, factory, on_queued=on_queued))
+
+        tasks = []
+        for job in range(4):
+            tasks.append(submit(job))
+            await asyncio.sleep(0.01)
+        for release in releases:
+            release.set()
+            await asyncio.sleep(0.01)
+        results = await asyncio.gather(*tasks)
+        await dispatcher.stop()
+        return results
+
+    assert asyncio.run(main()) == [0, 1, 2, 3]
+    assert positions == {0: [], 1: [1], 2: [2, 1], 3: [3, 2, 1]}
+
+
+def test_idle_full_buckets_are_pruned(monkeypatch):
+    monkeypatch.setattr(ai_dispatcher, "PRUNE_BUCKETS_EVERY", 10)
+    # Лимит восстанавливается мгновенно
+    monkeypatch.setattr(ai_dispatcher, "AI_USER_RATE", 1e9)
+
+    async def generate():
+        return None
+
+    async def main():
+        dispatcher = AIDispatcher(workers=2)
+        for user_id in range(25):
+            await dispatcher.submit(user_id, generate)
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(main())
+    # Последняя чистка — на 20-м вызове, до лимита пользователя 19
+    assert sorted(dispatcher._buckets) == list(range(19, 25))
+
+
+def test_submit_after_stop_raises():
+    async def main():
+        dispatcher = AIDispatcher(workers=1)
+        dispatcher.start()
+        blocker = asyncio.Event()
+        running = asyncio.create_task(dispatcher.submit(1, blocker.wait))
+        queued = asyncio.create_task(dispatcher.submit(2, blocker.wait))
+        await asyncio.sleep(0.01)
+        await dispatcher.stop()
+
+        with pytest.raises(DispatcherStoppedError):
+            await asyncio.wait_for(dispatcher.submit(3, blocker.wait), 1)
+        with pytest.raises(DispatcherStoppedError):
+            await asyncio.wait_for(queued, 1)
+        running.cancel()
+
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from conftest import make_recipe
+from handlers import cooking
+from models.user import CookingSession
+from services.timer_scheduler import TimerScheduler, timer_scheduler
+
+
+def test_expired_timers_fire_with_bounded_concurrency():
+    fired = []
+    running = 0
+    peak = 0
+
+    async def callback(user_id: int, session_id: int):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        fired.append(user_id)
+
+    async def main():
+        scheduler = TimerScheduler(max_concurrent=3)
+        # Таймеры, истёкшие за время простоя
+        for user_id in range(20):
+            scheduler.schedule(user_id, user_id, datetime.now() - timedelta(minutes=user_id))
+        scheduler.start(callback)
+        while len(fired) < 20:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    assert sorted(fired) == list(range(20))
+    assert peak == 3
+
+
+class FloodedBot:
+    """Бот, которому Telegram отвечает TelegramRetryAfter на каждое сообщение"""
+
+    def __init__(self):
+        self.attempts = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.attempts += 1
+        raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Flood control", 0)
+
+
+def test_next_step_timer_survives_failed_send(database):
+    user_id = 7
+
+    async def main():
+        await database.init_db()
+        try:
+            recipe = make_recipe(user_id)
+            recipe.recipe_id = await database.save_recipe(recipe)
+            now = datetime.now()
+            session = CookingSession(
+                session_id=None, user_id=user_id, recipe_id=recipe.recipe_id, current_step=0,
+                timer_end=now - timedelta(seconds=1), is_paused=False, created_at=now, updated_at=now
+            )
+            session.session_id = await database.save_cooking_session(session)
+
+            bot = FloodedBot()
+            await cooking.on_timer_expired(bot, user_id, session.session_id)
+            return bot, session, await database.get_cooking_session(user_id)
+        finally:
+            await database.close_db()
+
+    bot, session, stored = asyncio.run(main())
+    deadline = timer_scheduler.get_deadline(user_id)
+    timer_scheduler.cancel(user_id)
+
+    # Обе отправки повторены по одному разу, но следующий шаг и его таймер уже сохранены
+    assert bot.attempts == 4
+    assert stored.current_step == 1
+    assert stored.timer_end > datetime.now() + timedelta(minutes=9)
+    assert deadline is not None and abs((deadline - stored.timer_end).total_seconds()) < 1
@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+
+from config import AI_USER_BURST
+from conftest import make_profile
+from services import ai_service
+from services.ai_dispatcher import PRIORITY_SPECULATIVE, AIDispatcher, QuotaExceededError
+
+
+def same_variant_user(user_id: int) -> int:
+    """Другой пользователь с тем же вариантом промпта, что и user_id"""
+    variant = ai_service.prompt_variant(user_id)
+    return next(
+        other for other in range(user_id + 1, user_id + 1000)
+        if ai_service.prompt_variant(other) == variant
+    )
+
+
+def test_identical_profiles_share_one_request(database, ai_api):
+    ai_api.delay = 0.2
+    first = make_profile(1, name="Анна")
+    second = make_profile(same_variant_user(1), name="Борис")
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            return await asyncio.gather(
+                ai_service.generate_recipe(first, "Курица с рисом"),
+                ai_service.generate_recipe(second, "курица с рисом ", exclude_recipes=[]),
+            )
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    before = ai_service.get_generation_stats()
+    recipes = asyncio.run(main())
+    after = ai_service.get_generation_stats()
+
+    assert len(ai_api.requests) == 1
+    assert after["started"] - before["started"] == 1
+    assert after["coalesced"] - before["coalesced"] == 1
+    assert [recipe.user_id for recipe in recipes] == [first.user_id, second.user_id]
+    assert recipes[0].name == recipes[1].name
+
+
+def test_different_exclusions_do_not_share_a_request(database, ai_api):
+    ai_api.delay = 0.2
+    first = make_profile(1)
+    second = make_profile(same_variant_user(1))
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            await asyncio.gather(
+                ai_service.generate_recipe(first, "Курица с рисом"),
+                ai_service.generate_recipe(second, "Курица с рисом", exclude_recipes=["Плов"]),
+            )
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    asyncio.run(main())
+    assert len(ai_api.requests) == 2
+
+
+def test_throttled_joiner_does_not_affect_the_flight(database, ai_api):
+    ai_api.delay = 0.2
+    free = make_profile(1)
+    throttled = make_profile(same_variant_user(1))
+    joiner = make_profile(same_variant_user(throttled.user_id))
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            for _ in range(AI_USER_BURST):
+                ai_service.dispatcher.charge(throttled.user_id)
+            results = await asyncio.gather(
+                ai_service.generate_recipe(free, "Курица с рисом"),
+                ai_service.generate_recipe(throttled, "Курица с рисом"),
+                ai_service.generate_recipe(joiner, "Курица с рисом"),
+                return_exceptions=True
+            )
+            return results, ai_service.dispatcher._buckets[joiner.user_id].tokens
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    (recipe, error, joined), joiner_tokens = asyncio.run(main())
+    assert len(ai_api.requests) == 1
+    assert recipe.user_id == free.user_id
+    assert isinstance(error, QuotaExceededError)
+    assert joined.user_id == joiner.user_id
+    # Присоединившийся заплатил своей квотой
+    assert joiner_tokens == pytest.approx(AI_USER_BURST - 1, abs=0.01)
+
+
+def test_throttled_first_caller_does_not_fail_the_others(database, ai_api):
+    throttled = make_profile(1)
+    free = make_profile(same_variant_user(1))
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            for _ in range(AI_USER_BURST):
+                ai_service.dispatcher.charge(throttled.user_id)
+            return await asyncio.gather(
+                ai_service.generate_recipe(throttled, "Курица с рисом"),
+                ai_service.generate_recipe(free, "Курица с рисом"),
+                return_exceptions=True
+            )
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    error, recipe = asyncio.run(main())
+    assert isinstance(error, QuotaExceededError)
+    assert recipe.user_id == free.user_id
+
+
+def test_first_request_does_not_join_speculation(database, ai_api):
+    ai_api.delay = 0.2
+    first = make_profile(1)
+    second = make_profile(same_variant_user(1))
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            await asyncio.gather(
+                ai_service.generate_recipe(
+                    first, "Курица с рисом", priority=PRIORITY_SPECULATIVE, use_quota=False
+                ),
+                ai_service.generate_recipe(second, "Курица с рисом"),
+            )
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    asyncio.run(main())
+    assert len(ai_api.requests) == 2
+
+
+def test_every_waiter_gets_queue_position_and_fields(database, ai_api, monkeypatch):
+    # Единственный воркер занят другим запросом: общая генерация ждёт в очереди
+    monkeypatch.setattr(ai_service, "dispatcher", AIDispatcher(workers=1))
+    ai_api.delay = 0.1
+    first = make_profile(1)
+    second = make_profile(same_variant_user(1))
+    events = {first.user_id: [], second.user_id: []}
+
+    def callbacks(user_id):
+        async def on_progress(fields):
+            events[user_id].append(("fields", fields.get("name")))
+
+        async def on_queued(position):
+            events[user_id].append(("queued", position))
+
+        return {"on_progress": on_progress, "on_queued": on_queued}
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            busy = asyncio.create_task(ai_service.generate_recipe(make_profile(99), "Суп"))
+            await asyncio.sleep(0.02)
+            await asyncio.gather(
+                ai_service.generate_recipe(first, "Курица с рисом", **callbacks(first.user_id)),
+                ai_service.generate_recipe(second, "Курица с рисом", **callbacks(second.user_id)),
+            )
+            await busy
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    asyncio.run(main())
+    for user_events in events.values():
+        assert ("queued", 1) in user_events
+        assert ("fields", "Курица с рисом") in user_events
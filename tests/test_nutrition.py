@@ -0,0 +1,19 @@
+import pytest
+
+from services.nutrition import parse_amount
+
+
+@pytest.mark.parametrize("amount, expected", [
+    ("2 ст.л.", (2.0, 15.0)),
+    ("2 столовые ложки", (2.0, 15.0)),
+    ("1 ст. ложка", (1.0, 15.0)),
+    ("2 ст. ложки", (2.0, 15.0)),
+    ("1 ст.ложка", (1.0, 15.0)),
+    ("1 ч. ложка", (1.0, 5.0)),
+    ("0.5 ч. ложки", (0.5, 5.0)),
+    ("1 дес. ложка", (1.0, 10.0)),
+    ("1/2 чайной ложки", (0.5, 5.0)),
+    ("3 шт", (3.0, None)),
+])
+def test_spoon_forms(amount, expected):
+    assert parse_amount(amount) == expected
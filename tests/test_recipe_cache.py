@@ -0,0 +1,16 @@
+from conftest import make_profile
+from services import recipe_cache
+
+
+def test_cache_key_normalizes_equivalent_goals():
+    keys = {
+        recipe_cache.make_cache_key(make_profile(1, goal=goal), "Курица с рисом")
+        for goal in ("goal_weight_loss", "weight", "weight_loss")
+    }
+    assert len(keys) == 1
+
+
+def test_cache_key_separates_different_goals():
+    weight_loss = recipe_cache.make_cache_key(make_profile(1, goal="goal_weight_loss"), "Курица с рисом")
+    muscle_gain = recipe_cache.make_cache_key(make_profile(1, goal="goal_muscle_gain"), "Курица с рисом")
+    assert weight_loss != muscle_gain
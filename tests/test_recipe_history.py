@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from config import RECIPE_HISTORY_SIZE
+from database.migrations import _compact_recipe_history
+
+NAMES = [f"Рецепт {i}" for i in range(RECIPE_HISTORY_SIZE + 2)]
+
+
+def test_history_keeps_insertion_order_within_one_second(database, monkeypatch):
+    # Все записи с одним created_at: порядок задаёт только rowid
+    monkeypatch.setattr(time, "time", lambda: 1700000000.0)
+
+    async def run():
+        await database.init_db()
+        try:
+            for name in NAMES:
+                await database.add_recipe_to_history(1, name)
+            await database.add_recipe_to_history(1, NAMES[5])
+            return await database.get_recent_recipe_names(1, RECIPE_HISTORY_SIZE)
+        finally:
+            await database.close_db()
+
+    names = asyncio.run(run())
+    newest = [NAMES[5]] + [name for name in reversed(NAMES) if name != NAMES[5]]
+    assert names == newest[:RECIPE_HISTORY_SIZE]
+
+
+def test_compaction_keeps_latest_rows_within_one_second(database):
+    async def run():
+        await database.init_db()
+        try:
+            async with database.manager.write() as conn:
+                await conn.executemany(
+                    "INSERT INTO recipe_history (user_id, recipe_name, created_at) VALUES (1, ?, 1700000000)",
+                    [(name,) for name in NAMES + [NAMES[0]]]
+                )
+                await _compact_recipe_history(conn)
+            return await database.get_recent_recipe_names(1, len(NAMES))
+        finally:
+            await database.close_db()
+
+    names = asyncio.run(run())
+    assert names == ([NAMES[0]] + NAMES[:0:-1])[:RECIPE_HISTORY_SIZE]
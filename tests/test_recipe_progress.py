@@ -0,0 +1,42 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageText
+
+from handlers.recipe import RecipeProgress
+
+
+class FakeMessage:
+    def __init__(self, text: str, editable: bool = True):
+        self.text = text
+        self.editable = editable
+        self.edits = []
+        self.answers = []
+
+    async def edit_text(self, text, **kwargs):
+        if not self.editable:
+            raise TelegramBadRequest(EditMessageText(text=text), "message can't be edited")
+        self.edits.append(text)
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+def test_failure_replaces_partial_card():
+    message = FakeMessage("🔍 Ищу подходящий рецепт...")
+    progress = RecipeProgress(message)
+
+    async def main():
+        await progress.update({"name": "Курица с рисом", "calories": 450})
+        await progress.fail("😔 Не удалось сгенерировать рецепт.")
+
+    asyncio.run(main())
+    assert "Дописываю рецепт" in message.edits[0]
+    assert message.edits[-1] == "😔 Не удалось сгенерировать рецепт."
+    assert message.answers == []
+
+
+def test_failure_is_sent_when_card_cannot_be_edited():
+    message = FakeMessage("🔍 Ищу подходящий рецепт...", editable=False)
+    asyncio.run(RecipeProgress(message).fail("😔 Не удалось сгенерировать рецепт."))
+    assert message.answers == ["😔 Не удалось сгенерировать рецепт."]
@@ -0,0 +1,65 @@
+import asyncio
+
+import numpy as np
+
+from conftest import make_recipe
+from services.retrieval import RecipeIndex, Retriever, index_body
+from services.text import search_terms
+
+DISHES = [
+    ("Курица с рисом", "курица рис лук", "Обжарить на сковороде"),
+    ("Запечённая курица с картофелем", "курица картофель чеснок", "Запечь в духовке"),
+    ("Рис с овощами", "рис морковь перец", "Тушить на плите"),
+    ("Гречка с курицей", "гречка курица лук", "Варить 20 минут"),
+    ("Салат с тунцом", "тунец огурец яйцо", "Нарезать и смешать"),
+    ("Курица с гречкой", "курица гречка морковь", "Тушить на плите"),
+]
+
+
+def make_rows():
+    return [
+        (rowid, rowid.to_bytes(20, "big"), name, 300 + rowid * 50, 20 + rowid, 10, 40, 30,
+         search_terms(name), search_terms("Блюдо на каждый день"), search_terms(ingredients),
+         f'[{{"step": 1, "description": "{step}", "duration": 20}}]')
+        for rowid, (name, ingredients, step) in enumerate(DISHES, 1)
+    ]
+
+
+def test_extended_index_matches_full_build():
+    bodies = [index_body(row) for row in make_rows()]
+    full = RecipeIndex(bodies)
+    extended = RecipeIndex(bodies[:2]).extended(bodies[2:4]).extended(bodies[4:])
+
+    assert extended.vocab == full.vocab
+    assert extended.body_hashes == full.body_hashes
+    for name in ("term_ptr", "docs", "in_name", "restricted", "equipment"):
+        assert np.array_equal(getattr(extended, name), getattr(full, name))
+    assert np.allclose(extended.weights, full.weights)
+    for goal in ("weight_loss", "muscle_gain"):
+        assert extended.best(["куриц"], goal, 0, 0b111) == full.best(["куриц"], goal, 0, 0b111)
+
+
+def test_extending_keeps_the_previous_index_intact():
+    bodies = [index_body(row) for row in make_rows()]
+    first = RecipeIndex(bodies[:3])
+    found = first.best(["рис"], "none", 0, 0b111)
+    first.extended(bodies[3:])
+    assert len(first) == 3
+    assert first.best(["рис"], "none", 0, 0b111) == found
+
+
+def test_refresh_indexes_saved_recipes(database):
+    async def main():
+        await database.init_db()
+        try:
+            for user_id, name in enumerate(("Курица с рисом", "Рис с овощами"), 1):
+                await database.save_recipe(make_recipe(user_id, name=name))
+            retriever = Retriever()
+            added = await retriever.refresh()
+            return added, await retriever.refresh(), retriever.index.best(["рис"], "none", 0, 0b111)
+        finally:
+            await database.close_db()
+
+    added, again, found = asyncio.run(main())
+    assert (added, again) == (2, 0)
+    assert len(found) == 2
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from conftest import make_profile
+from handlers import recipe as recipe_handlers
+from services import ai_service
+from services.ai_dispatcher import AIDispatcher
+
+
+def make_state(user_id: int) -> FSMContext:
+    return FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=user_id, user_id=user_id))
+
+
+async def wait_for(condition, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.005)
+
+
+def test_regenerate_does_not_wait_behind_queued_speculation(database, ai_api, monkeypatch):
+    # Один воркер занят чужой генерацией, альтернатива ждёт в очереди
+    monkeypatch.setattr(ai_service, "dispatcher", AIDispatcher(workers=1))
+    ai_api.delay = 0.3
+    profile = make_profile(1)
+    state = make_state(profile.user_id)
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            busy = asyncio.create_task(ai_service.generate_recipe(make_profile(2), "Суп"))
+            await wait_for(lambda: len(ai_api.requests) == 1)
+            recipe_handlers.start_speculation(state, profile, "Курица с рисом", ["Плов"])
+            await asyncio.sleep(0.01)
+
+            started = time.perf_counter()
+            alternative = await recipe_handlers.take_alternative(state, profile)
+            waited = time.perf_counter() - started
+
+            await busy
+            await asyncio.sleep(0.05)
+            return alternative, waited
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    alternative, waited = asyncio.run(main())
+    assert alternative is None
+    assert waited < 0.1
+    # Отменённая альтернатива так и не ушла в API
+    assert len(ai_api.requests) == 1
+    assert profile.user_id not in recipe_handlers._speculations
+
+
+def test_running_speculation_is_awaited(database, ai_api):
+    ai_api.delay = 0.1
+    profile = make_profile(1)
+    state = make_state(profile.user_id)
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            recipe_handlers.start_speculation(state, profile, "Курица с рисом", ["Плов"])
+            await wait_for(lambda: len(ai_api.requests) == 1)
+            return await recipe_handlers.take_alternative(state, profile)
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    alternative = asyncio.run(main())
+    assert alternative is not None
+    assert alternative.user_id == profile.user_id
+
+
+class FakeMessage:
+    def __init__(self, text: str = ""):
+        self.text = text
+        self.replies = []
+
+    async def answer(self, text, **kwargs):
+        reply = FakeMessage(text)
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+
+
+def test_no_speculation_after_cached_answer(database, ai_api):
+    first, second = make_profile(1), make_profile(2)
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            await recipe_handlers.handle_recipe_request(FakeMessage("Курица с рисом"), make_state(1), first)
+            after_ai = first.user_id in recipe_handlers._speculations
+            recipe_handlers.cancel_speculation(first.user_id)
+
+            # Тот же профиль и запрос: ответ из кэша, без запроса к API
+            requests = len(ai_api.requests)
+            message = FakeMessage("Курица с рисом")
+            await recipe_handlers.handle_recipe_request(message, make_state(2), second)
+            await asyncio.sleep(0.05)
+            return after_ai, len(ai_api.requests) - requests, message.replies[0].text
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    after_ai, new_requests, card = asyncio.run(main())
+    assert after_ai
+    assert "Курица с рисом" in card
+    assert new_requests == 0
+    assert second.user_id not in recipe_handlers._speculations
@@ -0,0 +1,93 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from conftest import RECIPE, completion, make_profile
+from services import ai_service, recipe_cache, recipe_parser
+from services.recipe_parser import RecipeParseError
+
+FULL = json.dumps(RECIPE, ensure_ascii=False, indent=2)
+AFTER_STEP = FULL[:FULL.index("}", FULL.index('"step": 2')) + 1]
+AFTER_STEP_COMMA = AFTER_STEP + ","
+MID_AMOUNT = FULL[:FULL.index('"300г"') + 3]
+
+
+async def ignore(fields):
+    pass
+
+
+@pytest.mark.parametrize("text", [AFTER_STEP, AFTER_STEP_COMMA, MID_AMOUNT])
+def test_truncated_json_is_not_loaded(text):
+    with pytest.raises(RecipeParseError) as error:
+        recipe_parser.load_json_object(text)
+    assert error.value.truncated
+    assert error.value.data is None
+
+
+def parse(ai_api, response):
+    async def main():
+        await ai_api.start()
+        try:
+            return await ai_service.parse_recipe_response(response, 1)
+        finally:
+            await ai_api.stop()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("text", [AFTER_STEP, AFTER_STEP_COMMA, MID_AMOUNT])
+def test_truncated_reply_is_rewritten_by_model(ai_api, text):
+    recipe = parse(ai_api, completion(text, finish_reason="length"))
+    assert len(ai_api.requests) == 1
+    assert "оборван" in ai_api.requests[0]["messages"][0]["content"]
+    assert recipe.ingredients[0]["amount"] == "300г"
+    assert len(recipe.steps) == 3
+
+
+def test_closed_reply_cut_by_token_limit_is_not_accepted(ai_api):
+    two_steps = json.dumps({**RECIPE, "steps": RECIPE["steps"][:2]}, ensure_ascii=False)
+    recipe = parse(ai_api, completion(two_steps, finish_reason="length"))
+    assert len(ai_api.requests) == 1
+    assert len(recipe.steps) == 3
+
+
+def test_truncated_field_repair_is_not_merged(ai_api):
+    without_ingredients = json.dumps({k: v for k, v in RECIPE.items() if k != "ingredients"}, ensure_ascii=False)
+    patches = [
+        completion('{"ingredients": [{"name": "Куриное филе", "amount": "30', finish_reason="length"),
+        completion(json.dumps({"ingredients": RECIPE["ingredients"]}, ensure_ascii=False)),
+    ]
+    ai_api.reply = lambda payload: patches[len(ai_api.requests) - 1]
+
+    recipe = parse(ai_api, completion(without_ingredients))
+    assert len(ai_api.requests) == 2
+    assert recipe.ingredients[0]["amount"] == "300г"
+
+
+def test_streaming_reply_keeps_finish_reason_and_is_not_cached(database, ai_api):
+    replies = [completion(MID_AMOUNT, finish_reason="length"), completion(FULL)]
+    ai_api.reply = lambda payload: replies[len(ai_api.requests) - 1]
+    ai_api.chunk_size = 7
+    profile = make_profile(1)
+
+    async def main():
+        await database.init_db()
+        await ai_api.start()
+        try:
+            streamed = await ai_service.query_streaming({"model": "m", "messages": []}, ignore)
+            ai_api.requests.clear()
+            recipe = await ai_service.generate_recipe(profile, "Курица с рисом", on_progress=ignore)
+            cached = await database.get_cached_recipes(
+                recipe_cache.make_cache_key(profile, "Курица с рисом"), datetime(2000, 1, 1), 1
+            )
+            return streamed, recipe, cached
+        finally:
+            await ai_api.stop()
+            await database.close_db()
+
+    streamed, recipe, cached = asyncio.run(main())
+    assert streamed["choices"][0]["finish_reason"] == "length"
+    assert recipe.ingredients[0]["amount"] == "300г"
+    assert [item.ingredients[0]["amount"] for item in cached] == ["300г"]
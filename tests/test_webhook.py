@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp.test_utils import TestClient, TestServer
+
+from services.webhook import SECRET_HEADER, WebhookReceiver, WebhookServer
+from services.workers import ShardWebhook
+
+UPDATE = {"update_id": 1, "message": {
+    "message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"},
+    "from": {"id": 7, "is_bot": False, "first_name": "Анна"}, "text": "hi",
+}}
+
+
+class FakeRouter:
+    def __init__(self, free: int):
+        self.free = free
+        self.routed = []
+
+    def route(self, update, raw=None) -> bool:
+        if len(self.routed) >= self.free:
+            return False
+        self.routed.append((update["update_id"], raw))
+        return True
+
+
+async def post_all(receiver):
+    """Коды ответов: чужой токен, мусор, два корректных апдейта"""
+    client = TestClient(TestServer(receiver.make_app("/hook")))
+    await client.start_server()
+    statuses = []
+    try:
+        for headers, body in [
+            ({SECRET_HEADER: "wrong"}, json.dumps(UPDATE)),
+            ({SECRET_HEADER: "s3cret"}, "not json"),
+            ({SECRET_HEADER: "s3cret"}, json.dumps(UPDATE)),
+            ({SECRET_HEADER: "s3cret"}, json.dumps(UPDATE)),
+        ]:
+            response = await client.post("/hook", data=body, headers=headers)
+            statuses.append(response.status)
+    finally:
+        await client.close()
+    return statuses
+
+
+def test_supervisor_and_server_answer_alike():
+    async def run():
+        router = FakeRouter(free=1)
+        shard = ShardWebhook(router, secret="s3cret")
+        server = WebhookServer(Dispatcher(), Bot("1:x"), secret="s3cret", queue_size=1)
+        try:
+            return router, shard, await post_all(shard), server, await post_all(server)
+        finally:
+            await server.bot.session.close()
+
+    router, shard, shard_statuses, server, server_statuses = asyncio.run(run())
+    assert shard_statuses == server_statuses == [401, 400, 200, 503]
+    assert shard.stats() == {"accepted": 1, "rejected": 1, "unauthorized": 1}
+    assert router.routed == [(1, json.dumps(UPDATE).encode())]
+    assert server.stats()["queue_depth"] == 1
+
+
+def test_receiver_without_accept_cannot_be_created():
+    with pytest.raises(TypeError):
+        WebhookReceiver()